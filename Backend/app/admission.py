@@ -0,0 +1,222 @@
+"""
+Admission control and priority queueing for LLM-bound endpoints
+
+At most `Settings.admission_max_concurrency` generations / ingestions run
+at once per worker. Further requests wait in a bounded queue, served
+in priority order (interactive `/plan` traffic, then `/plan/batch` items,
+then admin `/ingest`)
+and first-come-first-served within a priority. A request that cannot be
+queued, waits longer than `Settings.admission_queue_timeout`, or is
+displaced from a full queue by higher-priority traffic is rejected with a
+fast 503 and a Retry-After estimated from recent service times, instead of
+piling onto the providers and timing out at the gateway.
+"""
+import asyncio
+import itertools
+import math
+import time
+from contextlib import asynccontextmanager
+from enum import IntEnum
+from functools import lru_cache
+from typing import Dict, List
+
+from prometheus_client import Counter, Gauge, Histogram
+
+from app.config import get_settings
+
+
+class Priority(IntEnum):
+    """Admission priority (lower value is served first)"""
+    INTERACTIVE = 0
+    BATCH = 1
+    ADMIN = 2
+
+
+ADMISSION_QUEUE_DEPTH = Gauge(
+    "wandergenie_admission_queue_depth",
+    "Requests waiting for admission",
+    ["priority"]
+)
+
+ADMISSION_ACTIVE = Gauge(
+    "wandergenie_admission_active",
+    "Admitted requests currently running"
+)
+
+ADMISSION_WAIT = Histogram(
+    "wandergenie_admission_wait_seconds",
+    "Time spent waiting for admission",
+    ["priority"],
+    buckets=(0.001, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+)
+
+ADMISSION_REJECTED = Counter(
+    "wandergenie_admission_rejected_total",
+    "Requests rejected by admission control",
+    ["priority", "reason"]
+)
+
+# Bounds of the Retry-After estimate (seconds)
+MIN_RETRY_AFTER = 1
+MAX_RETRY_AFTER = 60
+
+# Smoothing factor of the service time moving average
+SERVICE_TIME_ALPHA = 0.2
+
+
+class AdmissionRejected(Exception):
+    """Raised when a request is not admitted"""
+
+    def __init__(self, reason: str, retry_after: int):
+        super().__init__(f"Server busy ({reason}), retry after {retry_after}s")
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class AdmissionController:
+    """Concurrency limit with a bounded priority wait queue"""
+
+    def __init__(self, max_concurrency: int = 8, max_queue: int = 32, queue_timeout: float = 10.0):
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.active = 0
+        self.service_time = 1.0  # moving average, seconds
+        self._waiters: List[list] = []  # [priority, seq, future], kept sorted
+        self._seq = itertools.count()
+        self.stats = {"admitted": 0, "waited": 0, "rejected": 0}
+
+    # ----- public API -----
+
+    @asynccontextmanager
+    async def admit(self, priority: Priority = Priority.INTERACTIVE):
+        """
+        Hold an admission slot for the duration of the block.
+
+        Args:
+            priority: Request priority
+
+        Raises:
+            AdmissionRejected: If the queue is full or the wait times out
+        """
+        await self._acquire(priority)
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            elapsed = time.monotonic() - started
+            self.service_time += SERVICE_TIME_ALPHA * (elapsed - self.service_time)
+            self._release()
+
+    def retry_after(self) -> int:
+        """Seconds until a slot is likely to be free"""
+        estimate = self.service_time * (self.queue_depth() + 1) / self.max_concurrency
+        return max(MIN_RETRY_AFTER, min(MAX_RETRY_AFTER, math.ceil(estimate)))
+
+    def queue_depth(self, priority: Priority = None) -> int:
+        """Number of waiting requests (optionally of one priority)"""
+        return sum(1 for p, _, f in self._waiters if not f.done() and (priority is None or p == priority))
+
+    def snapshot(self) -> Dict:
+        """Current limits, load and counters"""
+        return {
+            "max_concurrency": self.max_concurrency,
+            "max_queue": self.max_queue,
+            "queue_timeout": self.queue_timeout,
+            "active": self.active,
+            "queued": {p.name.lower(): self.queue_depth(p) for p in Priority},
+            "avg_service_time_s": round(self.service_time, 3),
+            "retry_after_s": self.retry_after(),
+            **self.stats
+        }
+
+    # ----- internals -----
+
+    async def _acquire(self, priority: Priority):
+        label = priority.name.lower()
+        started = time.monotonic()
+
+        if self.active < self.max_concurrency and self.queue_depth() == 0:
+            self.active += 1
+            self._admitted(label, started)
+            return
+
+        self._prune()
+        if len(self._waiters) >= self.max_queue and not self._displace(priority):
+            self._reject(label, "queue_full")
+
+        future = asyncio.get_running_loop().create_future()
+        entry = [priority, next(self._seq), future]
+        self._waiters.append(entry)
+        self._waiters.sort(key=lambda w: (w[0], w[1]))
+        self.stats["waited"] += 1
+        self._update_depth()
+
+        try:
+            await asyncio.wait({future}, timeout=self.queue_timeout)
+        except asyncio.CancelledError:
+            # The caller went away; pass on a slot that was granted meanwhile
+            if future.done() and not future.cancelled() and future.exception() is None:
+                self._release()
+            future.cancel()
+            self._update_depth()
+            raise
+
+        if not future.done():
+            future.cancel()
+            self._update_depth()
+            self._reject(label, "timeout")
+
+        self._update_depth()
+        if future.exception() is not None:
+            ADMISSION_WAIT.labels(priority=label).observe(time.monotonic() - started)
+            self._reject(label, future.exception().reason)
+        self._admitted(label, started)
+
+    def _release(self):
+        """Hand the slot to the next waiter, or free it"""
+        self._prune()
+        while self._waiters:
+            _, _, future = self._waiters.pop(0)
+            if not future.done():
+                future.set_result(True)
+                self._update_depth()
+                return
+        self.active -= 1
+        ADMISSION_ACTIVE.set(self.active)
+
+    def _displace(self, priority: Priority) -> bool:
+        """Reject the newest lowest-priority waiter to make room for `priority`"""
+        if not self._waiters or self._waiters[-1][0] <= priority:
+            return False
+        victim = self._waiters.pop()
+        victim[2].set_exception(AdmissionRejected("displaced", self.retry_after()))
+        return True
+
+    def _prune(self):
+        self._waiters = [w for w in self._waiters if not w[2].done()]
+
+    def _admitted(self, label: str, started: float):
+        self.stats["admitted"] += 1
+        ADMISSION_WAIT.labels(priority=label).observe(time.monotonic() - started)
+        ADMISSION_ACTIVE.set(self.active)
+
+    def _reject(self, label: str, reason: str):
+        self.stats["rejected"] += 1
+        ADMISSION_REJECTED.labels(priority=label, reason=reason).inc()
+        raise AdmissionRejected(reason, self.retry_after())
+
+    def _update_depth(self):
+        for p in Priority:
+            ADMISSION_QUEUE_DEPTH.labels(priority=p.name.lower()).set(self.queue_depth(p))
+
+
+@lru_cache()
+def get_admission_controller() -> AdmissionController:
+    """Get the process-wide admission controller"""
+    settings = get_settings()
+    return AdmissionController(
+        max_concurrency=settings.admission_max_concurrency,
+        max_queue=settings.admission_max_queue,
+        queue_timeout=settings.admission_queue_timeout
+    )
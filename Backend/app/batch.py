@@ -0,0 +1,167 @@
+"""
+Batch planning for `/plan/batch`
+
+Partner integrations plan many trips at once (e.g. one destination in every
+travel style for a comparison page). Within a batch:
+
+- context is retrieved once per distinct destination and travel style and
+  shared by every item that needs it;
+- identical items share one generation, which is also coalesced with
+  identical `/plan` requests in flight;
+- at most `Settings.batch_max_concurrency` generations run at a time, each
+  admitted at `Priority.BATCH` so interactive `/plan` traffic goes first;
+- results are yielded as soon as each item finishes (completion order).
+
+A failing item yields an error result; the rest of the batch continues.
+Every successful item is saved to the caller's history like a `/plan` result.
+"""
+import asyncio
+import sys
+import time
+from typing import Any, AsyncIterator, Dict, Hashable, List
+
+from prometheus_client import Counter
+from starlette.concurrency import run_in_threadpool
+
+from app.admission import AdmissionRejected, Priority, get_admission_controller
+from app.coalesce import get_plan_coalescer, plan_request_key
+from app.config import get_settings
+from app.generate import generate_itinerary, load_plan_context
+from app.precompute import lookup_precomputed
+from app.resilience import ProviderUnavailable
+from app.schemas import Itinerary, PlanRequest
+from app.storage import save_itinerary
+
+
+BATCH_ITEMS = Counter(
+    "wandergenie_batch_items_total",
+    "Batch planning items by result",
+    ["status"]
+)
+
+BATCH_SHARED_WORK = Counter(
+    "wandergenie_batch_shared_work_total",
+    "Batch work items by kind (context, generation) and role (computed or shared)",
+    ["kind", "role"]
+)
+
+
+def context_key(request: PlanRequest) -> tuple:
+    """Key of the retrieval work of a request: normalized destination and travel style"""
+    destination, _, _, travel_style = plan_request_key(request)
+    return (destination, travel_style)
+
+
+class BatchPlanner:
+    """Plans the items of one batch, sharing retrieval and generation work"""
+
+    def __init__(self, user: dict, max_concurrency: int):
+        self.user = user
+        self._slots = asyncio.Semaphore(max_concurrency)
+        self._contexts: Dict[Hashable, asyncio.Task] = {}
+        self._generations: Dict[Hashable, asyncio.Task] = {}
+
+    async def plan(self, index: int, request: PlanRequest) -> Dict[str, Any]:
+        """
+        Plan and save one item.
+
+        Args:
+            index: Position of the item in the batch
+            request: Travel planning request
+
+        Returns:
+            Result line: {"index", "status": "ok", "id", "itinerary"} or
+            {"index", "status": "error", "status_code", "error"[, "retry_after"]}
+        """
+        try:
+            itinerary = await self._shared(
+                self._generations, plan_request_key(request), "generation",
+                lambda: self._generate(request)
+            )
+            itinerary_data = itinerary.model_dump()
+            itinerary_id = await run_in_threadpool(
+                save_itinerary, itinerary_data, self.user, generation=itinerary.generation
+            )
+        except (AdmissionRejected, ProviderUnavailable) as e:
+            BATCH_ITEMS.labels(status="busy").inc()
+            return {"index": index, "status": "error", "status_code": 503,
+                    "error": str(e), "retry_after": e.retry_after}
+        except Exception as e:
+            print(f"❌ Error generating batch item {index}: {e}", file=sys.stderr)
+            BATCH_ITEMS.labels(status="error").inc()
+            return {"index": index, "status": "error", "status_code": 500,
+                    "error": f"Failed to generate itinerary: {str(e)}"}
+
+        BATCH_ITEMS.labels(status="ok").inc()
+        return {"index": index, "status": "ok", "id": str(itinerary_id), "itinerary": itinerary_data}
+
+    async def _generate(self, request: PlanRequest) -> Itinerary:
+        precomputed = await lookup_precomputed(request)
+        if precomputed is not None:
+            return precomputed
+        async with self._slots:
+            async def load_context():
+                # Retrieval and embedding calls are admitted like generation
+                async with get_admission_controller().admit(Priority.BATCH):
+                    return await run_in_threadpool(load_plan_context, request)
+
+            context = await self._shared(self._contexts, context_key(request), "context", load_context)
+
+            async def generate():
+                async with get_admission_controller().admit(Priority.BATCH):
+                    return await run_in_threadpool(generate_itinerary, request, context)
+
+            if get_settings().plan_coalescing_enabled:
+                return await get_plan_coalescer().run(plan_request_key(request), generate)
+            return await generate()
+
+    async def _shared(self, tasks: Dict[Hashable, asyncio.Task], key: Hashable, kind: str, func):
+        """Run `func` once per key for the whole batch and share its result"""
+        task = tasks.get(key)
+        if task is None:
+            BATCH_SHARED_WORK.labels(kind=kind, role="computed").inc()
+            task = tasks[key] = asyncio.ensure_future(func())
+        else:
+            BATCH_SHARED_WORK.labels(kind=kind, role="shared").inc()
+        return await asyncio.shield(task)
+
+    def cancel(self):
+        """Cancel outstanding work (e.g. after the client disconnected)"""
+        for task in list(self._generations.values()) + list(self._contexts.values()):
+            task.cancel()
+
+
+async def plan_batch(requests: List[PlanRequest], user: dict) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Plan a batch of trips, yielding results in completion order.
+
+    Args:
+        requests: Travel planning requests
+        user: Authenticated user document (owner of the saved itineraries)
+
+    Yields:
+        One result per item (see `BatchPlanner.plan`), then a summary
+        {"done": true, "total", "succeeded", "failed", "elapsed_s"}
+    """
+    started = time.perf_counter()
+    planner = BatchPlanner(user, get_settings().batch_max_concurrency)
+    items = [asyncio.ensure_future(planner.plan(i, request)) for i, request in enumerate(requests)]
+    succeeded = 0
+
+    try:
+        for next_done in asyncio.as_completed(items):
+            result = await next_done
+            succeeded += result["status"] == "ok"
+            yield result
+    finally:
+        for item in items:
+            item.cancel()
+        planner.cancel()
+
+    yield {
+        "done": True,
+        "total": len(requests),
+        "succeeded": succeeded,
+        "failed": len(requests) - succeeded,
+        "elapsed_s": round(time.perf_counter() - started, 3),
+    }
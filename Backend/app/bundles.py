@@ -0,0 +1,256 @@
+"""
+Precomputed per-destination context bundles
+
+For a known destination the context `generate_itinerary` feeds into the
+prompt depends only on the destination and travel style. Instead of an
+embedding call and a vector search per request, ingestion materializes a
+ranked, deduplicated bundle for every destination x travel style into the
+`context_bundles` collection, and `/plan` reads it with one lookup by `_id`.
+
+Each bundle records the destination's corpus generation it was built
+from; once a document for the destination is ingested the generation moves
+on, `/plan` ignores the bundle (live retrieval) and a rebuild is scheduled.
+Rebuilds run in the background `Settings.context_bundle_rebuild_delay`
+seconds after the last ingest, because the Atlas vector index is updated
+asynchronously and a search right after `insert_many` would miss the new
+chunks. A rebuild that finds no chunks for a destination that has some is
+retried later.
+"""
+import re
+import sys
+import threading
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from app.config import get_settings
+from app.corpus import get_active_embedding, get_generations, normalize_destination
+from app.db import get_collection, get_database
+from app.metrics import CONTEXT_BUNDLE_LOOKUPS, track_stage
+from app.retrieve import retrieve_with_scores
+from app.schemas import TravelStyle
+
+
+# Candidates fetched per bundle before deduplication
+OVERFETCH_FACTOR = 3
+
+# Word-shingle Jaccard similarity above which two chunks count as duplicates
+DUPLICATE_SIMILARITY = 0.8
+
+# Scheduled rebuilds of a destination that still finds no chunks in the index
+MAX_REBUILD_ATTEMPTS = 3
+
+
+def get_bundles_collection():
+    """Get context bundles collection"""
+    return get_database()["context_bundles"]
+
+
+def context_query(destination: str, travel_style) -> str:
+    """
+    Build the retrieval query for a destination and travel style.
+    
+    Args:
+        destination: Destination string (e.g., "Tokyo, Japan")
+        travel_style: TravelStyle (or its value)
+        
+    Returns:
+        Search query text
+    """
+    style = getattr(travel_style, "value", travel_style)
+    return f"{destination} {style} travel guide attractions hotels transport budget"
+
+
+def bundle_id(destination_key: str, travel_style) -> str:
+    """Bundle `_id` for a destination key and travel style"""
+    return f"{destination_key}:{getattr(travel_style, 'value', travel_style)}"
+
+
+def _shingles(text: str, size: int = 5) -> set:
+    words = re.findall(r"\w+", text.lower())
+    if len(words) <= size:
+        return {" ".join(words)}
+    return {" ".join(words[i:i + size]) for i in range(len(words) - size + 1)}
+
+
+def deduplicate(results: List[Dict], limit: int) -> List[Dict]:
+    """
+    Drop near-duplicate chunks, keeping the highest-ranked copy.
+    
+    Args:
+        results: Search results ordered by score (best first)
+        limit: Maximum number of chunks to keep
+        
+    Returns:
+        Deduplicated results, still ordered by score
+    """
+    kept, kept_shingles = [], []
+    for result in sorted(results, key=lambda r: r.get("score", 0), reverse=True):
+        shingles = _shingles(result["text"])
+        if any(len(shingles & other) / len(shingles | other) >= DUPLICATE_SIMILARITY for other in kept_shingles):
+            continue
+        kept.append(result)
+        kept_shingles.append(shingles)
+        if len(kept) == limit:
+            break
+    return kept
+
+
+def build_destination_bundles(destination: str) -> int:
+    """
+    Rebuild the context bundles of one destination for every travel style.
+    
+    Args:
+        destination: Destination name as stored in chunk metadata
+        
+    Returns:
+        Number of bundles written
+    """
+    settings = get_settings()
+    destination_key = normalize_destination(destination)
+    if not destination_key:
+        return 0
+    
+    # Read before searching: chunks ingested during the build make the bundle stale
+    corpus_generation = get_generations([destination_key])[destination_key]
+    collection = get_bundles_collection()
+    collection.delete_many({"destination_key": destination_key})
+    
+    written = 0
+    for style in TravelStyle:
+        with track_stage("ingest", "context_bundle"):
+            results = retrieve_with_scores(
+                context_query(destination, style),
+                top_k=settings.top_k_results * OVERFETCH_FACTOR,
+                destination=destination
+            )
+            chunks = deduplicate(results, settings.top_k_results)
+        if not chunks:
+            continue
+        
+        collection.replace_one(
+            {"_id": bundle_id(destination_key, style)},
+            {
+                "destination_key": destination_key,
+                "travel_style": style.value,
+                "embedding_model": get_active_embedding()["model"],
+                "top_k": settings.top_k_results,
+                "texts": [c["text"] for c in chunks],
+                "scores": [c.get("score") for c in chunks],
+                "corpus_generation": corpus_generation,
+                "built_at": datetime.utcnow()
+            },
+            upsert=True
+        )
+        written += 1
+    
+    return written
+
+
+_pending_rebuilds: Dict[str, threading.Timer] = {}
+_pending_lock = threading.Lock()
+
+
+def schedule_bundle_rebuild(destination: str, delay: Optional[float] = None,
+                            restart: bool = True, attempt: int = 1):
+    """
+    Rebuild a destination's bundles in the background after a delay.
+
+    Args:
+        destination: Destination name as stored in chunk metadata
+        delay: Seconds to wait (default `Settings.context_bundle_rebuild_delay`)
+        restart: Restart the delay of a rebuild already pending (after an
+            ingest, so a burst of ingests causes one rebuild after the last);
+            otherwise keep the pending one
+        attempt: Rebuilds of this destination that found no chunks so far + 1
+    """
+    destination_key = normalize_destination(destination)
+    if not destination_key:
+        return
+    if delay is None:
+        delay = get_settings().context_bundle_rebuild_delay
+    timer = threading.Timer(delay, _run_scheduled_rebuild, args=(destination, attempt))
+    timer.daemon = True
+    with _pending_lock:
+        previous = _pending_rebuilds.get(destination_key)
+        if previous is not None:
+            if not restart:
+                return
+            previous.cancel()
+        _pending_rebuilds[destination_key] = timer
+    timer.start()
+
+
+def _run_scheduled_rebuild(destination: str, attempt: int):
+    with _pending_lock:
+        _pending_rebuilds.pop(normalize_destination(destination), None)
+    try:
+        written = build_destination_bundles(destination)
+        if written or attempt >= MAX_REBUILD_ATTEMPTS:
+            return
+        if get_collection().count_documents(
+            {"metadata.destination_key": normalize_destination(destination)}, limit=1
+        ):
+            # Chunks exist but the index does not return them yet
+            delay = get_settings().context_bundle_rebuild_delay * 2 ** attempt
+            schedule_bundle_rebuild(destination, delay, restart=False, attempt=attempt + 1)
+    except Exception as e:
+        print(f"⚠️  Could not rebuild context bundles for {destination}: {e}", file=sys.stderr)
+
+
+def flush_bundle_rebuilds() -> int:
+    """
+    Run pending rebuilds now, in this thread (when the index is known to be current).
+
+    Returns:
+        Number of bundles written
+    """
+    with _pending_lock:
+        pending = list(_pending_rebuilds.values())
+        _pending_rebuilds.clear()
+    written = 0
+    for timer in pending:
+        timer.cancel()
+        written += build_destination_bundles(timer.args[0])  # the destination
+    return written
+
+
+def get_context_bundle(destination: str, travel_style) -> Optional[List[str]]:
+    """
+    Look up the precomputed context for a destination and travel style.
+    
+    Args:
+        destination: Destination string (e.g., "Tokyo, Japan")
+        travel_style: TravelStyle (or its value)
+        
+    Returns:
+        Context texts, or None if no usable bundle exists
+    """
+    settings = get_settings()
+    destination_key = normalize_destination(destination)
+    if not settings.context_bundles_enabled or not destination_key:
+        return None
+    
+    bundle = get_bundles_collection().find_one(
+        {"_id": bundle_id(destination_key, travel_style)},
+        {"texts": 1, "embedding_model": 1, "top_k": 1, "corpus_generation": 1}
+    )
+    # Bundles built for another model or result size are ignored until rebuilt
+    if (not bundle or bundle.get("embedding_model") != get_active_embedding()["model"]
+            or bundle.get("top_k") != settings.top_k_results):
+        CONTEXT_BUNDLE_LOOKUPS.labels(result="miss").inc()
+        return None
+    # Built before the destination's latest ingest: live retrieval until rebuilt
+    if bundle.get("corpus_generation") != get_generations([destination_key])[destination_key]:
+        CONTEXT_BUNDLE_LOOKUPS.labels(result="stale").inc()
+        schedule_bundle_rebuild(destination, restart=False)
+        return None
+    
+    CONTEXT_BUNDLE_LOOKUPS.labels(result="hit").inc()
+    return bundle["texts"]
+
+
+def ensure_bundle_indexes():
+    """
+    Create the index used to replace a destination's bundles.
+    """
+    get_bundles_collection().create_index("destination_key")
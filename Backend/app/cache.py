@@ -0,0 +1,368 @@
+"""
+Cross-worker shared cache backed by SQLite in WAL mode
+
+All uvicorn workers on a host open the same database file, so a value
+computed by one worker (a query embedding, a retrieval result, a saved
+itinerary) is available to the others instead of being warmed separately
+per process. WAL mode lets readers proceed while a writer commits; every
+write runs in its own transaction, so readers never see partial updates.
+
+The cache is bounded by `Settings.cache_max_bytes`: when an insert pushes
+the total value size over the limit, the least recently used entries are
+evicted down to 90% of it. Access times are refreshed at most once per
+`ACCESS_RESOLUTION` seconds per entry to keep reads write-free.
+
+Each worker counts its own hits and misses per namespace and periodically
+records them in the database, so `SharedCache.worker_stats()` can report
+hit rates for every worker.
+
+The cache is an optimization: a busy database only turns a lookup into a
+miss, and a cache that cannot be opened or keeps failing is disabled for
+the rest of the process instead of failing requests.
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+from functools import lru_cache
+from typing import Any, Dict, Iterable, List, Optional
+
+from prometheus_client import Counter
+
+from app.config import get_settings
+
+
+ACCESS_RESOLUTION = 30.0       # seconds between access-time refreshes of an entry
+EVICT_TO_RATIO = 0.9           # evict down to this share of max_bytes
+STATS_FLUSH_INTERVAL = 10.0    # seconds between per-worker stats writes
+
+CACHE_REQUESTS = Counter(
+    "wandergenie_cache_requests_total",
+    "Shared cache lookups",
+    ["namespace", "result"]
+)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    namespace   TEXT NOT NULL,
+    key         TEXT NOT NULL,
+    value       BLOB NOT NULL,
+    size        INTEGER NOT NULL,
+    expires_at  REAL,
+    accessed_at REAL NOT NULL,
+    PRIMARY KEY (namespace, key)
+);
+CREATE INDEX IF NOT EXISTS entries_accessed_at ON entries (accessed_at);
+CREATE TABLE IF NOT EXISTS meta (
+    name  TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+INSERT OR IGNORE INTO meta (name, value) VALUES ('total_bytes', 0);
+CREATE TABLE IF NOT EXISTS worker_stats (
+    pid        INTEGER NOT NULL,
+    namespace  TEXT NOT NULL,
+    hits       INTEGER NOT NULL,
+    misses     INTEGER NOT NULL,
+    updated_at REAL NOT NULL,
+    PRIMARY KEY (pid, namespace)
+);
+"""
+
+
+class SharedCache:
+    """Size-bounded key/value cache shared by all processes on a host"""
+
+    def __init__(self, path: str, max_bytes: int):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.pid = os.getpid()
+        self._local = threading.local()
+        self._stats_lock = threading.Lock()
+        self._stats: Dict[str, Dict[str, int]] = {}
+        self._stats_flushed_at = time.time()
+
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._connect().executescript(SCHEMA)
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            # Autocommit mode; writes use explicit BEGIN IMMEDIATE transactions
+            conn = sqlite3.connect(self.path, timeout=5.0, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    # ----- reads -----
+
+    def get(self, namespace: str, key: str) -> Optional[Any]:
+        """
+        Look up a value.
+
+        Args:
+            namespace: Cache namespace (e.g. "embeddings")
+            key: Entry key
+
+        Returns:
+            Cached value or None
+        """
+        return self.get_many(namespace, [key]).get(key)
+
+    def get_many(self, namespace: str, keys: Iterable[str]) -> Dict[str, Any]:
+        """
+        Look up several values at once.
+
+        Returns:
+            Dict of the keys that were found
+        """
+        keys = list(keys)
+        if not keys:
+            return {}
+
+        now = time.time()
+        conn = self._connect()
+        found = {}
+        stale = []
+        for i in range(0, len(keys), 500):
+            batch = keys[i:i + 500]
+            rows = conn.execute(
+                f"SELECT key, value, expires_at, accessed_at FROM entries "
+                f"WHERE namespace = ? AND key IN ({','.join('?' * len(batch))})",
+                [namespace, *batch]
+            ).fetchall()
+            for key, value, expires_at, accessed_at in rows:
+                if expires_at is not None and expires_at <= now:
+                    continue
+                found[key] = json.loads(value)
+                if now - accessed_at > ACCESS_RESOLUTION:
+                    stale.append(key)
+
+        if stale:
+            try:
+                conn.executemany(
+                    "UPDATE entries SET accessed_at = ? WHERE namespace = ? AND key = ?",
+                    [(now, namespace, key) for key in stale]
+                )
+            except sqlite3.OperationalError:
+                pass  # best effort; a busy database only delays the LRU refresh
+
+        self._record(namespace, hits=len(found), misses=len(keys) - len(found))
+        return found
+
+    # ----- writes -----
+
+    def set(self, namespace: str, key: str, value: Any, ttl: Optional[float] = None):
+        """
+        Store a value (JSON-serializable).
+
+        Args:
+            namespace: Cache namespace
+            key: Entry key
+            value: Value to store
+            ttl: Optional time-to-live in seconds
+        """
+        self.set_many(namespace, {key: value}, ttl)
+
+    def set_many(self, namespace: str, items: Dict[str, Any], ttl: Optional[float] = None):
+        """Store several values in one transaction"""
+        if not items:
+            return
+
+        now = time.time()
+        expires_at = now + ttl if ttl else None
+        rows = []
+        for key, value in items.items():
+            blob = json.dumps(value, separators=(",", ":")).encode("utf-8")
+            rows.append((namespace, key, blob, len(blob), expires_at, now))
+
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            for row in rows:
+                previous = conn.execute(
+                    "SELECT size FROM entries WHERE namespace = ? AND key = ?", row[:2]
+                ).fetchone()
+                conn.execute(
+                    "INSERT INTO entries (namespace, key, value, size, expires_at, accessed_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?) "
+                    "ON CONFLICT (namespace, key) DO UPDATE SET value = excluded.value, "
+                    "size = excluded.size, expires_at = excluded.expires_at, accessed_at = excluded.accessed_at",
+                    row
+                )
+                delta = row[3] - (previous[0] if previous else 0)
+                conn.execute("UPDATE meta SET value = value + ? WHERE name = 'total_bytes'", (delta,))
+            self._evict(conn)
+            conn.execute("COMMIT")
+        except Exception:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            raise
+
+    def delete(self, namespace: str, key: str):
+        """Remove an entry"""
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute(
+                "DELETE FROM entries WHERE namespace = ? AND key = ? RETURNING size", (namespace, key)
+            ).fetchone()
+            if row:
+                conn.execute("UPDATE meta SET value = value - ? WHERE name = 'total_bytes'", (row[0],))
+            conn.execute("COMMIT")
+        except Exception:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            raise
+
+    def _evict(self, conn: sqlite3.Connection):
+        """Drop expired, then least recently used entries (inside a write transaction)"""
+        total = conn.execute("SELECT value FROM meta WHERE name = 'total_bytes'").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+
+        freed = conn.execute(
+            "DELETE FROM entries WHERE expires_at IS NOT NULL AND expires_at <= ? RETURNING size", (time.time(),)
+        ).fetchall()
+        total -= sum(size for size, in freed)
+
+        target = int(self.max_bytes * EVICT_TO_RATIO)
+        while total > target:
+            victims = conn.execute(
+                "SELECT namespace, key, size FROM entries ORDER BY accessed_at LIMIT 100"
+            ).fetchall()
+            if not victims:
+                break
+            for namespace, key, size in victims:
+                conn.execute("DELETE FROM entries WHERE namespace = ? AND key = ?", (namespace, key))
+                total -= size
+                if total <= target:
+                    break
+
+        conn.execute("UPDATE meta SET value = ? WHERE name = 'total_bytes'", (max(total, 0),))
+
+    # ----- stats -----
+
+    def _record(self, namespace: str, hits: int, misses: int):
+        if hits:
+            CACHE_REQUESTS.labels(namespace=namespace, result="hit").inc(hits)
+        if misses:
+            CACHE_REQUESTS.labels(namespace=namespace, result="miss").inc(misses)
+
+        with self._stats_lock:
+            counts = self._stats.setdefault(namespace, {"hits": 0, "misses": 0})
+            counts["hits"] += hits
+            counts["misses"] += misses
+            due = time.time() - self._stats_flushed_at >= STATS_FLUSH_INTERVAL
+
+        if due:
+            self.flush_stats()
+
+    def flush_stats(self):
+        """Record this worker's hit/miss counts in the shared database"""
+        with self._stats_lock:
+            snapshot = {ns: dict(counts) for ns, counts in self._stats.items()}
+            self._stats_flushed_at = time.time()
+        try:
+            self._connect().executemany(
+                "INSERT INTO worker_stats (pid, namespace, hits, misses, updated_at) VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT (pid, namespace) DO UPDATE SET hits = excluded.hits, "
+                "misses = excluded.misses, updated_at = excluded.updated_at",
+                [(self.pid, ns, c["hits"], c["misses"], self._stats_flushed_at) for ns, c in snapshot.items()]
+            )
+        except sqlite3.OperationalError:
+            pass
+
+    def local_stats(self) -> Dict[str, Dict[str, float]]:
+        """Hit/miss counts and hit rate for this worker"""
+        with self._stats_lock:
+            return {ns: _with_rate(c["hits"], c["misses"]) for ns, c in self._stats.items()}
+
+    def worker_stats(self) -> List[Dict[str, Any]]:
+        """Hit/miss counts and hit rate for every worker that used the cache"""
+        self.flush_stats()
+        rows = self._connect().execute(
+            "SELECT pid, namespace, hits, misses, updated_at FROM worker_stats ORDER BY pid, namespace"
+        ).fetchall()
+        return [
+            {"pid": pid, "namespace": ns, "updated_at": updated_at, **_with_rate(hits, misses)}
+            for pid, ns, hits, misses, updated_at in rows
+        ]
+
+    def size(self) -> Dict[str, int]:
+        """Entry count and total stored bytes"""
+        conn = self._connect()
+        entries = conn.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+        total = conn.execute("SELECT value FROM meta WHERE name = 'total_bytes'").fetchone()[0]
+        return {"entries": entries, "bytes": total, "max_bytes": self.max_bytes}
+
+
+def _with_rate(hits: int, misses: int) -> Dict[str, float]:
+    lookups = hits + misses
+    return {"hits": hits, "misses": misses, "hit_rate": round(hits / lookups, 4) if lookups else 0.0}
+
+
+_disabled_reason: Optional[str] = None
+
+
+def _disable(reason: str):
+    """Stop using the shared cache in this process (it is treated as disabled)"""
+    global _disabled_reason
+    if _disabled_reason is None:
+        print(f"⚠️  Shared cache disabled for this process: {reason}")
+    _disabled_reason = reason
+    get_shared_cache.cache_clear()
+
+
+@lru_cache()
+def get_shared_cache() -> Optional[SharedCache]:
+    """Get the process-wide shared cache (None when disabled or unusable)"""
+    settings = get_settings()
+    if not settings.cache_enabled or _disabled_reason is not None:
+        return None
+    try:
+        return SharedCache(settings.cache_path, settings.cache_max_bytes)
+    except Exception as e:
+        _disable(f"cannot open {settings.cache_path}: {e}")
+        return None
+
+
+def cache_get_many(namespace: str, keys: List[str]) -> Dict[str, Any]:
+    """Look up several values, treating a disabled or failing cache as a miss"""
+    try:
+        cache = get_shared_cache()
+        if cache is None:
+            return {}
+        return cache.get_many(namespace, keys)
+    except sqlite3.OperationalError as e:
+        # Busy or locked database: transient, only this lookup misses
+        print(f"⚠️  Shared cache read failed: {e}")
+        return {}
+    except Exception as e:
+        _disable(f"read failed: {e}")
+        return {}
+
+
+def cache_get(namespace: str, key: str) -> Optional[Any]:
+    """Look up a value, treating a disabled or failing cache as a miss"""
+    return cache_get_many(namespace, [key]).get(key)
+
+
+def cache_set_many(namespace: str, items: Dict[str, Any], ttl: Optional[float] = None):
+    """Store several values, ignoring a disabled or failing cache"""
+    try:
+        cache = get_shared_cache()
+        if cache is None:
+            return
+        cache.set_many(namespace, items, ttl)
+    except sqlite3.OperationalError as e:
+        print(f"⚠️  Shared cache write failed: {e}")
+    except Exception as e:
+        _disable(f"write failed: {e}")
+
+
+def cache_set(namespace: str, key: str, value: Any, ttl: Optional[float] = None):
+    """Store a value, ignoring a disabled or failing cache"""
+    cache_set_many(namespace, {key: value}, ttl)
@@ -0,0 +1,241 @@
+"""
+Token-budget chunking for ingestion
+
+Documents are segmented in one linear pass over their lines: section
+headers ("## Transportation", "3. **Transportation**:", "Accommodation:")
+start a new section, and every other line is split into sentences. The
+segments are then packed greedily into chunks of at most
+`Settings.chunk_tokens` tokens:
+
+- a chunk is closed at a section header once it holds `chunk_min_tokens`,
+  so chunks follow the guide's sections where possible;
+- a chunk that fills up inside a section carries its last
+  `chunk_overlap_tokens` worth of sentences into the next chunk (0 disables
+  overlap) and the next chunk repeats the section header;
+- a tail shorter than `chunk_min_tokens` is merged into the previous chunk
+  instead of costing an embedding call of its own;
+- sentences longer than the budget are split at word boundaries.
+
+Token counts are estimated as one token per four characters (at least one
+per word), the usual rule of thumb for subword tokenizers on English text;
+close enough for budgeting without loading a tokenizer.
+"""
+import re
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from app.config import get_settings
+
+
+# Characters per token of a typical subword tokenizer on English text
+CHARS_PER_TOKEN = 4
+
+# "## Transportation", "3. **Transportation** (costs):", "**Transportation**: text"
+_MARKDOWN_HEADER_RE = re.compile(r"^#{1,6}\s+(.+?)\s*#*$")
+_BOLD_HEADER_RE = re.compile(r"^(?:\d+[.)]\s+)?\*\*([^*]{1,80})\*\*\s*(?:\([^)]*\))?\s*:?\s*(.*)$")
+# "Transportation:" on its own line, or "Transportation: JR Pass ..." (label of 1-3 words)
+_LABEL_HEADER_RE = re.compile(r"^(?:\d+[.)]\s+)?([A-Z][\w&/'-]*(?: [\w&/'-]+){0,2}):(?:\s+(.*))?$")
+
+# Sentence boundary: terminal punctuation followed by whitespace and an uppercase letter, digit or quote
+_SENTENCE_BREAK_RE = re.compile(r"(?<=[.!?])\s+(?=[\"'(\[]?[A-Z0-9$€£¥])")
+
+# Segment: (text, tokens, section, starts_line, is_header)
+Segment = Tuple[str, int, Optional[str], bool, bool]
+
+
+def count_tokens(text: str) -> int:
+    """Estimated token count of a text"""
+    return max(len(text.split()), (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN)
+
+
+def _header(line: str) -> Tuple[Optional[str], str]:
+    """Section title of a header line and any text following it on the line"""
+    match = _MARKDOWN_HEADER_RE.match(line)
+    if match:
+        return match.group(1).strip("*: "), ""
+    match = _BOLD_HEADER_RE.match(line)
+    if match:
+        return match.group(1).strip(": "), match.group(2)
+    if not line.startswith(("-", "*", "•")):
+        match = _LABEL_HEADER_RE.match(line)
+        if match:
+            return match.group(1), match.group(2) or ""
+    return None, line
+
+
+def segment(text: str) -> Iterator[Segment]:
+    """
+    Split a document into header and sentence segments in one pass.
+
+    Args:
+        text: Document text
+
+    Yields:
+        (text, tokens, section, starts_line, is_header) tuples
+    """
+    section = None
+    for raw_line in text.splitlines():
+        line = raw_line.strip()
+        if not line:
+            continue
+
+        title, rest = _header(line)
+        if title:
+            section = title
+            header_text = line if not rest else line[:len(line) - len(rest)].rstrip()
+            yield header_text, count_tokens(header_text), section, True, True
+            line = rest.strip()
+            if not line:
+                continue
+
+        starts_line = title is None
+        for sentence in _SENTENCE_BREAK_RE.split(line):
+            if sentence:
+                yield sentence, count_tokens(sentence), section, starts_line, False
+                starts_line = False
+
+
+def _pieces(text: str, max_tokens: int) -> Iterator[str]:
+    """Words of a text, with words over the budget (URLs, CJK text) cut by characters"""
+    width = max_tokens * CHARS_PER_TOKEN
+    for word in text.split():
+        if len(word) <= width:
+            yield word
+        else:
+            for i in range(0, len(word), width):
+                yield word[i:i + width]
+
+
+def _split_long(seg: Segment, max_tokens: int) -> Iterator[Segment]:
+    """Split a segment over the budget at word boundaries (inside words that exceed it alone)"""
+    text, _, section, starts_line, is_header = seg
+    words: List[str] = []
+    tokens = 0
+    for word in _pieces(text, max_tokens):
+        word_tokens = count_tokens(word)
+        if words and tokens + word_tokens > max_tokens:
+            yield " ".join(words), tokens, section, starts_line, is_header
+            words, tokens, starts_line = [], 0, False
+        words.append(word)
+        tokens += word_tokens
+    if words:
+        yield " ".join(words), tokens, section, starts_line, is_header
+
+
+class _Packer:
+    """Greedy packing of segments into token-budget chunks"""
+
+    def __init__(self, max_tokens: int, overlap_tokens: int, min_tokens: int):
+        self.max_tokens = max_tokens
+        self.overlap_tokens = overlap_tokens
+        self.min_tokens = min_tokens
+        self.chunks: List[Dict] = []
+        self.segments: List[Segment] = []
+        self.tokens = 0
+        self.carried = 0  # leading segments repeated from the previous chunk
+        self.header: Optional[Segment] = None
+
+    def add(self, seg: Segment):
+        if seg[4]:
+            if self.tokens >= self.min_tokens or self.tokens + seg[1] > self.max_tokens:
+                self.flush(carry=False)
+            self.header = seg
+        elif self.segments and self.tokens + seg[1] > self.max_tokens:
+            self.flush(carry=True)
+            # Drop carried context (header last) until the segment fits
+            while self.segments and self.tokens + seg[1] > self.max_tokens:
+                dropped = self.segments.pop(1 if len(self.segments) > 1 and self.segments[0][4] else 0)
+                self.tokens -= dropped[1]
+                self.carried -= 1
+        self.segments.append(seg)
+        self.tokens += seg[1]
+
+    def flush(self, carry: bool):
+        if not self.segments:
+            return
+        self.chunks.append({"segments": self.segments, "tokens": self.tokens, "carried": self.carried})
+
+        kept: List[Segment] = []
+        if carry:
+            budget = self.overlap_tokens
+            for seg in reversed(self.segments):
+                if seg[4] or seg[1] > budget:
+                    break
+                kept.append(seg)
+                budget -= seg[1]
+            kept.reverse()
+            # Continue the section under its header
+            header = self.header
+            if header is not None and header[2] == self.segments[-1][2]:
+                kept.insert(0, header)
+
+        self.segments = kept
+        self.tokens = sum(s[1] for s in kept)
+        self.carried = len(kept)
+
+    def finish(self) -> List[Dict]:
+        if self.segments and self.tokens > sum(s[1] for s in self.segments[:self.carried]):
+            self.flush(carry=False)
+
+        # Merge a short tail into the previous chunk
+        if len(self.chunks) > 1:
+            last, previous = self.chunks[-1], self.chunks[-2]
+            fresh = last["segments"][last["carried"]:]
+            fresh_tokens = sum(s[1] for s in fresh)
+            if fresh_tokens < self.min_tokens and previous["tokens"] + fresh_tokens <= self.max_tokens + self.min_tokens:
+                previous["segments"] = previous["segments"] + fresh
+                previous["tokens"] += fresh_tokens
+                self.chunks.pop()
+
+        return [_render(chunk) for chunk in self.chunks]
+
+
+def _render(chunk: Dict) -> Dict:
+    parts: List[str] = []
+    section_tokens: Dict[Optional[str], int] = {}
+    for i, (text, tokens, section, starts_line, _) in enumerate(chunk["segments"]):
+        if i:
+            parts.append("\n" if starts_line else " ")
+        parts.append(text)
+        section_tokens[section] = section_tokens.get(section, 0) + tokens
+
+    sections = [s for s in section_tokens if s is not None]
+    return {
+        "text": "".join(parts),
+        "tokens": chunk["tokens"],
+        "section": max(sections, key=section_tokens.get) if sections else None,
+        "sections": sections,
+    }
+
+
+def chunk_document(text: str, max_tokens: int = None, overlap_tokens: int = None,
+                   min_tokens: int = None) -> List[Dict]:
+    """
+    Split a document into token-budget chunks with section metadata.
+
+    Args:
+        text: Document text
+        max_tokens: Token budget per chunk (default from settings)
+        overlap_tokens: Tokens of sentences repeated from the previous chunk
+            of the same section (default from settings; 0 disables overlap)
+        min_tokens: Smallest chunk worth its own embedding (default from settings)
+
+    Returns:
+        List of chunks: {"text", "tokens", "section", "sections"}, where
+        `section` is the header covering most of the chunk (None before the
+        first header) and `sections` all headers it covers
+    """
+    settings = get_settings()
+    max_tokens = settings.chunk_tokens if max_tokens is None else max_tokens
+    overlap_tokens = settings.chunk_overlap_tokens if overlap_tokens is None else overlap_tokens
+    min_tokens = settings.chunk_min_tokens if min_tokens is None else min_tokens
+    if not 0 <= overlap_tokens < max_tokens:
+        raise ValueError("overlap_tokens must be at least 0 and smaller than max_tokens")
+
+    packer = _Packer(max_tokens, overlap_tokens, min(min_tokens, max_tokens))
+    for seg in segment(text):
+        if seg[1] > max_tokens:
+            for piece in _split_long(seg, max_tokens):
+                packer.add(piece)
+        else:
+            packer.add(seg)
+    return packer.finish()
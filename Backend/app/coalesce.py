@@ -0,0 +1,105 @@
+"""
+Request coalescing for identical in-flight `/plan` requests
+
+Double-clicks and many users planning the same promoted destination send
+identical `PlanRequest`s at the same time. The first request for a key runs
+the pipeline; requests with the same normalized key that arrive while it
+is in flight await the same result instead of paying for their own
+retrieval and LLM call. Callers persist the shared itinerary under their
+own user, so only the computation is shared.
+
+Coalescing is per worker process: the in-flight table lives on the event
+loop of the worker that received the request.
+"""
+import asyncio
+from typing import Awaitable, Callable, Dict, Hashable, TypeVar
+
+from prometheus_client import Counter, Gauge
+
+from app.schemas import PlanRequest
+
+
+T = TypeVar("T")
+
+COALESCED_REQUESTS = Counter(
+    "wandergenie_coalesced_requests_total",
+    "Requests by coalescing role: leader (ran the computation) or follower (shared it)",
+    ["operation", "role"]
+)
+
+COALESCING_IN_FLIGHT = Gauge(
+    "wandergenie_coalescing_in_flight",
+    "Distinct computations currently in flight",
+    ["operation"]
+)
+
+
+def plan_request_key(request: PlanRequest) -> tuple:
+    """
+    Normalized key of a planning request.
+
+    Destinations are compared case- and whitespace-insensitively and
+    budgets to the cent, so "tokyo,  Japan" and "Tokyo, Japan" coalesce.
+
+    Args:
+        request: Travel planning request
+
+    Returns:
+        Hashable key
+    """
+    destination = ", ".join(" ".join(part.split()) for part in request.destination.split(",")).casefold()
+    return (destination, request.days, round(request.budget, 2), request.travel_style.value)
+
+
+class SingleFlight:
+    """Runs one computation per key at a time and shares its result"""
+
+    def __init__(self, operation: str):
+        self.operation = operation
+        self._in_flight: Dict[Hashable, asyncio.Task] = {}
+
+    async def run(self, key: Hashable, func: Callable[[], Awaitable[T]]) -> T:
+        """
+        Run `func`, or join the in-flight run for the same key.
+
+        The computation is shielded: a caller that disconnects does not
+        cancel it for the others. Exceptions are raised to every waiter.
+
+        Args:
+            key: Coalescing key
+            func: Zero-argument coroutine function computing the result
+
+        Returns:
+            The (shared) result
+        """
+        task = self._in_flight.get(key)
+        if task is not None:
+            COALESCED_REQUESTS.labels(operation=self.operation, role="follower").inc()
+            return await asyncio.shield(task)
+
+        COALESCED_REQUESTS.labels(operation=self.operation, role="leader").inc()
+        task = asyncio.ensure_future(func())
+        self._in_flight[key] = task
+        COALESCING_IN_FLIGHT.labels(operation=self.operation).inc()
+        task.add_done_callback(lambda _: self._finish(key, task))
+        return await asyncio.shield(task)
+
+    def _finish(self, key: Hashable, task: asyncio.Task):
+        if self._in_flight.get(key) is task:
+            del self._in_flight[key]
+        COALESCING_IN_FLIGHT.labels(operation=self.operation).dec()
+        # Retrieve the exception so an abandoned failure is not logged as unhandled
+        if not task.cancelled():
+            task.exception()
+
+    def in_flight(self) -> int:
+        """Number of distinct computations in flight"""
+        return len(self._in_flight)
+
+
+_plan_flights = SingleFlight("plan")
+
+
+def get_plan_coalescer() -> SingleFlight:
+    """Get the process-wide coalescer for `/plan`"""
+    return _plan_flights
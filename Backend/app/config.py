@@ -2,9 +2,9 @@
 Configuration management using pydantic-settings
 """
 import os
-from pydantic_settings import BaseSettings
 from functools import lru_cache
-from google import genai
+from typing import Any, Dict, List, Optional
+from pydantic_settings import BaseSettings
 
 
 class Settings(BaseSettings):
@@ -18,19 +18,119 @@ class Settings(BaseSettings):
     mongodb_uri: str
     db_name: str = "wandergenie"
     collection_name: str = "travel_documents"
+    mongo_max_pool_size: int = 100  # connections per server per process
+    
+    # Health Probes (/health/ready)
+    health_probe_interval: float = 10.0  # seconds a probe result is reused
+    health_probe_timeout: float = 2.0  # seconds before a probe counts as timed out
+    health_critical_checks: List[str] = ["mongodb", "mongo_pool"]  # failing any of these sheds the worker
     
-    # Google Gemini Settings (for embeddings)
+    # Embedding Settings
+    # Gemini model name, or "local:<model>" for a CPU ONNX encoder (e.g. "local:BAAI/bge-small-en-v1.5")
     gemini_api_key: str
     embedding_model: str = "models/text-embedding-004"
+    local_embedding_batch_size: int = 32
+    local_embedding_threads: int = 2
+    vector_index_name: str = "vector_index"  # must match the embedding dimension of embedding_model
+    embedding_storage: str = "float32"  # "float32" / "int8" packed binary vectors, or legacy "array"
+    embedding_state_ttl: float = 10.0  # seconds a process reuses the active model read from MongoDB
+    
+    # Embedding Migration (re-embedding the corpus with a new model; see app/reembed.py)
+    reembed_worker_enabled: bool = True  # run migrations in the API process (otherwise scripts/reembed_corpus.py run)
+    reembed_batch_size: int = 100  # chunks per batch (one checkpoint per batch)
+    reembed_rate: float = 20.0  # max chunks embedded per second (0 = unlimited)
+    reembed_poll_interval: float = 30.0  # seconds between checks for a migration to work on
+    reembed_lease: float = 300.0  # seconds before another worker may take over a migration
+    reembed_switch_grace: float = 60.0  # seconds after the switch before chunks written with the old model are copied
     
     # Groq Settings (for content generation)
     groq_api_key: str
     generation_model: str = "llama-3.3-70b-versatile"  # Fast and capable model
+    # "json_object" (JSON mode), "json_schema" (structured outputs with the Itinerary
+    # schema; only on models that support it) or "text"
+    generation_response_format: str = "json_object"
+    repair_missing_days: bool = True  # re-request days missing from a truncated/invalid response
+    plan_coalescing_enabled: bool = True  # share one generation among identical concurrent /plan requests
+    generation_fallback_model: str = "llama-3.1-8b-instant"  # used when the primary model fails or its circuit is open ("" disables)
+    # Model routing rules, first match wins (JSON in env; see app/router.py)
+    generation_routes: List[Dict[str, Any]] = [
+        {"name": "short", "max_days": 3, "max_output_tokens": 2500, "latency_budget_s": 10,
+         "models": ["llama-3.1-8b-instant", "llama-3.3-70b-versatile"]},
+        {"name": "standard", "max_days": 14, "latency_budget_s": 30,
+         "models": ["llama-3.3-70b-versatile", "llama-3.1-8b-instant"]},
+        {"name": "long", "models": ["llama-3.3-70b-versatile"]},
+        {"name": "guide", "operation": "guide", "models": ["llama-3.3-70b-versatile", "llama-3.1-8b-instant"]},
+    ]
+    router_max_error_rate: float = 0.5  # models failing more often than this are demoted
+    
+    # Provider Resilience
+    plan_request_budget: float = 60.0  # seconds for all provider calls of one /plan
+    provider_timeout: float = 30.0  # max seconds per LLM call
+    embedding_timeout: float = 10.0  # max seconds per embedding call
+    hedge_enabled: bool = False  # start a second call when the first is slower than hedge_percentile
+    hedge_percentile: float = 95.0
+    hedge_min_samples: int = 20  # recent calls needed before hedging
+    breaker_failure_threshold: int = 5  # consecutive failures that open a circuit
+    breaker_reset_timeout: float = 30.0  # seconds before a probe call is let through
+    
+    # Admission Control (per worker, for /plan and /ingest)
+    admission_max_concurrency: int = 8
+    admission_max_queue: int = 32
+    admission_queue_timeout: float = 10.0  # seconds a request may wait before a 503
+    
+    # Asynchronous Plan Jobs (/plan/jobs)
+    plan_job_workers: int = 4  # jobs processed at once per worker process
+    plan_job_poll_interval: float = 2.0  # seconds between checks for jobs created elsewhere
+    plan_job_lease: float = 120.0  # seconds before a running job of a dead worker is requeued
+    plan_job_max_attempts: int = 3
+    plan_job_ttl_days: int = 7  # finished jobs are removed after this
+    
+    # Cache Warmup (hot destinations, in the background after startup)
+    warmup_enabled: bool = True
+    warmup_limit: int = 60  # destination x travel style pairs to warm
+    warmup_history_days: int = 30  # itineraries counted when picking hot destinations
+    warmup_concurrency: int = 2
+    
+    # Demand-driven Precomputation (guides and canonical itineraries; see app/precompute.py)
+    precompute_enabled: bool = False  # opt-in: spends LLM tokens in the background
+    precompute_window: str = "01:00-06:00"  # off-peak hours, UTC ("" = any time)
+    precompute_interval: float = 900.0  # seconds between scheduler cycles
+    precompute_daily_tokens: int = 200_000  # LLM tokens precomputation may use per UTC day
+    precompute_top_combinations: int = 50  # destination x days x travel style combinations kept precomputed
+    precompute_min_requests: int = 3  # requests before a combination is precomputed
+    precompute_history_days: int = 30  # itineraries counted as demand
+    precompute_ttl_days: int = 7  # canonical itineraries are rebuilt after this
+    precompute_budget_tolerance: float = 0.15  # served when the request budget is within this fraction
+    
+    # Batch Planning (/plan/batch)
+    batch_max_items: int = 50
+    batch_max_concurrency: int = 4  # generations of one batch running at once
     
     # RAG Settings
-    chunk_size: int = 1000
-    chunk_overlap: int = 200
+    chunk_tokens: int = 256  # token budget per chunk
+    chunk_overlap_tokens: int = 32  # repeated from the previous chunk of a section (0 = none)
+    chunk_min_tokens: int = 64  # shorter tails are merged into the previous chunk
+    # Deprecated character-based chunking settings: still accepted so older .env
+    # files load, but ignored (use chunk_tokens / chunk_overlap_tokens)
+    chunk_size: Optional[int] = None
+    chunk_overlap: Optional[int] = None
+    dedup_mode: str = "skip"  # near-duplicate chunks at ingest: "skip", "replace" (stored copy) or "off"
+    dedup_threshold: float = 0.8  # estimated Jaccard similarity of word 3-shingles
     top_k_results: int = 5
+    context_bundles_enabled: bool = True  # precompute context per destination x travel style at ingest
+    context_bundle_rebuild_delay: float = 15.0  # seconds after an ingest, for the vector index to catch up
+    
+    # Shared Cache (SQLite in WAL mode, shared by all workers on a host)
+    cache_enabled: bool = True
+    cache_path: str = "data/cache.sqlite3"
+    cache_max_bytes: int = 256 * 1024 * 1024
+    cache_retrieval_ttl: int = 86400  # seconds; safety bound, entries are invalidated by corpus generation
+    
+    # Itinerary Write-Behind Queue
+    write_queue_batch_size: int = 50
+    write_queue_flush_interval: float = 0.5  # seconds to wait for a batch to fill
+    write_queue_max_retries: int = 5
+    write_queue_spill_dir: str = "data/spill"  # local fallback when MongoDB is unreachable
     
     # Authentication Settings
     jwt_secret_key: str = "your-secret-key-change-in-production"
@@ -42,9 +142,12 @@ class Settings(BaseSettings):
         case_sensitive = False
 
 
+@lru_cache()
 def get_settings() -> Settings:
-    """Get settings instance"""
+    """Get settings instance (read from the environment once per process)"""
     settings = Settings()
+    if settings.chunk_size is not None or settings.chunk_overlap is not None:
+        print("⚠️  CHUNK_SIZE / CHUNK_OVERLAP are no longer used; set CHUNK_TOKENS / CHUNK_OVERLAP_TOKENS instead")
     
     # No need to configure API key globally with new SDK
     # API key will be passed when creating the client
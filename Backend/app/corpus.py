@@ -0,0 +1,291 @@
+"""
+Corpus generation counters for retrieval cache invalidation
+
+Every destination has a generation counter in the `corpus_generations`
+collection, and the special scope "*" counts changes to the corpus as a
+whole. `ingest_document` bumps the destination's counter and "*" after
+inserting chunks.
+
+Cached retrieval results record the generations of the scopes they were
+computed from: a search filtered to one destination depends only on that
+destination, an unfiltered search depends on "*". An entry is served only
+while those generations are unchanged, so ingesting a guide for Lisbon
+invalidates Lisbon's cached results (and unfiltered ones) but not Tokyo's.
+
+The embedding model that ingestion writes and retrieval searches is also
+corpus state: it defaults to `Settings.embedding_model`, and an embedding
+migration (see `app.reembed`) switches it for every worker at once by
+updating one document in `embedding_state`.
+"""
+import sys
+import threading
+import time
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional
+
+from app.config import get_settings
+from app.db import get_collection, get_database
+from app.vectors import decode_vector
+
+
+ALL_DESTINATIONS = "*"
+
+
+def normalize_destination(destination: Optional[str]) -> Optional[str]:
+    """
+    Normalize a destination to the key stored on chunks.
+    
+    Args:
+        destination: Destination string (e.g., "Lisbon, Portugal" or "lisbon")
+        
+    Returns:
+        Lowercased city name (e.g., "lisbon"), or None if empty
+    """
+    if not destination:
+        return None
+    city = destination.split(',')[0].strip()
+    return " ".join(city.split()).casefold() or None
+
+
+def get_generations_collection():
+    """Get corpus generation counters collection"""
+    return get_database()["corpus_generations"]
+
+
+def get_generations(scopes: Iterable[str]) -> Dict[str, int]:
+    """
+    Read the current generation of several scopes.
+    
+    Args:
+        scopes: Destination keys and/or ALL_DESTINATIONS
+        
+    Returns:
+        Dict of scope -> generation (0 for scopes never bumped)
+    """
+    scopes = list(dict.fromkeys(scopes))
+    generations = {scope: 0 for scope in scopes}
+    for doc in get_generations_collection().find({"_id": {"$in": scopes}}, {"generation": 1}):
+        generations[doc["_id"]] = doc["generation"]
+    return generations
+
+
+def bump_generation(destination: Optional[str]) -> Dict[str, int]:
+    """
+    Record that a destination's corpus changed.
+    
+    Bumps the destination's counter (if any) and the corpus-wide counter.
+    
+    Args:
+        destination: Destination string or key
+        
+    Returns:
+        Dict of scope -> new generation
+    """
+    from pymongo import ReturnDocument
+
+    collection = get_generations_collection()
+    scopes = [ALL_DESTINATIONS]
+    key = normalize_destination(destination)
+    if key:
+        scopes.insert(0, key)
+    
+    generations = {}
+    for scope in scopes:
+        doc = collection.find_one_and_update(
+            {"_id": scope},
+            {"$inc": {"generation": 1}},
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+        generations[scope] = doc["generation"]
+    return generations
+
+
+def invalidate_all_generations() -> int:
+    """
+    Bump every counter, e.g. after chunks were changed outside of ingestion.
+    
+    Returns:
+        Number of counters bumped
+    """
+    result = get_generations_collection().update_many({}, {"$inc": {"generation": 1}})
+    return result.modified_count
+
+
+# ============= Active embedding model =============
+
+ACTIVE_EMBEDDING_ID = "active"
+METADATA_BACKFILL_ID = "metadata_backfill"
+
+# Chunks ingested before the model was recorded were all embedded with this model
+UNTAGGED_EMBEDDING_MODEL = "models/text-embedding-004"
+
+_active_embedding: Optional[Dict[str, Any]] = None
+_active_embedding_expires = 0.0
+_active_embedding_lock = threading.Lock()
+
+
+def get_embedding_state_collection():
+    """Get embedding state collection (the active embedding model)"""
+    return get_database()["embedding_state"]
+
+
+def get_active_embedding() -> Dict[str, Any]:
+    """
+    The embedding model and vector index used for ingestion and retrieval.
+    
+    Read from `embedding_state` at most every `Settings.embedding_state_ttl`
+    seconds per process. Until a migration has switched models (or while
+    MongoDB cannot be read and nothing was read before) this is
+    `Settings.embedding_model` with `Settings.vector_index_name`.
+    
+    Returns:
+        Dict with "model" and "vector_index_name"
+    """
+    global _active_embedding, _active_embedding_expires
+    now = time.monotonic()
+    if _active_embedding is not None and now < _active_embedding_expires:
+        return _active_embedding
+    
+    with _active_embedding_lock:
+        if _active_embedding is not None and now < _active_embedding_expires:
+            return _active_embedding
+        settings = get_settings()
+        try:
+            doc = get_embedding_state_collection().find_one({"_id": ACTIVE_EMBEDDING_ID})
+        except Exception as e:
+            print(f"⚠️  Could not read the active embedding model: {e}", file=sys.stderr)
+            doc = None
+            if _active_embedding is not None:
+                doc = _active_embedding
+        _active_embedding = {
+            "model": (doc or {}).get("model") or settings.embedding_model,
+            "vector_index_name": (doc or {}).get("vector_index_name") or settings.vector_index_name,
+        }
+        _active_embedding_expires = now + settings.embedding_state_ttl
+        return _active_embedding
+
+
+def forget_active_embedding():
+    """Drop this process's copy of the active embedding (re-read on next use)"""
+    global _active_embedding
+    with _active_embedding_lock:
+        _active_embedding = None
+
+
+def set_active_embedding(model: str, vector_index_name: str, **details) -> Dict[str, Any]:
+    """
+    Switch the embedding model used for ingestion and retrieval.
+    
+    A single document update, so readers see either the old or the new
+    model; other processes pick it up within `Settings.embedding_state_ttl`.
+    
+    Args:
+        model: Embedding model name
+        vector_index_name: Atlas vector index covering the model's vectors
+        **details: Extra fields recorded with the switch (e.g. migration_id)
+        
+    Returns:
+        The new active embedding
+    """
+    global _active_embedding, _active_embedding_expires
+    get_embedding_state_collection().update_one(
+        {"_id": ACTIVE_EMBEDDING_ID},
+        {"$set": {
+            "model": model,
+            "vector_index_name": vector_index_name,
+            "switched_at": datetime.utcnow(),
+            **details,
+        }},
+        upsert=True
+    )
+    with _active_embedding_lock:
+        _active_embedding = {"model": model, "vector_index_name": vector_index_name}
+        _active_embedding_expires = time.monotonic() + get_settings().embedding_state_ttl
+    return _active_embedding
+
+
+def embedding_model_filter(model: str) -> Dict[str, Any]:
+    """
+    Filter matching the chunks embedded by a model.
+
+    Untagged chunks (ingested before the model was recorded) count as
+    `UNTAGGED_EMBEDDING_MODEL`, so they stay searchable before
+    `backfill_embedding_metadata` has tagged them.
+    """
+    if model != UNTAGGED_EMBEDDING_MODEL:
+        return {"embedding_model": model}
+    return {"$or": [{"embedding_model": model}, {"embedding_model": {"$exists": False}}]}
+
+
+def backfill_embedding_metadata(model: str = UNTAGGED_EMBEDDING_MODEL) -> Dict[str, int]:
+    """
+    Record the embedding model, dimension and destination key on chunks
+    ingested before they were tracked, and remember that it was done.
+
+    Args:
+        model: Model that embedded the untagged chunks
+
+    Returns:
+        {"tagged": n, "keyed": m} numbers of chunks updated
+    """
+    collection = get_collection()
+    query = {"embedding_model": {"$exists": False}}
+
+    tagged = 0
+    # Group by vector length so embedding_dim is recorded accurately
+    for group in collection.aggregate([
+        {"$match": {**query, "embedding": {"$type": "array"}}},
+        {"$group": {"_id": {"$size": "$embedding"}, "count": {"$sum": 1}}}
+    ]):
+        dim = group["_id"]
+        result = collection.update_many(
+            {**query, "embedding": {"$size": dim}},
+            {"$set": {"embedding_model": model, "embedding_dim": dim}}
+        )
+        tagged += result.modified_count
+        print(f"✓ Tagged {result.modified_count} chunks ({dim} dimensions) as {model}")
+
+    # Vectors already converted to binary storage are decoded to find their length
+    by_dim: Dict[int, List[Any]] = {}
+    for doc in collection.find(query, {"embedding": 1}):
+        by_dim.setdefault(len(decode_vector(doc["embedding"])), []).append(doc["_id"])
+    for dim, ids in by_dim.items():
+        result = collection.update_many(
+            {"_id": {"$in": ids}}, {"$set": {"embedding_model": model, "embedding_dim": dim}}
+        )
+        tagged += result.modified_count
+        print(f"✓ Tagged {result.modified_count} binary chunks ({dim} dimensions) as {model}")
+
+    keyed = 0
+    for destination in collection.distinct(
+        "metadata.destination", {"metadata.destination_key": {"$exists": False}}
+    ):
+        result = collection.update_many(
+            {"metadata.destination": destination, "metadata.destination_key": {"$exists": False}},
+            {"$set": {"metadata.destination_key": normalize_destination(destination)}}
+        )
+        keyed += result.modified_count
+
+    if tagged or keyed:
+        # Cached retrieval results may predate the new filters
+        invalidate_all_generations()
+    get_embedding_state_collection().update_one(
+        {"_id": METADATA_BACKFILL_ID},
+        {"$set": {"model": model, "tagged": tagged, "keyed": keyed, "completed_at": datetime.utcnow()}},
+        upsert=True
+    )
+    return {"tagged": tagged, "keyed": keyed}
+
+
+def ensure_embedding_metadata():
+    """
+    Backfill chunk metadata once per database (run at startup).
+
+    Later startups only read the recorded completion.
+    """
+    if get_embedding_state_collection().find_one({"_id": METADATA_BACKFILL_ID}, {"_id": 1}):
+        return
+    counts = backfill_embedding_metadata()
+    if counts["tagged"] or counts["keyed"]:
+        print(f"✓ Backfilled chunk metadata: {counts['tagged']} tagged, {counts['keyed']} destination keys")
@@ -1,18 +1,34 @@
 """
 MongoDB connection and database utilities
 """
-from pymongo import MongoClient
-from pymongo.collection import Collection
-from pymongo.database import Database
+from __future__ import annotations
+
 from functools import lru_cache
+from typing import TYPE_CHECKING
 from app.config import get_settings
 
+if TYPE_CHECKING:
+    from pymongo import MongoClient
+    from pymongo.collection import Collection
+    from pymongo.database import Database
+
 
 @lru_cache()
 def get_mongo_client() -> MongoClient:
-    """Get cached MongoDB client"""
+    """
+    Get cached MongoDB client (pymongo is imported on first use).
+
+    Pool events feed the connection statistics reported by `/health/ready`.
+    """
+    from pymongo import MongoClient
+    from app.health import get_pool_stats
+
     settings = get_settings()
-    return MongoClient(settings.mongodb_uri)
+    return MongoClient(
+        settings.mongodb_uri,
+        maxPoolSize=settings.mongo_max_pool_size,
+        event_listeners=[get_pool_stats().listener()]
+    )
 
 
 def get_database() -> Database:
@@ -35,6 +51,11 @@ def get_users_collection() -> Collection:
     return db["users"]
 
 
+def get_itineraries_collection() -> Collection:
+    """Get saved itineraries collection"""
+    db = get_database()
+    return db["itineraries"]
+
 
 def ensure_vector_index():
     """
@@ -57,20 +78,30 @@ def ensure_vector_index():
         {
           "type": "filter",
           "path": "metadata.type"
+        },
+        {
+          "type": "filter",
+          "path": "embedding_model"
+        },
+        {
+          "type": "filter",
+          "path": "metadata.destination_key"
         }
       ]
     }
     
-    Name it: vector_index
+    Name it: vector_index (or the configured `vector_index_name`; a local
+    embedding model needs its own index with matching numDimensions, e.g. 384)
     """
+    settings = get_settings()
     collection = get_collection()
     
     # List existing indexes
     indexes = list(collection.list_indexes())
     index_names = [idx['name'] for idx in indexes]
     
-    if 'vector_index' not in index_names:
-        print("⚠️  WARNING: Vector search index 'vector_index' not found!")
+    if settings.vector_index_name not in index_names:
+        print(f"⚠️  WARNING: Vector search index '{settings.vector_index_name}' not found!")
         print("Please create it manually in MongoDB Atlas. See docstring for instructions.")
     else:
-        print("✓ Vector search index 'vector_index' found")
+        print(f"✓ Vector search index '{settings.vector_index_name}' found")
@@ -0,0 +1,208 @@
+"""
+Near-duplicate chunk detection with MinHash signatures and LSH
+
+Regenerated guides and guides for neighbouring destinations repeat large
+parts of each other. Before chunks are embedded, each one gets a MinHash
+signature of its word 3-shingles (`MINHASH_PERMUTATIONS` 32-bit values) and
+is split into `LSH_BANDS` band keys. Chunks sharing a band key are
+candidates; a candidate whose estimated Jaccard similarity reaches
+`Settings.dedup_threshold` is a near-duplicate.
+
+Signatures (`minhash`, packed uint32) and band keys (`lsh_bands`, indexed)
+are stored on every chunk, so new chunks are checked against the corpus
+with one indexed query. Duplicates are looked up within the same
+destination only: destination-scoped retrieval needs each destination's
+own copy of shared text.
+"""
+import re
+import zlib
+from typing import Dict, List, Optional, Sequence
+
+from bson.binary import Binary
+
+from app.config import get_settings
+from app.corpus import get_active_embedding
+from app.db import get_collection
+
+
+SHINGLE_SIZE = 3
+MINHASH_PERMUTATIONS = 64
+LSH_BANDS = 16  # 16 bands x 4 rows: pairs above ~0.5 similarity become candidates
+LSH_ROWS = MINHASH_PERMUTATIONS // LSH_BANDS
+
+# Fixed seed: signatures are stored, so the permutations must never change
+_PERMUTATION_SEED = 0x5EED_D0C5
+
+_WORD_RE = re.compile(r"\w+")
+_permutations = None
+
+
+def _hash_params():
+    """Multiply-shift hash parameters (odd 64-bit multipliers, 64-bit offsets)"""
+    global _permutations
+    if _permutations is None:
+        import numpy as np
+
+        rng = np.random.default_rng(_PERMUTATION_SEED)
+        a = rng.integers(1, 2 ** 63, size=MINHASH_PERMUTATIONS, dtype=np.uint64) | np.uint64(1)
+        b = rng.integers(0, 2 ** 63, size=MINHASH_PERMUTATIONS, dtype=np.uint64)
+        _permutations = (a, b)
+    return _permutations
+
+
+def minhash_signature(text: str):
+    """
+    MinHash signature of a text's word shingles.
+
+    Args:
+        text: Chunk text
+
+    Returns:
+        uint32 NumPy array of MINHASH_PERMUTATIONS values, or None for
+        texts too short to shingle
+    """
+    import numpy as np
+
+    words = _WORD_RE.findall(text.lower())
+    if len(words) < SHINGLE_SIZE:
+        return None
+    shingles = {" ".join(words[i:i + SHINGLE_SIZE]) for i in range(len(words) - SHINGLE_SIZE + 1)}
+    hashes = np.fromiter((zlib.crc32(s.encode("utf-8")) for s in shingles), dtype=np.uint64, count=len(shingles))
+
+    a, b = _hash_params()
+    with np.errstate(over="ignore"):
+        permuted = (hashes[:, None] * a + b) >> np.uint64(32)
+    return permuted.min(axis=0).astype(np.uint32)
+
+
+def similarity(signature_a, signature_b) -> float:
+    """Estimated Jaccard similarity of two signatures"""
+    return float((signature_a == signature_b).mean())
+
+
+def lsh_bands(signature) -> List[str]:
+    """Band keys of a signature ("<band>:<hash of its rows>")"""
+    data = signature.tobytes()
+    width = LSH_ROWS * 4
+    return [
+        f"{band}:{zlib.crc32(data[band * width:(band + 1) * width]):08x}"
+        for band in range(LSH_BANDS)
+    ]
+
+
+def encode_signature(signature) -> Binary:
+    """Pack a signature for storage"""
+    return Binary(signature.astype("<u4").tobytes())
+
+
+def decode_signature(value):
+    """Unpack a stored signature"""
+    import numpy as np
+
+    return np.frombuffer(bytes(value), dtype="<u4")
+
+
+class LSHIndex:
+    """In-memory LSH index of signatures"""
+
+    def __init__(self):
+        self._buckets: Dict[str, List] = {}
+        self._signatures: Dict = {}
+
+    def add(self, key, signature, bands: Optional[List[str]] = None):
+        self._signatures[key] = signature
+        for band in bands or lsh_bands(signature):
+            self._buckets.setdefault(band, []).append(key)
+
+    def query(self, signature, threshold: float, bands: Optional[List[str]] = None):
+        """
+        Most similar indexed key at or above `threshold`.
+
+        Returns:
+            (key, similarity), or (None, 0.0)
+        """
+        best, best_similarity = None, 0.0
+        seen = set()
+        for band in bands or lsh_bands(signature):
+            for key in self._buckets.get(band, ()):
+                if key in seen:
+                    continue
+                seen.add(key)
+                score = similarity(signature, self._signatures[key])
+                if score >= threshold and score > best_similarity:
+                    best, best_similarity = key, score
+        return best, best_similarity
+
+
+def find_duplicates(texts: Sequence[str], destination_key: Optional[str],
+                    threshold: float = None, model: Optional[str] = None,
+                    search: bool = True) -> List[Dict]:
+    """
+    Sign chunks and find near-duplicates among them and in the corpus.
+
+    A chunk is compared with the earlier chunks of the same document and
+    with stored chunks of the same destination and embedding model.
+
+    Args:
+        texts: Chunk texts in document order
+        destination_key: Normalized destination of the document
+        threshold: Minimum estimated Jaccard similarity (default from settings)
+        model: Embedding model of the stored chunks to compare with (default: active)
+        search: Compare the chunks; False only signs them (dedup is off)
+
+    Returns:
+        One dict per chunk: "signature", "bands" (None if too short to sign)
+        and "duplicate_of": None or {"source": "document"|"corpus", "id"
+        (chunk index or document id), "similarity", "text"}
+    """
+    settings = get_settings()
+    threshold = settings.dedup_threshold if threshold is None else threshold
+    model = model or get_active_embedding()["model"]
+
+    results = []
+    for text in texts:
+        signature = minhash_signature(text)
+        results.append({
+            "signature": signature,
+            "bands": lsh_bands(signature) if signature is not None else None,
+            "duplicate_of": None,
+        })
+    if not search:
+        return results
+
+    all_bands = sorted({band for r in results if r["bands"] for band in r["bands"]})
+    corpus = LSHIndex()
+    corpus_texts = {}
+    if all_bands:
+        for doc in get_collection().find(
+            {
+                "lsh_bands": {"$in": all_bands},
+                "embedding_model": model,
+                "metadata.destination_key": destination_key,
+            },
+            {"minhash": 1, "lsh_bands": 1, "text": 1}
+        ):
+            corpus.add(doc["_id"], decode_signature(doc["minhash"]), doc["lsh_bands"])
+            corpus_texts[doc["_id"]] = doc["text"]
+
+    document = LSHIndex()
+    for i, result in enumerate(results):
+        if result["signature"] is None:
+            continue
+        match, score = document.query(result["signature"], threshold, result["bands"])
+        if match is not None:
+            result["duplicate_of"] = {"source": "document", "id": match, "similarity": score, "text": texts[match]}
+            continue
+        match, score = corpus.query(result["signature"], threshold, result["bands"])
+        if match is not None:
+            result["duplicate_of"] = {"source": "corpus", "id": match, "similarity": score, "text": corpus_texts[match]}
+        document.add(i, result["signature"], result["bands"])
+
+    return results
+
+
+def ensure_dedup_index():
+    """
+    Create the index used to look up LSH band keys of stored chunks.
+    """
+    get_collection().create_index("lsh_bands")
@@ -0,0 +1,43 @@
+"""
+Destinations the app treats as popular
+
+Used to populate the RAG corpus (`scripts/populate_popular_destinations.py`)
+and to warm caches at startup when there is no request history yet.
+"""
+
+# Top 30 most popular tourist destinations
+POPULAR_DESTINATIONS = [
+    # Asia
+    "Bangkok, Thailand",
+    "Singapore, Singapore", 
+    "Dubai, UAE",
+    "Seoul, South Korea",
+    "Mumbai, India",
+    "Hong Kong, China",
+    "Bali, Indonesia",
+    
+    # Europe
+    "London, England",
+    "Rome, Italy",
+    "Barcelona, Spain",
+    "Amsterdam, Netherlands",
+    "Prague, Czech Republic",
+    "Vienna, Austria",
+    "Berlin, Germany",
+    "Istanbul, Turkey",
+    
+    # Americas
+    "Los Angeles, USA",
+    "Las Vegas, USA",
+    "Miami, USA",
+    "Mexico City, Mexico",
+    "Rio de Janeiro, Brazil",
+    "Buenos Aires, Argentina",
+    
+    # Oceania & Africa
+    "Sydney, Australia",
+    "Melbourne, Australia",
+    "Auckland, New Zealand",
+    "Cape Town, South Africa",
+    "Marrakech, Morocco",
+]
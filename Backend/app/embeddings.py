@@ -1,49 +1,183 @@
 """
-Embedding generation using Google Gemini
+Embedding generation
+
+The backend is selected by the active embedding model
+(`Settings.embedding_model` until a migration switches it, see
+`app.corpus.get_active_embedding`):
+
+- Gemini models (e.g. "models/text-embedding-004") are called remotely.
+- Names prefixed with "local:" (e.g. "local:BAAI/bge-small-en-v1.5") run a
+  quantized ONNX sentence encoder on the CPU via `fastembed`. The model is
+  loaded once per process and batches run on a thread pool, removing the
+  network hop from query embedding.
+
+Every stored chunk records the model name and vector dimension, and
+retrieval only searches chunks embedded by the active model, so vectors
+from different backends are never mixed.
 """
-from google import genai
-from google.genai import types
-from typing import List
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from typing import List, Optional
+
+from app.cache import cache_get, cache_get_many, cache_set, cache_set_many
 from app.config import get_settings
+from app.corpus import get_active_embedding
+from app.metrics import track_provider_call
+from app.providers import get_genai_client
+from app.resilience import call_provider
+
+
+LOCAL_PREFIX = "local:"
+
+
+class GeminiEmbeddingBackend:
+    """Remote embeddings via the Gemini API"""
+    provider = "gemini"
+
+    # Gemini accepts up to 100 texts per embed_content call
+    max_batch_size = 100
+
+    def __init__(self, model: str):
+        self.model = model
+        self.client = get_genai_client()
+
+    def _embed(self, operation: str, contents):
+        """Embed with a deadline and circuit breaker (timeout passed to the SDK in ms)"""
+        with track_provider_call(self.provider, operation):
+            return call_provider(
+                self.provider, self.model, operation,
+                lambda timeout: self.client.models.embed_content(
+                    model=self.model,
+                    contents=contents,
+                    config={"http_options": {"timeout": int(timeout * 1000)}}
+                ),
+                timeout=get_settings().embedding_timeout
+            )
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        vectors = []
+        for i in range(0, len(texts), self.max_batch_size):
+            result = self._embed("embed_content", texts[i:i + self.max_batch_size])
+            vectors.extend(list(e.values) for e in result.embeddings)
+        return vectors
+
+    def embed_query(self, text: str) -> List[float]:
+        result = self._embed("embed_query", text)
+        return list(result.embeddings[0].values)
+
+
+class LocalEmbeddingBackend:
+    """CPU embeddings with a quantized ONNX sentence encoder (fastembed)"""
+    provider = "local"
+
+    def __init__(self, model: str, batch_size: int = 32, threads: int = 2):
+        try:
+            from fastembed import TextEmbedding
+        except ImportError as e:
+            raise ImportError(
+                "Local embeddings require fastembed: pip install fastembed"
+            ) from e
+
+        self.model = model
+        self.batch_size = batch_size
+        self.encoder = TextEmbedding(model_name=model[len(LOCAL_PREFIX):])
+        self.executor = ThreadPoolExecutor(max_workers=threads, thread_name_prefix="embed")
+
+    def _embed_batch(self, texts: List[str]) -> List[List[float]]:
+        return [v.tolist() for v in self.encoder.passage_embed(texts, batch_size=self.batch_size)]
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        batches = [texts[i:i + self.batch_size] for i in range(0, len(texts), self.batch_size)]
+        vectors = []
+        with track_provider_call(self.provider, "embed_content"):
+            for batch_vectors in self.executor.map(self._embed_batch, batches):
+                vectors.extend(batch_vectors)
+        return vectors
+
+    def embed_query(self, text: str) -> List[float]:
+        with track_provider_call(self.provider, "embed_query"):
+            future = self.executor.submit(lambda: next(iter(self.encoder.query_embed([text]))).tolist())
+            return future.result()
+
+
+@lru_cache()
+def get_embedding_backend(model: str):
+    """Get the process-wide embedding backend for a model"""
+    settings = get_settings()
+    if model.startswith(LOCAL_PREFIX):
+        return LocalEmbeddingBackend(
+            model,
+            batch_size=settings.local_embedding_batch_size,
+            threads=settings.local_embedding_threads
+        )
+    return GeminiEmbeddingBackend(model)
+
+
+def embedding_cache_key(text: str, kind: str = "document", model: Optional[str] = None) -> str:
+    """Shared cache key for an embedding (model-specific)"""
+    model = model or get_active_embedding()["model"]
+    digest = hashlib.sha256(text.encode("utf-8")).hexdigest()
+    return f"{model}:{kind}:{digest}"
 
 
 def get_embedding(text: str) -> List[float]:
     """
-    Generate embedding vector for given text using Gemini.
-    
+    Generate embedding vector for given text.
+
     Args:
         text: Input text to embed
-        
+
     Returns:
-        768-dimensional embedding vector
+        Embedding vector (768 dimensions for Gemini text-embedding-004)
     """
-    settings = get_settings()
-    client = genai.Client(api_key=settings.gemini_api_key)
+    return get_embeddings([text])[0]
+
+
+def get_embeddings(texts: List[str], model: Optional[str] = None) -> List[List[float]]:
+    """
+    Generate embedding vectors for several texts in batches.
+
+    Args:
+        texts: Input texts to embed
+        model: Embedding model (default: the active model)
+
+    Returns:
+        One embedding vector per text
+    """
+    if not texts:
+        return []
+    model = model or get_active_embedding()["model"]
+    
+    # Reuse vectors any worker already computed for identical chunks
+    keys = [embedding_cache_key(text, model=model) for text in texts]
+    cached = cache_get_many("embeddings", keys)
+    missing = [i for i, key in enumerate(keys) if key not in cached]
     
-    result = client.models.embed_content(
-        model=settings.embedding_model,
-        contents=text
-    )
+    if missing:
+        vectors = get_embedding_backend(model).embed_documents([texts[i] for i in missing])
+        computed = {keys[i]: vector for i, vector in zip(missing, vectors)}
+        cache_set_many("embeddings", computed)
+        cached.update(computed)
     
-    return result.embeddings[0].values
+    return [cached[key] for key in keys]
 
 
-def get_query_embedding(query: str) -> List[float]:
+def get_query_embedding(query: str, model: Optional[str] = None) -> List[float]:
     """
     Generate embedding for search query.
-    
+
     Args:
         query: Search query text
-        
+        model: Embedding model (default: the active model)
+
     Returns:
-        768-dimensional embedding vector
+        Embedding vector (768 dimensions for Gemini text-embedding-004)
     """
-    settings = get_settings()
-    client = genai.Client(api_key=settings.gemini_api_key)
-    
-    result = client.models.embed_content(
-        model=settings.embedding_model,
-        contents=query
-    )
-    
-    return result.embeddings[0].values
+    model = model or get_active_embedding()["model"]
+    key = embedding_cache_key(query, kind="query", model=model)
+    vector = cache_get("embeddings", key)
+    if vector is None:
+        vector = get_embedding_backend(model).embed_query(query)
+        cache_set("embeddings", key, vector)
+    return vector
@@ -1,17 +1,32 @@
 """
 Itinerary generation using RAG with Groq
 """
-from groq import Groq
 import json
-from typing import Dict, Any
+from typing import Dict, Any, List, Optional, Tuple
 from app.schemas import PlanRequest, Itinerary
 from app.retrieve import retrieve_context
+from app.bundles import context_query, get_context_bundle
 from app.config import get_settings
 from app.db import get_collection
 from app.ingest import ingest_document
+from app.providers import chat_completion
+from app.resilience import request_deadline
+from app.router import choose_model
+import time
+from app.metrics import (
+    track_stage, FALLBACK_ITINERARIES, AUTO_GENERATED_GUIDES,
+    ITINERARY_DEFECTS, ITINERARY_PARSE_OUTCOMES
+)
+from app.repair import (
+    DaysPatch, ItineraryBody, parse_clean_itinerary, repair_json, split_valid_days, valid_transport, valid_tips
+)
 import re
 
 
+# Completion tokens allowed per re-requested day
+DAY_TOKEN_BUDGET = 700
+
+
 def auto_generate_destination_guide(destination: str) -> bool:
     """
     Automatically generate and ingest a travel guide for a destination.
@@ -24,9 +39,6 @@ def auto_generate_destination_guide(destination: str) -> bool:
         True if successful, False otherwise
     """
     try:
-        settings = get_settings()
-        client = Groq(api_key=settings.groq_api_key)
-        
         # Parse destination
         parts = [p.strip() for p in destination.split(',')]
         city = parts[0]
@@ -61,8 +73,11 @@ Include:
 Be specific with prices and practical details. Use current 2024-2025 information.
 Format as plain text with clear sections."""
         
-        response = client.chat.completions.create(
-            model="llama-3.3-70b-versatile",
+        route = choose_model("guide")
+        response = chat_completion(
+            "guide_completion",
+            model=route["model"],
+            fallback_models=route["fallbacks"],
             messages=[
                 {
                     "role": "system",
@@ -88,15 +103,18 @@ Format as plain text with clear sections."""
                 "country": country,
                 "category": "overview",
                 "generated_by": "auto",
-                "source": "groq_llama"
+                "source": "groq_llama",
+                "model": getattr(response, "model", None) or route["model"]
             }
         )
         
         print(f"✅ Auto-generated {chunks} chunks for {city}, {country}")
+        AUTO_GENERATED_GUIDES.labels(outcome="success").inc()
         return True
         
     except Exception as e:
         print(f"⚠️  Auto-generation failed for {destination}: {e}")
+        AUTO_GENERATED_GUIDES.labels(outcome="failure").inc()
         return False
 
 
@@ -216,127 +234,429 @@ Return ONLY valid JSON, no markdown formatting or additional text.
     return prompt
 
 
+def response_format_options(schema_model=Itinerary, name: str = "itinerary") -> Dict[str, Any]:
+    """
+    Keyword arguments that enable the provider's JSON output mode.
+    
+    Args:
+        schema_model: Pydantic model the response must follow (json_schema mode)
+        name: Schema name sent to the provider
+        
+    Returns:
+        Extra arguments for `chat.completions.create`
+    """
+    mode = get_settings().generation_response_format
+    if mode == "json_schema":
+        return {"response_format": {
+            "type": "json_schema",
+            "json_schema": {"name": name, "schema": schema_model.model_json_schema()}
+        }}
+    if mode == "json_object":
+        return {"response_format": {"type": "json_object"}}
+    return {}
+
+
+def fallback_day(day: int, request: PlanRequest) -> Dict[str, Any]:
+    """Placeholder plan for a day the LLM did not provide"""
+    return {
+        "day": day,
+        "title": f"Day {day} in {request.destination}",
+        "morning": [{
+            "name": "Explore local area",
+            "description": "Information not available in context",
+            "duration": "3 hours",
+            "estimated_cost": 0.0
+        }],
+        "afternoon": [{
+            "name": "Continue exploring",
+            "description": "Information not available in context",
+            "duration": "3 hours",
+            "estimated_cost": 0.0
+        }],
+        "evening": [{
+            "name": "Dinner and relaxation",
+            "description": "Information not available in context",
+            "duration": "2 hours",
+            "estimated_cost": request.budget / request.days * 0.3
+        }],
+        "accommodation": "Budget-appropriate accommodation",
+        "daily_budget": request.budget / request.days
+    }
+
+
+def fallback_itinerary(request: PlanRequest) -> Dict[str, Any]:
+    """Minimal valid itinerary used when nothing in the response is usable"""
+    return {
+        "destination": request.destination,
+        "total_days": request.days,
+        "total_budget": request.budget,
+        "travel_style": request.travel_style.value,
+        "days": [fallback_day(i + 1, request) for i in range(request.days)],
+        "transport": [{
+            "type": "Local transport",
+            "details": "Information not available in context",
+            "estimated_cost": request.budget * 0.1
+        }],
+        "tips": ["Plan ahead", "Check weather", "Book accommodations early"]
+    }
+
+
+def repair_itinerary_response(response_text: str, request: PlanRequest) -> Tuple[Optional[Dict[str, Any]], List[int], List[str]]:
+    """
+    Parse an LLM response, keeping every part that is valid.
+    
+    Args:
+        response_text: Raw LLM response
+        request: Original request (authoritative for destination, days, budget, style)
+        
+    Returns:
+        (itinerary dict with the valid days, or None if nothing could be parsed;
+        missing day numbers; defects that were repaired)
+    """
+    data, defects = repair_json(response_text)
+    if data is None:
+        return None, list(range(1, request.days + 1)), defects
+    
+    valid_days, missing = split_valid_days(data.get("days"), request.days)
+    transport = valid_transport(data.get("transport"))
+    tips = valid_tips(data.get("tips"))
+    if not transport or not tips:
+        fallback = fallback_itinerary(request)
+        transport = transport or fallback["transport"]
+        tips = tips or fallback["tips"]
+    itinerary_data = {
+        "destination": request.destination,
+        "total_days": request.days,
+        "total_budget": request.budget,
+        "travel_style": request.travel_style.value,
+        "days": [valid_days[day] for day in sorted(valid_days)],
+        "transport": transport,
+        "tips": tips
+    }
+    if missing:
+        defects.append("missing_days")
+    return itinerary_data, missing, defects
+
+
+def itinerary_from_body(body: ItineraryBody, request: PlanRequest) -> Itinerary:
+    """
+    Assemble an itinerary from an already validated response body.
+
+    Args:
+        body: Output of `parse_clean_itinerary`
+        request: Original request (authoritative for destination, days, budget, style)
+
+    Returns:
+        Itinerary (built without validating the body a second time)
+    """
+    return Itinerary.model_construct(
+        destination=request.destination,
+        total_days=request.days,
+        total_budget=request.budget,
+        travel_style=request.travel_style.value,
+        days=body.days,
+        transport=body.transport,
+        tips=body.tips
+    )
+
+
+def fill_missing_days(itinerary_data: Dict[str, Any], days: Dict[int, Dict], request: PlanRequest) -> Dict[str, Any]:
+    """Merge day plans into an itinerary, using placeholders for days still missing"""
+    merged = {day["day"]: day for day in itinerary_data["days"]}
+    merged.update(days)
+    itinerary_data["days"] = [
+        merged.get(n) or fallback_day(n, request) for n in range(1, request.days + 1)
+    ]
+    return itinerary_data
+
+
+def _has_every_day(days: Any, expected_days: int) -> bool:
+    """Whether `days` holds exactly days 1..expected_days in order"""
+    return (
+        isinstance(days, list) and len(days) == expected_days
+        and all(isinstance(day, dict) and day.get("day") == n for n, day in enumerate(days, 1))
+    )
+
+
 def parse_itinerary_response(response_text: str, request: PlanRequest) -> Dict[str, Any]:
     """
     Parse and validate LLM response into structured itinerary.
     
+    Well-formed JSON with every day, transport and tips costs one strict
+    `json.loads` (the schema is validated by the caller's `Itinerary(**data)`).
+    Otherwise malformed JSON is repaired where possible; days that are
+    missing or invalid are replaced by placeholders (`generate_itinerary`
+    re-requests them first). Only an unusable response falls back entirely.
+    
     Args:
         response_text: Raw LLM response
         request: Original request for fallback values
         
     Returns:
-        Validated itinerary dictionary
+        Itinerary dictionary
     """
-    try:
-        # Try to extract JSON from response
-        start_idx = response_text.find('{')
-        end_idx = response_text.rfind('}') + 1
+    start, end = response_text.find("{"), response_text.rfind("}") + 1
+    if start != -1 and end > start:
+        try:
+            data = json.loads(response_text[start:end])
+        except json.JSONDecodeError:
+            data = None
+        if isinstance(data, dict) and _has_every_day(data.get("days"), request.days) \
+                and data.get("transport") and data.get("tips"):
+            return {
+                **data,
+                "destination": request.destination,
+                "total_days": request.days,
+                "total_budget": request.budget,
+                "travel_style": request.travel_style.value,
+            }
+    
+    itinerary_data, missing, defects = repair_itinerary_response(response_text, request)
+    if itinerary_data is None:
+        print(f"⚠️  Failed to parse LLM response (defects: {', '.join(defects) or 'no JSON found'})")
+        FALLBACK_ITINERARIES.inc()
+        return fallback_itinerary(request)
+    if missing:
+        return fill_missing_days(itinerary_data, {}, request)
+    return itinerary_data
+
+
+def build_missing_days_prompt(request: PlanRequest, context: str, missing: List[int],
+                              planned: List[Dict[str, Any]]) -> str:
+    """
+    Build a prompt that asks only for the given days.
+    
+    Args:
+        request: User's travel planning request
+        context: Retrieved context
+        missing: Day numbers to generate
+        planned: Days already planned (their titles are listed to avoid repeats)
         
-        if start_idx != -1 and end_idx > start_idx:
-            json_str = response_text[start_idx:end_idx]
-            itinerary_data = json.loads(json_str)
-            return itinerary_data
-        else:
-            raise ValueError("No JSON found in response")
-            
-    except (json.JSONDecodeError, ValueError) as e:
-        # Fallback: Return minimal valid structure
-        print(f"⚠️  Failed to parse LLM response: {e}")
-        return {
-            "destination": request.destination,
-            "total_days": request.days,
-            "total_budget": request.budget,
-            "travel_style": request.travel_style.value,
-            "days": [
-                {
-                    "day": i + 1,
-                    "title": f"Day {i + 1} in {request.destination}",
-                    "morning": [{
-                        "name": "Explore local area",
-                        "description": "Information not available in context",
-                        "duration": "3 hours",
-                        "estimated_cost": 0.0
-                    }],
-                    "afternoon": [{
-                        "name": "Continue exploring",
-                        "description": "Information not available in context",
-                        "duration": "3 hours",
-                        "estimated_cost": 0.0
-                    }],
-                    "evening": [{
-                        "name": "Dinner and relaxation",
-                        "description": "Information not available in context",
-                        "duration": "2 hours",
-                        "estimated_cost": request.budget / request.days * 0.3
-                    }],
-                    "accommodation": "Budget-appropriate accommodation",
-                    "daily_budget": request.budget / request.days
-                }
-                for i in range(request.days)
-            ],
-            "transport": [{
-                "type": "Local transport",
-                "details": "Information not available in context",
-                "estimated_cost": request.budget * 0.1
-            }],
-            "tips": ["Plan ahead", "Check weather", "Book accommodations early"]
-        }
+    Returns:
+        Formatted prompt string
+    """
+    already = "\n".join(f"- Day {d['day']}: {d['title']}" for d in planned) or "- (none)"
+    day_list = ", ".join(str(n) for n in missing)
+    return f"""You are an expert travel planner completing a {request.days}-day itinerary for {request.destination}.
+
+**Trip:** ${request.budget} USD total, travel style: {request.travel_style.value}
+
+**Retrieved Information:**
+{context}
+
+**Days already planned (do not repeat their attractions):**
+{already}
 
+Plan ONLY days {day_list}. Return JSON of the form:
+{{
+  "days": [
+    {{
+      "day": {missing[0]},
+      "title": "Day title/theme",
+      "morning": [{{"name": "...", "description": "...", "duration": "2 hours", "estimated_cost": 25.0}}],
+      "afternoon": [...],
+      "evening": [...],
+      "accommodation": "Hotel/area suggestion matching budget level",
+      "daily_budget": {request.budget / request.days:.1f}
+    }}
+  ]
+}}
 
-def generate_itinerary(request: PlanRequest) -> Itinerary:
+Return ONLY valid JSON, no markdown formatting or additional text.
+"""
+
+
+def regenerate_missing_days(itinerary_data: Dict[str, Any], missing: List[int], request: PlanRequest,
+                            context: str, route: Optional[Dict[str, Any]] = None) -> Tuple[Dict[str, Any], List[int]]:
+    """
+    Re-request only the days missing from a response and merge them in.
+    
+    Args:
+        itinerary_data: Repaired itinerary with the valid days
+        missing: Day numbers to re-request
+        request: Travel planning request
+        context: Retrieved context used for the original prompt
+        route: Routing decision of the original generation (default: route again)
+        
+    Returns:
+        (completed itinerary dict, day numbers that are placeholders)
+    """
+    prompt = build_missing_days_prompt(request, context, missing, itinerary_data["days"])
+    
+    route = route or choose_model("itinerary", len(missing), request.travel_style.value)
+    regenerated: Dict[int, Dict] = {}
+    try:
+        response = chat_completion(
+            "repair_completion",
+            model=route["model"],
+            fallback_models=route["fallbacks"],
+            messages=[{"role": "user", "content": prompt}],
+            temperature=0.7,
+            max_tokens=min(4096, DAY_TOKEN_BUDGET * len(missing) + 256),
+            top_p=0.95,
+            **response_format_options(DaysPatch, name="itinerary_days")
+        )
+        data, _ = repair_json(response.choices[0].message.content)
+        valid_days, _ = split_valid_days((data or {}).get("days"), request.days)
+        regenerated = {day: plan for day, plan in valid_days.items() if day in missing}
+    except Exception as e:
+        print(f"⚠️  Could not regenerate missing days: {e}")
+    
+    still_missing = [day for day in missing if day not in regenerated]
+    return fill_missing_days(itinerary_data, regenerated, request), still_missing
+
+
+def generate_itinerary(request: PlanRequest, context: Optional[str] = None) -> Itinerary:
     """
     Main RAG pipeline: retrieve context and generate itinerary.
     Auto-generates RAG data for new destinations on first request.
+    All provider calls share the `plan_request_budget` deadline.
     
     Args:
         request: Travel planning request
+        context: Context from `load_plan_context` (retrieved here if omitted)
         
     Returns:
         Structured itinerary
     """
+    with request_deadline(get_settings().plan_request_budget):
+        if context is None:
+            context = _load_context(request)
+        return _run_pipeline(request, context)
+
+
+def load_plan_context(request: PlanRequest) -> str:
+    """
+    Retrieve the prompt context for a request.
+    
+    The context only depends on destination and travel style, so callers
+    planning several trips (e.g. `/plan/batch`) retrieve it once and pass
+    it to `generate_itinerary` for each of them.
+    
+    Args:
+        request: Travel planning request
+        
+    Returns:
+        Context text for the prompt
+    """
+    with request_deadline(get_settings().plan_request_budget):
+        return _load_context(request)
+
+
+def _load_context(request: PlanRequest) -> str:
     settings = get_settings()
     
-    # Step 0: Check if destination exists in RAG, auto-generate if not
-    if not check_destination_exists(request.destination):
-        print(f"📍 New destination detected: {request.destination}")
-        auto_generate_destination_guide(request.destination)
-        # Small delay to ensure data is indexed
-        import time
-        time.sleep(1)
+    # Precomputed context for known destinations (one indexed lookup)
+    with track_stage("plan", "context_bundle"):
+        context_docs = get_context_bundle(request.destination, request.travel_style)
     
-    # Step 1: Retrieve relevant context
-    query = f"{request.destination} {request.travel_style.value} travel guide attractions hotels transport budget"
-    context_docs = retrieve_context(query, top_k=settings.top_k_results)
+    if context_docs is None:
+        # Step 0: Check if destination exists in RAG, auto-generate if not
+        with track_stage("plan", "check_destination"):
+            destination_exists = check_destination_exists(request.destination)
+        
+        if not destination_exists:
+            print(f"📍 New destination detected: {request.destination}")
+            with track_stage("plan", "auto_generate_guide"):
+                auto_generate_destination_guide(request.destination)
+                # Small delay to ensure data is indexed
+                time.sleep(1)
+        
+        # Step 1: Retrieve relevant context
+        query = context_query(request.destination, request.travel_style)
+        with track_stage("plan", "retrieve_context"):
+            context_docs = retrieve_context(
+                query, top_k=settings.top_k_results, destination=request.destination
+            )
     
     if not context_docs:
-        context = "No specific information available for this destination."
-    else:
-        context = "\n\n---\n\n".join(context_docs)
+        return "No specific information available for this destination."
+    return "\n\n---\n\n".join(context_docs)
+
+
+def _run_pipeline(request: PlanRequest, context: str) -> Itinerary:
+    settings = get_settings()
     
     # Step 2: Build prompt
-    prompt = build_prompt(request, context)
+    with track_stage("plan", "build_prompt"):
+        prompt = build_prompt(request, context)
     
-    # Step 3: Generate with Groq
-    client = Groq(api_key=settings.groq_api_key)
+    # Step 3: Generate with the routed model (falls back to the rule's other models)
+    route = choose_model("itinerary", request.days, request.travel_style.value)
+    started = time.perf_counter()
+    with track_stage("plan", "llm_completion"):
+        response = chat_completion(
+            "chat_completion",
+            model=route["model"],
+            fallback_models=route["fallbacks"],
+            messages=[
+                {
+                    "role": "user",
+                    "content": prompt
+                }
+            ],
+            temperature=0.7,
+            max_tokens=4096,
+            top_p=0.95,
+            **response_format_options()
+        )
     
-    response = client.chat.completions.create(
-        model=settings.generation_model,
-        messages=[
-            {
-                "role": "user",
-                "content": prompt
-            }
-        ],
-        temperature=0.7,
-        max_tokens=4096,
-        top_p=0.95
-    )
+    generation = {
+        "route": route["route"],
+        "model": getattr(response, "model", None) or route["model"],
+        "requested_model": route["model"],
+        "routing_reason": route["reason"],
+        "latency_ms": round((time.perf_counter() - started) * 1000, 1),
+        "tokens": getattr(getattr(response, "usage", None), "total_tokens", None),
+    }
     
-    # Step 4: Parse response
+    # Step 4: Parse response. Well-formed JSON is validated straight into the
+    # schema; anything else is repaired, keeping every valid part
     response_text = response.choices[0].message.content
-    itinerary_data = parse_itinerary_response(response_text, request)
+    truncated = getattr(response.choices[0], "finish_reason", None) == "length"
+    if not truncated:
+        with track_stage("plan", "validate"):
+            body = parse_clean_itinerary(response_text, request.days)
+        if body is not None:
+            ITINERARY_PARSE_OUTCOMES.labels(outcome="clean").inc()
+            itinerary = itinerary_from_body(body, request)
+            itinerary._generation = {**generation, "outcome": "clean"}
+            return itinerary
+    
+    with track_stage("plan", "parse_response"):
+        itinerary_data, missing, defects = repair_itinerary_response(response_text, request)
+    if truncated:
+        defects.append("length_limit")
+    for defect in defects:
+        ITINERARY_DEFECTS.labels(defect=defect).inc()
+    
+    if itinerary_data is None:
+        print(f"⚠️  Failed to parse LLM response (defects: {', '.join(defects) or 'no JSON found'})")
+        itinerary_data = fallback_itinerary(request)
+        # An unusable response is retried through the (smaller) missing-days prompt
+        itinerary_data["days"] = []
+    
+    # Step 4b: Re-request only the days that are missing or invalid
+    outcome = "repaired" if defects else "clean"
+    if missing:
+        if settings.repair_missing_days:
+            with track_stage("plan", "repair_days"):
+                itinerary_data, missing = regenerate_missing_days(itinerary_data, missing, request, context, route)
+        else:
+            itinerary_data = fill_missing_days(itinerary_data, {}, request)
+        
+        if not missing:
+            outcome = "days_regenerated"
+        elif len(missing) == request.days:
+            outcome = "fallback"
+            FALLBACK_ITINERARIES.inc()
+        else:
+            outcome = "partial_fallback"
+    ITINERARY_PARSE_OUTCOMES.labels(outcome=outcome).inc()
     
     # Step 5: Validate with Pydantic
-    itinerary = Itinerary(**itinerary_data)
+    with track_stage("plan", "validate"):
+        itinerary = Itinerary(**itinerary_data)
+    itinerary._generation = {**generation, "outcome": outcome}
     
     return itinerary
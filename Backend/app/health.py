@@ -0,0 +1,337 @@
+"""
+Liveness and readiness probes
+
+`/health/live` only says the process serves requests (the event loop is
+responsive); it never touches a dependency, so a slow database does not get
+healthy workers restarted.
+
+`/health/ready` says whether this worker should receive traffic. It checks:
+
+- `mongodb`: a `ping` round trip;
+- `mongo_pool`: the connection pool of this process, from pymongo pool
+  events - exhausted while every connection to a server is checked out and
+  requests are waiting for one, or a checkout timed out recently;
+- `vector_index`: the active Atlas vector index exists and is queryable;
+- `groq` / `gemini`: the provider API answers a model listing / lookup
+  (no tokens are spent), and not every circuit breaker is open.
+
+Results are cached for `Settings.health_probe_interval` and each probe
+runs at most once at a time, however often the endpoint is polled; a
+probe still running after `Settings.health_probe_timeout` is reported as a
+timeout. A worker is not ready when a check in
+`Settings.health_critical_checks` fails, or while it shuts down; other
+failing checks only make it "degraded" (they usually affect every worker
+alike, so shedding this one would not help).
+"""
+import asyncio
+import sys
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime
+from typing import Any, Callable, Dict, Optional
+
+from prometheus_client import Gauge
+
+from app.config import get_settings
+from app.corpus import get_active_embedding
+from app.db import get_collection, get_database
+from app.embeddings import LOCAL_PREFIX
+from app.providers import get_genai_client, get_groq_client
+from app.resilience import breaker_states
+
+
+DEPENDENCY_UP = Gauge(
+    "wandergenie_dependency_up",
+    "Whether the last readiness probe of a dependency passed",
+    ["dependency"]
+)
+
+DEPENDENCY_LATENCY = Gauge(
+    "wandergenie_dependency_latency_seconds",
+    "Latency of the last readiness probe of a dependency",
+    ["dependency"]
+)
+
+MONGO_POOL_CONNECTIONS = Gauge(
+    "wandergenie_mongo_pool_connections",
+    "MongoDB pool connections of this process (open, in_use, waiting)",
+    ["state"]
+)
+
+
+# ============= MongoDB pool statistics =============
+
+class PoolStats:
+    """Connection pool counters per server, fed by pymongo pool events"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._servers: Dict[str, Dict[str, int]] = defaultdict(lambda: defaultdict(int))
+        self.last_checkout_timeout: Optional[float] = None
+
+    def listener(self):
+        """pymongo `ConnectionPoolListener` recording into these stats"""
+        from pymongo.monitoring import ConnectionCheckOutFailedReason, ConnectionPoolListener
+
+        stats = self
+
+        class _PoolListener(ConnectionPoolListener):
+            def pool_created(self, event):
+                # Only options that differ from pymongo's defaults are listed
+                if "maxPoolSize" in event.options:
+                    stats._set(event.address, "max_pool_size", event.options["maxPoolSize"])
+
+            def pool_ready(self, event):
+                pass
+
+            def pool_cleared(self, event):
+                stats._add(event.address, "cleared", 1)
+
+            def pool_closed(self, event):
+                pass
+
+            def connection_created(self, event):
+                stats._add(event.address, "open", 1)
+
+            def connection_ready(self, event):
+                pass
+
+            def connection_closed(self, event):
+                stats._add(event.address, "open", -1)
+
+            def connection_check_out_started(self, event):
+                stats._add(event.address, "waiting", 1)
+
+            def connection_check_out_failed(self, event):
+                stats._add(event.address, "waiting", -1)
+                stats._add(event.address, "checkout_failures", 1)
+                if event.reason == ConnectionCheckOutFailedReason.TIMEOUT:
+                    stats.last_checkout_timeout = time.monotonic()
+
+            def connection_checked_out(self, event):
+                stats._add(event.address, "waiting", -1)
+                stats._add(event.address, "in_use", 1)
+
+            def connection_checked_in(self, event):
+                stats._add(event.address, "in_use", -1)
+
+        return _PoolListener()
+
+    def _add(self, address, field: str, delta: int):
+        with self._lock:
+            self._servers[f"{address[0]}:{address[1]}"][field] += delta
+
+    def _set(self, address, field: str, value: int):
+        with self._lock:
+            self._servers[f"{address[0]}:{address[1]}"][field] = value
+
+    def snapshot(self) -> Dict[str, Any]:
+        """
+        Pool statistics of this process.
+
+        Returns:
+            Totals ("open", "in_use", "waiting", "checkout_failures"), whether
+            the pool is exhausted, and the same counters per server
+        """
+        settings = get_settings()
+        with self._lock:
+            servers = {address: dict(counters) for address, counters in self._servers.items()}
+        totals = {field: sum(s.get(field, 0) for s in servers.values())
+                  for field in ("open", "in_use", "waiting", "checkout_failures")}
+        saturated = [
+            address for address, s in servers.items()
+            if s.get("waiting", 0) > 0 and s.get("in_use", 0) >= (s.get("max_pool_size") or settings.mongo_max_pool_size)
+        ]
+        recent_timeout = (
+            self.last_checkout_timeout is not None
+            and time.monotonic() - self.last_checkout_timeout < settings.health_probe_interval
+        )
+        for state in ("open", "in_use", "waiting"):
+            MONGO_POOL_CONNECTIONS.labels(state=state).set(totals[state])
+        return {
+            **totals,
+            "max_pool_size": settings.mongo_max_pool_size,
+            "exhausted": bool(saturated) or recent_timeout,
+            "saturated_servers": saturated,
+            "recent_checkout_timeout": recent_timeout,
+            "servers": servers,
+        }
+
+
+_pool_stats = PoolStats()
+
+
+def get_pool_stats() -> PoolStats:
+    """Pool statistics of this process's MongoClient"""
+    return _pool_stats
+
+
+# ============= Probes =============
+
+def probe_mongodb() -> Dict[str, Any]:
+    get_database().command("ping")
+    return {}
+
+
+def probe_mongo_pool() -> Dict[str, Any]:
+    pool = get_pool_stats().snapshot()
+    if pool["exhausted"]:
+        raise RuntimeError(
+            f"connection pool exhausted ({pool['in_use']} in use, {pool['waiting']} waiting)"
+        )
+    return {"in_use": pool["in_use"], "waiting": pool["waiting"]}
+
+
+def probe_vector_index() -> Dict[str, Any]:
+    index_name = get_active_embedding()["vector_index_name"]
+    indexes = list(get_collection().list_search_indexes(index_name))
+    if not indexes:
+        raise RuntimeError(f"vector index '{index_name}' not found")
+    if not any(idx.get("queryable", True) for idx in indexes):
+        raise RuntimeError(f"vector index '{index_name}' is {indexes[0].get('status', 'not queryable')}")
+    return {"index": index_name, "index_status": indexes[0].get("status")}
+
+
+def _open_breakers(provider: str) -> Dict[str, Any]:
+    breakers = [b for b in breaker_states() if b["provider"] == provider]
+    opened = [b["model"] for b in breakers if b["state"] == "open"]
+    if breakers and len(opened) == len(breakers):
+        raise RuntimeError(f"circuit open for every {provider} model ({', '.join(opened)})")
+    return {"open_circuits": opened} if opened else {}
+
+
+def probe_groq() -> Dict[str, Any]:
+    get_groq_client().models.list(timeout=get_settings().health_probe_timeout)
+    return _open_breakers("groq")
+
+
+def probe_gemini() -> Dict[str, Any]:
+    model = get_active_embedding()["model"]
+    if model.startswith(LOCAL_PREFIX):
+        return {"skipped": "local embedding model"}
+    timeout_ms = int(get_settings().health_probe_timeout * 1000)
+    get_genai_client().models.get(model=model, config={"http_options": {"timeout": timeout_ms}})
+    return _open_breakers("gemini")
+
+
+class DependencyProbe:
+    """One dependency check, cached and never run twice at the same time"""
+
+    def __init__(self, name: str, func: Callable[[], Dict[str, Any]]):
+        self.name = name
+        self.func = func
+        self.result: Optional[Dict[str, Any]] = None
+        self.checked_at = 0.0
+        self._running: Optional[asyncio.Future] = None
+
+    def _run(self) -> Dict[str, Any]:
+        started = time.perf_counter()
+        try:
+            details = self.func()
+            result = {"status": "ok", **details}
+        except Exception as e:
+            result = {"status": "fail", "error": str(e)}
+        latency = time.perf_counter() - started
+        result["latency_ms"] = round(latency * 1000, 1)
+        result["checked_at"] = datetime.utcnow().isoformat()
+        DEPENDENCY_UP.labels(dependency=self.name).set(1 if result["status"] == "ok" else 0)
+        DEPENDENCY_LATENCY.labels(dependency=self.name).set(latency)
+        return result
+
+    def _record(self, future: asyncio.Future):
+        if not future.cancelled() and future.exception() is None:
+            self.result = future.result()
+            self.checked_at = time.monotonic()
+
+    async def check(self, max_age: float, timeout: float) -> Dict[str, Any]:
+        """
+        Latest result, probing again when it is older than `max_age`.
+
+        Args:
+            max_age: Seconds a result is reused
+            timeout: Seconds to wait for a probe (it keeps running afterwards
+                and its result is used by later checks)
+
+        Returns:
+            {"status": "ok" | "fail" | "timeout", "latency_ms", "checked_at", ...}
+        """
+        if self.result is not None and time.monotonic() - self.checked_at < max_age:
+            return self.result
+        if self._running is None or self._running.done():
+            self._running = asyncio.ensure_future(asyncio.to_thread(self._run))
+            self._running.add_done_callback(self._record)
+        try:
+            return await asyncio.wait_for(asyncio.shield(self._running), timeout)
+        except asyncio.TimeoutError:
+            DEPENDENCY_UP.labels(dependency=self.name).set(0)
+            return {"status": "timeout", "error": f"no answer within {timeout:.1f}s",
+                    "last_result": self.result}
+
+
+class ReadinessChecker:
+    """Readiness of this worker from its dependency probes"""
+
+    def __init__(self):
+        self.draining = False
+        self.last_status: Optional[str] = None
+        self.probes = {
+            "mongodb": DependencyProbe("mongodb", probe_mongodb),
+            "mongo_pool": DependencyProbe("mongo_pool", probe_mongo_pool),
+            "vector_index": DependencyProbe("vector_index", probe_vector_index),
+            "groq": DependencyProbe("groq", probe_groq),
+            "gemini": DependencyProbe("gemini", probe_gemini),
+        }
+
+    async def check(self) -> Dict[str, Any]:
+        """
+        Run (or reuse) every probe.
+
+        Returns:
+            {"status": "ready" | "degraded" | "not_ready" | "draining",
+            "ready": bool, "checks": {name: result}, "pool": pool statistics}
+        """
+        settings = get_settings()
+        # The pool check reads local counters, so it is never cached
+        max_ages = {"mongo_pool": 0.0}
+        names = list(self.probes)
+        results = await asyncio.gather(*(
+            self.probes[name].check(max_ages.get(name, settings.health_probe_interval), settings.health_probe_timeout)
+            for name in names
+        ))
+        checks = dict(zip(names, results))
+
+        failing = [name for name, result in checks.items() if result["status"] != "ok"]
+        critical = [name for name in failing if name in settings.health_critical_checks]
+        if self.draining:
+            status = "draining"
+        elif critical:
+            status = "not_ready"
+        elif failing:
+            status = "degraded"
+        else:
+            status = "ready"
+        if self.last_status is not None and status != self.last_status:
+            print(f"🩺 Readiness {self.last_status} -> {status} (failing: {', '.join(failing) or 'none'})",
+                  file=sys.stderr)
+        self.last_status = status
+        return {
+            "status": status,
+            "ready": status in ("ready", "degraded"),
+            "failing": failing,
+            "checks": checks,
+            "pool": get_pool_stats().snapshot(),
+        }
+
+
+_checker: Optional[ReadinessChecker] = None
+_checker_lock = threading.Lock()
+
+
+def get_readiness_checker() -> ReadinessChecker:
+    """Get the process-wide readiness checker"""
+    global _checker
+    with _checker_lock:
+        if _checker is None:
+            _checker = ReadinessChecker()
+        return _checker
@@ -1,93 +1,178 @@
 """
 Document ingestion pipeline
 """
-from typing import List, Dict
+from typing import Any, Dict
 from app.db import get_collection
-from app.embeddings import get_embedding
+from app.embeddings import get_embeddings
 from app.config import get_settings
+from app.bundles import build_destination_bundles, schedule_bundle_rebuild
+from app.chunking import chunk_document
+from app.corpus import bump_generation, get_active_embedding, normalize_destination
+from app.dedup import encode_signature, find_duplicates
+from app.metrics import track_stage, DEDUP_CHUNKS, VECTOR_BYTES
+from app.vectors import encode_vector, stored_size
 
 
-def chunk_text(text: str, chunk_size: int = None, overlap: int = None) -> List[str]:
+def ingest_document(text: str, metadata: Dict) -> int:
     """
-    Split text into overlapping chunks.
+    Ingest a document: chunk, embed, and store in MongoDB.
     
     Args:
-        text: Input text to chunk
-        chunk_size: Size of each chunk (default from settings)
-        overlap: Overlap between chunks (default from settings)
+        text: Document text
+        metadata: Document metadata (type, destination, category, etc.)
         
     Returns:
-        List of text chunks
+        Number of chunks stored (inserted or replacing a near-duplicate)
     """
-    settings = get_settings()
-    chunk_size = chunk_size or settings.chunk_size
-    overlap = overlap or settings.chunk_overlap
-    
-    if len(text) <= chunk_size:
-        return [text]
-    
-    chunks = []
-    start = 0
-    
-    while start < len(text):
-        end = start + chunk_size
-        chunk = text[start:end]
-        
-        # Try to break at sentence boundary
-        if end < len(text):
-            last_period = chunk.rfind('.')
-            last_newline = chunk.rfind('\n')
-            break_point = max(last_period, last_newline)
-            
-            if break_point > chunk_size // 2:  # Only break if we're past halfway
-                chunk = text[start:start + break_point + 1]
-                end = start + break_point + 1
-        
-        chunks.append(chunk.strip())
-        start = end - overlap
-    
-    return chunks
+    return ingest_document_with_report(text, metadata)["stored"]
 
 
-def ingest_document(text: str, metadata: Dict) -> int:
+def ingest_document_with_report(text: str, metadata: Dict) -> Dict[str, Any]:
     """
-    Ingest a document: chunk, embed, and store in MongoDB.
+    Ingest a document and report the near-duplicate chunks it contained.
+    
+    Depending on `Settings.dedup_mode`, a chunk that nearly duplicates an
+    earlier chunk of the document or a stored chunk of the same destination
+    is skipped before embedding ("skip"), or replaces the stored chunk in
+    place ("replace"); "off" stores every chunk.
     
     Args:
         text: Document text
         metadata: Document metadata (type, destination, category, etc.)
         
     Returns:
-        Number of chunks inserted
+        Report dict: "chunks", "stored", "skipped", "replaced",
+        "embedding_calls_saved", "vector_bytes_saved" and "duplicates"
+        (one entry per skipped or replaced chunk)
     """
+    settings = get_settings()
     collection = get_collection()
+    destination_key = normalize_destination(metadata.get("destination"))
+    model = get_active_embedding()["model"]
     
-    # Chunk the text
-    chunks = chunk_text(text)
+    # Chunk the text (token budget, section-aware)
+    with track_stage("ingest", "chunk"):
+        chunks = chunk_document(text)
+    
+    # Find near-duplicates before paying for their embeddings
+    with track_stage("ingest", "dedup"):
+        signed = find_duplicates(
+            [chunk["text"] for chunk in chunks], destination_key,
+            model=model, search=settings.dedup_mode != "off"
+        )
+    
+    stored, duplicates, replaced_ids = [], [], set()
+    for i, (chunk, sig) in enumerate(zip(chunks, signed)):
+        match = sig["duplicate_of"]
+        replace = (
+            match is not None and match["source"] == "corpus"
+            and settings.dedup_mode == "replace" and match["id"] not in replaced_ids
+        )
+        if match is not None:
+            duplicates.append({
+                "chunk_index": i,
+                "section": chunk["section"],
+                "action": "replaced" if replace else "skipped",
+                "duplicate_of": match["source"],
+                "matched_id": str(match["id"]),
+                "similarity": round(match["similarity"], 3),
+                "preview": chunk["text"][:120],
+            })
+            if not replace:
+                continue
+            replaced_ids.add(match["id"])
+        stored.append((i, chunk, sig, match["id"] if replace else None))
+    
+    # Generate embeddings in batches
+    with track_stage("ingest", "embedding"):
+        embeddings = get_embeddings([chunk["text"] for _, chunk, _, _ in stored], model=model) if stored else []
+    
+    from pymongo import ReplaceOne
     
     # Process each chunk
-    documents = []
-    for i, chunk in enumerate(chunks):
-        # Generate embedding
-        embedding = get_embedding(chunk)
-        
-        # Create document
+    documents, replacements = [], []
+    vector_bytes = 0
+    for (i, chunk, sig, replaces), embedding in zip(stored, embeddings):
+        # Create document (record the model so backends are never mixed)
         doc = {
-            "text": chunk,
-            "embedding": embedding,
+            "text": chunk["text"],
+            "embedding": encode_vector(embedding, settings.embedding_storage),
+            "embedding_model": model,
+            "embedding_dim": len(embedding),
             "metadata": {
                 **metadata,
+                "destination_key": destination_key,
+                "section": chunk["section"],
+                "sections": chunk["sections"],
+                "token_count": chunk["tokens"],
                 "chunk_index": i,
                 "total_chunks": len(chunks)
             }
         }
-        documents.append(doc)
+        if sig["signature"] is not None:
+            doc["minhash"] = encode_signature(sig["signature"])
+            doc["lsh_bands"] = sig["bands"]
+        vector_bytes = stored_size(doc["embedding"])
+        VECTOR_BYTES.labels(direction="ingest").inc(vector_bytes)
+        if replaces is not None:
+            replacements.append(ReplaceOne({"_id": replaces}, doc))
+        else:
+            documents.append(doc)
     
     # Bulk insert
-    if documents:
-        collection.insert_many(documents)
+    if documents or replacements:
+        with track_stage("ingest", "insert"):
+            if documents:
+                collection.insert_many(documents)
+            if replacements:
+                collection.bulk_write(replacements, ordered=False)
+        # Invalidate cached retrieval results for this destination
+        bump_generation(metadata.get("destination"))
+        if settings.context_bundles_enabled and metadata.get("destination"):
+            # In the background, once the vector index has the new chunks
+            schedule_bundle_rebuild(metadata["destination"])
+    
+    skipped = sum(1 for d in duplicates if d["action"] == "skipped")
+    DEDUP_CHUNKS.labels(action="stored").inc(len(documents))
+    DEDUP_CHUNKS.labels(action="replaced").inc(len(replacements))
+    DEDUP_CHUNKS.labels(action="skipped").inc(skipped)
+    if duplicates:
+        print(
+            f"✂️  {len(duplicates)}/{len(chunks)} near-duplicate chunks for "
+            f"{metadata.get('destination') or 'document'} "
+            f"({skipped} skipped, {len(replacements)} replaced)"
+        )
+    
+    return {
+        "chunks": len(chunks),
+        "stored": len(documents) + len(replacements),
+        "skipped": skipped,
+        "replaced": len(replacements),
+        "embedding_calls_saved": skipped,
+        # Estimated from this document's vectors (None if nothing was embedded)
+        "vector_bytes_saved": skipped * vector_bytes if vector_bytes else None,
+        "duplicates": duplicates,
+    }
+
+
+def rebuild_context_bundles(destination: str) -> int:
+    """
+    Rebuild a destination's precomputed context bundles after ingestion.
+    
+    Failures are logged, not raised: `/plan` falls back to live retrieval
+    for destinations without bundles.
     
-    return len(documents)
+    Args:
+        destination: Destination name from the document metadata
+        
+    Returns:
+        Number of bundles written
+    """
+    try:
+        return build_destination_bundles(destination)
+    except Exception as e:
+        print(f"⚠️  Could not rebuild context bundles for {destination}: {e}")
+        return 0
 
 
 def ingest_sample_data():
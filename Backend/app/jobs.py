@@ -0,0 +1,473 @@
+"""
+Asynchronous `/plan` jobs
+
+`POST /plan/jobs` stores the request in the `plan_jobs` collection and
+returns its id at once; clients poll `GET /plan/jobs/{id}` instead of
+holding a connection open for the whole RAG + LLM pipeline.
+
+Jobs are processed by a pool of worker tasks owned by the app lifespan.
+A worker claims the oldest queued job atomically (so several processes can
+share the collection) and renews a lease on it while it runs. The finished
+itinerary is saved to `itineraries` under an id allocated when the job was
+created, so a job that is run twice still produces one itinerary.
+
+Job states: queued -> running -> succeeded | failed. When a process stops,
+its running jobs are put back in the queue; when a process dies, its jobs
+are requeued once their lease expires. A job that keeps failing (or
+keeps losing its worker) is failed after `Settings.plan_job_max_attempts`.
+"""
+import asyncio
+import os
+import socket
+import sys
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+from bson import ObjectId
+from prometheus_client import Counter, Histogram
+from starlette.concurrency import run_in_threadpool
+
+from app.admission import AdmissionRejected, Priority, get_admission_controller
+from app.coalesce import get_plan_coalescer, plan_request_key
+from app.config import get_settings
+from app.db import get_database
+from app.generate import generate_itinerary
+from app.precompute import lookup_precomputed
+from app.resilience import ProviderUnavailable
+from app.schemas import PlanRequest
+from app.storage import save_itinerary
+
+
+QUEUED, RUNNING, SUCCEEDED, FAILED = "queued", "running", "succeeded", "failed"
+
+PLAN_JOBS = Counter(
+    "wandergenie_plan_jobs_total",
+    "Plan job events (created, succeeded, failed, retried, requeued)",
+    ["event"]
+)
+
+PLAN_JOB_QUEUE_WAIT = Histogram(
+    "wandergenie_plan_job_queue_wait_seconds",
+    "Time from job creation (or requeue) until a worker claimed it",
+    buckets=(0.05, 0.1, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0)
+)
+
+
+def get_jobs_collection():
+    """Get plan jobs collection"""
+    return get_database()["plan_jobs"]
+
+
+def ensure_job_indexes():
+    """
+    Create the indexes used to claim, list and expire jobs.
+    """
+    collection = get_jobs_collection()
+    collection.create_index([("status", 1), ("not_before", 1), ("created_at", 1)])
+    collection.create_index([("status", 1), ("lease_expires_at", 1)])
+    collection.create_index([("user_id", 1), ("created_at", -1)])
+    collection.create_index("expires_at", expireAfterSeconds=0)
+
+
+# ============= Job documents =============
+
+def create_job(request: PlanRequest, user: dict) -> Dict[str, Any]:
+    """
+    Queue a planning job for a user.
+
+    Args:
+        request: Travel planning request
+        user: Authenticated user document
+
+    Returns:
+        Job document
+    """
+    now = datetime.utcnow()
+    job = {
+        "_id": ObjectId(),
+        "user_id": str(user["_id"]),
+        "user_email": user["email"],
+        "request": request.model_dump(mode="json"),
+        "status": QUEUED,
+        "attempts": 0,
+        "itinerary_id": ObjectId(),
+        "created_at": now,
+        "updated_at": now,
+        "not_before": now,
+    }
+    get_jobs_collection().insert_one(job)
+    PLAN_JOBS.labels(event="created").inc()
+    return job
+
+
+def find_user_job(user_id: str, job_id: str) -> Optional[Dict[str, Any]]:
+    """
+    Fetch a job owned by a user.
+
+    Args:
+        user_id: Owner's user id
+        job_id: Job id
+
+    Returns:
+        Job document or None
+    """
+    if not ObjectId.is_valid(job_id):
+        return None
+    return get_jobs_collection().find_one({"_id": ObjectId(job_id), "user_id": user_id})
+
+
+def claim_next_job(worker_id: str, lease_seconds: float) -> Optional[Dict[str, Any]]:
+    """
+    Atomically claim the oldest runnable queued job.
+
+    Args:
+        worker_id: Identifier of the claiming process
+        lease_seconds: How long the claim holds before the job may be requeued
+
+    Returns:
+        Claimed job document, or None if there is nothing to do
+    """
+    from pymongo import ReturnDocument
+
+    now = datetime.utcnow()
+    return get_jobs_collection().find_one_and_update(
+        {"status": QUEUED, "not_before": {"$lte": now}},
+        {
+            "$set": {
+                "status": RUNNING,
+                "worker": worker_id,
+                "started_at": now,
+                "updated_at": now,
+                "lease_expires_at": now + timedelta(seconds=lease_seconds),
+            },
+            "$inc": {"attempts": 1},
+        },
+        sort=[("created_at", 1)],
+        return_document=ReturnDocument.AFTER,
+    )
+
+
+def renew_lease(job: Dict[str, Any], lease_seconds: float) -> bool:
+    """
+    Extend the lease of a job this worker is running.
+
+    Returns:
+        False if the job is no longer running on this worker
+    """
+    now = datetime.utcnow()
+    result = get_jobs_collection().update_one(
+        {"_id": job["_id"], "status": RUNNING, "worker": job["worker"]},
+        {"$set": {"lease_expires_at": now + timedelta(seconds=lease_seconds), "updated_at": now}},
+    )
+    return result.modified_count == 1
+
+
+def _finish_job(job: Dict[str, Any], update: Dict[str, Any]) -> bool:
+    """Update a job this worker still owns (False if it was requeued meanwhile)"""
+    update["updated_at"] = datetime.utcnow()
+    result = get_jobs_collection().update_one(
+        {"_id": job["_id"], "status": RUNNING, "worker": job["worker"]},
+        {"$set": update, "$unset": {"lease_expires_at": ""}},
+    )
+    return result.modified_count == 1
+
+
+def complete_job(job: Dict[str, Any], itinerary_id: ObjectId) -> bool:
+    """Mark a job succeeded"""
+    now = datetime.utcnow()
+    return _finish_job(job, {
+        "status": SUCCEEDED,
+        "itinerary_id": itinerary_id,
+        "finished_at": now,
+        "expires_at": now + timedelta(days=get_settings().plan_job_ttl_days),
+    })
+
+
+def fail_job(job: Dict[str, Any], error: str, status_code: int = 500) -> bool:
+    """Mark a job failed"""
+    now = datetime.utcnow()
+    return _finish_job(job, {
+        "status": FAILED,
+        "error": error,
+        "status_code": status_code,
+        "finished_at": now,
+        "expires_at": now + timedelta(days=get_settings().plan_job_ttl_days),
+    })
+
+
+def retry_job(job: Dict[str, Any], error: str, delay: float) -> bool:
+    """Put a job back in the queue, runnable after `delay` seconds"""
+    return _finish_job(job, {
+        "status": QUEUED,
+        "error": error,
+        "not_before": datetime.utcnow() + timedelta(seconds=delay),
+    })
+
+
+def release_jobs(worker_id: str) -> int:
+    """
+    Requeue the running jobs of a stopping worker process.
+
+    The attempt they used is given back, since the job did not fail.
+
+    Returns:
+        Number of jobs requeued
+    """
+    now = datetime.utcnow()
+    result = get_jobs_collection().update_many(
+        {"status": RUNNING, "worker": worker_id},
+        {
+            "$set": {"status": QUEUED, "not_before": now, "updated_at": now},
+            "$unset": {"lease_expires_at": ""},
+            "$inc": {"attempts": -1},
+        },
+    )
+    return result.modified_count
+
+
+def recover_stale_jobs(max_attempts: int) -> Dict[str, int]:
+    """
+    Requeue (or fail) running jobs whose worker stopped renewing its lease.
+
+    Args:
+        max_attempts: Jobs that already used this many attempts are failed
+
+    Returns:
+        {"requeued": n, "failed": m}
+    """
+    collection = get_jobs_collection()
+    now = datetime.utcnow()
+    stale = {"status": RUNNING, "lease_expires_at": {"$lt": now}}
+
+    failed = collection.update_many(
+        {**stale, "attempts": {"$gte": max_attempts}},
+        {
+            "$set": {
+                "status": FAILED,
+                "error": "Job was interrupted too many times",
+                "status_code": 500,
+                "finished_at": now,
+                "updated_at": now,
+                "expires_at": now + timedelta(days=get_settings().plan_job_ttl_days),
+            },
+            "$unset": {"lease_expires_at": ""},
+        },
+    ).modified_count
+    requeued = collection.update_many(
+        stale,
+        {
+            "$set": {"status": QUEUED, "error": "Worker lost", "not_before": now, "updated_at": now},
+            "$unset": {"lease_expires_at": ""},
+        },
+    ).modified_count
+
+    if failed:
+        PLAN_JOBS.labels(event="failed").inc(failed)
+    if requeued:
+        PLAN_JOBS.labels(event="requeued").inc(requeued)
+    return {"requeued": requeued, "failed": failed}
+
+
+def job_view(job: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Public representation of a job.
+
+    Args:
+        job: Job document
+
+    Returns:
+        Dict with id, status, timestamps, attempts and (when finished)
+        itinerary_id or error
+    """
+    def iso(value):
+        return value.isoformat() if isinstance(value, datetime) else value
+
+    view = {
+        "id": str(job["_id"]),
+        "status": job["status"],
+        "request": job["request"],
+        "attempts": job.get("attempts", 0),
+        "created_at": iso(job["created_at"]),
+        "started_at": iso(job.get("started_at")),
+        "finished_at": iso(job.get("finished_at")),
+    }
+    if job["status"] == SUCCEEDED:
+        view["itinerary_id"] = str(job["itinerary_id"])
+    if job["status"] == FAILED:
+        view["error"] = job.get("error")
+        view["status_code"] = job.get("status_code", 500)
+    return view
+
+
+# ============= Worker pool =============
+
+class PlanJobRunner:
+    """Pool of worker tasks processing queued plan jobs"""
+
+    def __init__(self, workers: int = 4, poll_interval: float = 2.0,
+                 lease_seconds: float = 120.0, max_attempts: int = 3):
+        self.workers = workers
+        self.poll_interval = poll_interval
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}"
+
+        self._tasks: List[asyncio.Task] = []
+        self._wakeup: Optional[asyncio.Event] = None
+        self._stopping = False
+        self.stats = {"succeeded": 0, "failed": 0, "retried": 0}
+
+    @property
+    def running(self) -> bool:
+        return any(not t.done() for t in self._tasks)
+
+    async def start(self):
+        """Start the pool (jobs of dead workers are recovered in the background)"""
+        self._wakeup = asyncio.Event()
+        self._stopping = False
+        self._tasks = [asyncio.create_task(self._work()) for _ in range(self.workers)]
+        self._tasks.append(asyncio.create_task(self._reap()))
+
+    async def stop(self):
+        """Stop the pool and requeue jobs that were still running"""
+        self._stopping = True
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        try:
+            released = await asyncio.to_thread(release_jobs, self.worker_id)
+        except Exception as e:
+            print(f"⚠️  Could not requeue running plan jobs: {e}", file=sys.stderr)
+            return
+        if released:
+            PLAN_JOBS.labels(event="requeued").inc(released)
+            print(f"✓ Requeued {released} running plan jobs")
+
+    def notify(self):
+        """Wake idle workers (a job was just created)"""
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def _work(self):
+        while not self._stopping:
+            try:
+                job = await asyncio.to_thread(claim_next_job, self.worker_id, self.lease_seconds)
+            except Exception as e:
+                print(f"⚠️  Could not claim plan job: {e}", file=sys.stderr)
+                job = None
+
+            if job is None:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                self._wakeup.clear()
+                continue
+
+            queued_since = job.get("not_before") or job["created_at"]
+            PLAN_JOB_QUEUE_WAIT.observe(max(0.0, (job["started_at"] - queued_since).total_seconds()))
+            await self._process(job)
+
+    async def _reap(self):
+        """Requeue jobs of workers that died, at startup and then periodically"""
+        while not self._stopping:
+            try:
+                recovered = await asyncio.to_thread(recover_stale_jobs, self.max_attempts)
+                if recovered["requeued"] or recovered["failed"]:
+                    print(f"✓ Recovered plan jobs: {recovered['requeued']} requeued, {recovered['failed']} failed")
+            except Exception as e:
+                print(f"⚠️  Plan job recovery failed: {e}", file=sys.stderr)
+            await asyncio.sleep(max(self.poll_interval, self.lease_seconds / 4))
+
+    async def _heartbeat(self, job: Dict[str, Any]):
+        """Keep renewing the lease of a running job so it is not requeued"""
+        while True:
+            await asyncio.sleep(self.lease_seconds / 3)
+            try:
+                if not await asyncio.to_thread(renew_lease, job, self.lease_seconds):
+                    return  # finished, or requeued by the reaper
+            except Exception as e:
+                print(f"⚠️  Could not renew the lease of plan job {job['_id']}: {e}", file=sys.stderr)
+
+    async def _process(self, job: Dict[str, Any]):
+        heartbeat = asyncio.create_task(self._heartbeat(job))
+        try:
+            await self._run_job(job)
+        finally:
+            heartbeat.cancel()
+
+    async def _run_job(self, job: Dict[str, Any]):
+        request = PlanRequest(**job["request"])
+
+        async def generate():
+            async with get_admission_controller().admit(Priority.INTERACTIVE):
+                return await run_in_threadpool(generate_itinerary, request)
+
+        try:
+            itinerary = await lookup_precomputed(request)
+            if itinerary is None:
+                if get_settings().plan_coalescing_enabled:
+                    itinerary = await get_plan_coalescer().run(plan_request_key(request), generate)
+                else:
+                    itinerary = await generate()
+            user = {"_id": job["user_id"], "email": job["user_email"]}
+            itinerary_id = await run_in_threadpool(
+                save_itinerary, itinerary.model_dump(), user,
+                generation=itinerary.generation,
+                itinerary_id=job["itinerary_id"]
+            )
+        except (AdmissionRejected, ProviderUnavailable) as e:
+            # Busy or provider down: try again later unless out of attempts
+            if job["attempts"] < self.max_attempts:
+                self.stats["retried"] += 1
+                PLAN_JOBS.labels(event="retried").inc()
+                await asyncio.to_thread(retry_job, job, str(e), e.retry_after)
+            else:
+                self.stats["failed"] += 1
+                PLAN_JOBS.labels(event="failed").inc()
+                await asyncio.to_thread(fail_job, job, str(e), 503)
+            return
+        except Exception as e:
+            print(f"❌ Plan job {job['_id']} failed: {e}", file=sys.stderr)
+            self.stats["failed"] += 1
+            PLAN_JOBS.labels(event="failed").inc()
+            await asyncio.to_thread(fail_job, job, f"Failed to generate itinerary: {str(e)}")
+            return
+
+        self.stats["succeeded"] += 1
+        PLAN_JOBS.labels(event="succeeded").inc()
+        if not await asyncio.to_thread(complete_job, job, itinerary_id):
+            print(f"⚠️  Plan job {job['_id']} was requeued while running; result kept as {itinerary_id}")
+
+
+_job_runner: Optional[PlanJobRunner] = None
+
+
+def get_job_runner() -> Optional[PlanJobRunner]:
+    """Get the running job pool (None outside the app lifespan)"""
+    if _job_runner is not None and _job_runner.running:
+        return _job_runner
+    return None
+
+
+async def start_job_runner() -> PlanJobRunner:
+    """Create and start the process-wide job pool"""
+    global _job_runner
+    settings = get_settings()
+    _job_runner = PlanJobRunner(
+        workers=settings.plan_job_workers,
+        poll_interval=settings.plan_job_poll_interval,
+        lease_seconds=settings.plan_job_lease,
+        max_attempts=settings.plan_job_max_attempts
+    )
+    await _job_runner.start()
+    return _job_runner
+
+
+async def stop_job_runner():
+    """Stop the process-wide job pool, requeueing its running jobs"""
+    global _job_runner
+    if _job_runner is not None:
+        await _job_runner.stop()
+        _job_runner = None
@@ -1,24 +1,73 @@
 """
 FastAPI application - WanderGenie Backend
 """
-from fastapi import FastAPI, HTTPException, Depends, status
+from fastapi import FastAPI, HTTPException, Depends, Response, status
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
+from starlette.concurrency import run_in_threadpool
 from contextlib import asynccontextmanager
 from datetime import datetime
+import asyncio
 import sys
 
+import orjson
+
 from app.config import get_settings
-from app.db import ensure_vector_index, get_users_collection, get_database
+from app.db import ensure_vector_index, get_users_collection
 from app.schemas import (
-    PlanRequest, Itinerary, HealthResponse, IngestRequest,
+    PlanRequest, PlanResponse, BatchPlanRequest, HealthResponse, IngestRequest,
     UserCreate, UserLogin, UserResponse, Token
 )
 from app.generate import generate_itinerary
-from app.ingest import ingest_document
+from app.ingest import ingest_document_with_report
+from app.storage import (
+    save_itinerary, serialize_itinerary, load_itinerary_body, find_user_itineraries,
+    find_user_itinerary, ensure_itinerary_indexes
+)
+from app.responses import ORJSONResponse, itinerary_detail_response, itinerary_list_response, plan_response
+from app.bundles import ensure_bundle_indexes
+from app.dedup import ensure_dedup_index
+from app.admission import AdmissionRejected, Priority, get_admission_controller
+from app.resilience import ProviderUnavailable
+from app.router import routing_stats
+from app.cache import get_shared_cache
+from app.coalesce import get_plan_coalescer, plan_request_key
+from app.batch import plan_batch
+from app.jobs import (
+    create_job, find_user_job, job_view, ensure_job_indexes,
+    get_job_runner, start_job_runner, stop_job_runner, SUCCEEDED, FAILED
+)
+from app.corpus import ensure_embedding_metadata, get_active_embedding
+from app.warmup import start_warmup, stop_warmup, warmup_status
+from app.health import get_readiness_checker
+from app.precompute import (
+    ensure_precompute_indexes, get_precompute_scheduler, lookup_precomputed,
+    start_precompute_scheduler, stop_precompute_scheduler, top_combinations, tokens_used_today
+)
+from app.reembed import find_migration, migration_progress, start_reembed_worker, stop_reembed_worker
+from app.metrics import render_metrics, CONTENT_TYPE_LATEST
+from app.persistence import start_write_queue, stop_write_queue
 from app.auth import hash_password, authenticate_user, create_access_token, get_current_user
 from app import __version__
 
 
+def _busy(error) -> HTTPException:
+    """503 response for a request rejected by admission control or an unavailable provider"""
+    return HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail=str(error),
+        headers={"Retry-After": str(error.retry_after)}
+    )
+
+
+async def _run_startup_check(check, description: str):
+    """Run a blocking startup check in a worker thread, logging failures"""
+    try:
+        await asyncio.to_thread(check)
+    except Exception as e:
+        print(f"⚠️  Could not {description}: {e}")
+
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Startup and shutdown events"""
@@ -29,16 +78,47 @@ async def lifespan(app: FastAPI):
     print(f"✓ Database: {settings.db_name}")
     print(f"✓ Collection: {settings.collection_name}")
     
-    # Check vector index
-    try:
-        ensure_vector_index()
-    except Exception as e:
-        print(f"⚠️  Could not verify vector index: {e}")
+    # Check indexes in the background so startup does not wait on Atlas
+    app.state.startup_tasks = [
+        asyncio.create_task(_run_startup_check(ensure_vector_index, "verify vector index")),
+        asyncio.create_task(_run_startup_check(ensure_itinerary_indexes, "create itinerary indexes")),
+        asyncio.create_task(_run_startup_check(ensure_bundle_indexes, "create context bundle indexes")),
+        asyncio.create_task(_run_startup_check(ensure_job_indexes, "create plan job indexes")),
+        asyncio.create_task(_run_startup_check(ensure_dedup_index, "create near-duplicate index")),
+        asyncio.create_task(_run_startup_check(ensure_precompute_indexes, "create canonical itinerary indexes")),
+        asyncio.create_task(_run_startup_check(ensure_embedding_metadata, "backfill chunk metadata")),
+    ]
+    
+    await start_write_queue()
+    print("✓ Itinerary write queue started")
+    await start_job_runner()
+    print(f"✓ Plan job workers started ({settings.plan_job_workers})")
+    if settings.reembed_worker_enabled:
+        start_reembed_worker()
+        print("✓ Embedding migration worker started")
+    if settings.warmup_enabled:
+        # Ready at once; hot destinations are warmed in the background (see /health)
+        start_warmup()
+        print(f"✓ Cache warmup started (up to {settings.warmup_limit} destinations)")
+    if settings.precompute_enabled:
+        start_precompute_scheduler()
+        print(f"✓ Precompute scheduler started (window {settings.precompute_window or 'any time'} UTC)")
     
     yield
     
     # Shutdown
     print("👋 Shutting down WanderGenie Backend...")
+    # Fail readiness first so load balancers stop sending traffic
+    get_readiness_checker().draining = True
+    await stop_warmup()
+    await stop_precompute_scheduler()
+    if settings.reembed_worker_enabled:
+        await asyncio.to_thread(stop_reembed_worker)
+        print("✓ Embedding migration worker stopped")
+    await stop_job_runner()
+    print("✓ Plan job workers stopped")
+    await stop_write_queue()
+    print("✓ Itinerary write queue flushed")
 
 
 # Initialize FastAPI app
@@ -46,7 +126,8 @@ app = FastAPI(
     title="WanderGenie API",
     description="AI-Powered Travel Planner using RAG with Google Gemini",
     version=__version__,
-    lifespan=lifespan
+    lifespan=lifespan,
+    default_response_class=ORJSONResponse
 )
 
 # CORS middleware
@@ -72,18 +153,132 @@ async def root():
 @app.get("/health", response_model=HealthResponse, tags=["Health"])
 async def health_check():
     """
-    Health check endpoint
+    Health check endpoint, with the progress of the startup cache warmup
+    (`status` pending/running/done, destinations completed of total and how
+    each was warmed). The service is ready while warmup is still running.
+    Orchestrators should use `/health/live` and `/health/ready`.
     """
     settings = get_settings()
     
     return HealthResponse(
         status="healthy",
         version=__version__,
-        database=settings.db_name
+        database=settings.db_name,
+        warmup=warmup_status()
+    )
+
+
+@app.get("/health/live", tags=["Health"])
+async def liveness():
+    """
+    Liveness probe: the process is serving requests. Never touches a dependency.
+    """
+    return {"status": "alive"}
+
+
+@app.get("/health/ready", tags=["Health"])
+async def readiness():
+    """
+    Readiness probe: 200 while this worker should receive traffic, 503 otherwise.
+    
+    Reports each dependency check (MongoDB ping, connection pool, vector index,
+    Groq and Gemini reachability) with its latency, and this process's MongoDB
+    pool statistics. Probe results are cached for `HEALTH_PROBE_INTERVAL`; only
+    the checks in `HEALTH_CRITICAL_CHECKS` make the worker not ready, the others
+    mark it "degraded".
+    """
+    report = await get_readiness_checker().check()
+    return ORJSONResponse(report, status_code=200 if report["ready"] else 503)
+
+
+@app.get("/metrics", tags=["Health"])
+async def metrics():
+    """
+    Prometheus metrics (text exposition format): per-stage latency histograms,
+    fallback / auto-generated guide / provider error counters and in-flight LLM calls.
+    """
+    return Response(content=render_metrics(), media_type=CONTENT_TYPE_LATEST)
+
+
+@app.get("/cache/stats", tags=["Health"])
+async def shared_cache_stats(current_user: dict = Depends(get_current_user)):
+    """
+    Shared cache size and hit rates per worker process and namespace.
+    
+    Requires: Authorization header with Bearer token
+    """
+    cache = get_shared_cache()
+    if cache is None:
+        return {"enabled": False}
+    
+    return {
+        "enabled": True,
+        "worker_pid": cache.pid,
+        **cache.size(),
+        "workers": cache.worker_stats()
+    }
+
+
+@app.get("/admission/stats", tags=["Health"])
+async def admission_stats(current_user: dict = Depends(get_current_user)):
+    """
+    Admission control limits, running and queued requests per priority.
+    
+    Requires: Authorization header with Bearer token
+    """
+    return get_admission_controller().snapshot()
+
+
+@app.get("/models/stats", tags=["Health"])
+async def model_stats(current_user: dict = Depends(get_current_user)):
+    """
+    Model routing rules with recent latency, error rate and circuit state per model.
+    
+    Requires: Authorization header with Bearer token
+    """
+    return {"routes": routing_stats()}
+
+
+@app.get("/embeddings/status", tags=["Health"])
+async def embedding_status(current_user: dict = Depends(get_current_user)):
+    """
+    Active embedding model and vector index, with the progress and estimated
+    completion of the latest embedding migration (`scripts/reembed_corpus.py`).
+    
+    Requires: Authorization header with Bearer token
+    """
+    active = await asyncio.to_thread(get_active_embedding)
+    migration = await asyncio.to_thread(find_migration)
+    return {
+        "active": active,
+        "migration": migration_progress(migration) if migration is not None else None
+    }
+
+
+@app.get("/precompute/stats", tags=["Health"])
+async def precompute_stats(current_user: dict = Depends(get_current_user)):
+    """
+    Most requested destination x days x travel style combinations, the
+    precomputation tokens used today and the last scheduler cycle.
+    
+    Requires: Authorization header with Bearer token
+    """
+    settings = get_settings()
+    combinations = await asyncio.to_thread(
+        top_combinations, settings.precompute_top_combinations,
+        settings.precompute_history_days, settings.precompute_min_requests
     )
+    scheduler = get_precompute_scheduler()
+    return {
+        "enabled": settings.precompute_enabled,
+        "tokens_used_today": await asyncio.to_thread(tokens_used_today),
+        "daily_tokens": settings.precompute_daily_tokens,
+        "combinations": combinations,
+        "scheduler": scheduler.snapshot() if scheduler is not None else None,
+    }
 
 
-@app.post("/plan", response_model=Itinerary, tags=["Planning"])
+@app.post("/plan", response_model=PlanResponse, tags=["Planning"])
 async def plan_trip(
     request: PlanRequest,
     current_user: dict = Depends(get_current_user)
@@ -97,31 +292,38 @@ async def plan_trip(
     - **travel_style**: Preferred travel style
     
     Returns a structured day-by-day itinerary with attractions, costs, and tips.
-    Saves the itinerary to user's history.
+    Saves the itinerary to user's history (written in the background; the
+    returned `id` is allocated up front). Identical requests in flight at the
+    same time share one generation; each caller still gets their own saved copy.
+    Popular trips are served from a precomputed canonical itinerary when one
+    matches (see app/precompute.py). The itinerary is serialized once, for both
+    the stored payload and the response body.
     """
+    async def generate():
+        async with get_admission_controller().admit(Priority.INTERACTIVE):
+            return await run_in_threadpool(generate_itinerary, request)
+    
     try:
-        # Generate itinerary
-        itinerary = generate_itinerary(request)
-        
-        # Save to database with user_id
-        itineraries_collection = get_database()["itineraries"]
-        itinerary_doc = {
-            "user_id": str(current_user["_id"]),
-            "user_email": current_user["email"],
-            "destination": itinerary.destination,
-            "total_days": itinerary.total_days,
-            "total_budget": itinerary.total_budget,
-            "travel_style": itinerary.travel_style,
-            "itinerary_data": itinerary.model_dump(),
-            "created_at": datetime.utcnow().isoformat()
-        }
-        result = itineraries_collection.insert_one(itinerary_doc)
+        # Generate itinerary (admission-controlled, off the event loop,
+        # coalesced with identical requests)
+        settings = get_settings()
+        itinerary = await lookup_precomputed(request)
+        if itinerary is None:
+            if settings.plan_coalescing_enabled:
+                itinerary = await get_plan_coalescer().run(plan_request_key(request), generate)
+            else:
+                itinerary = await generate()
         
-        # Add ID to response
-        itinerary_dict = itinerary.model_dump()
-        itinerary_dict["_id"] = str(result.inserted_id)
+        # Save to database with user_id (compact compressed format)
+        itinerary_data = itinerary.model_dump()
+        raw = serialize_itinerary(itinerary_data)
+        itinerary_id = await run_in_threadpool(
+            save_itinerary, itinerary_data, current_user, generation=itinerary.generation, raw=raw
+        )
         
-        return itinerary
+        return plan_response(raw, str(itinerary_id))
+    except (AdmissionRejected, ProviderUnavailable) as e:
+        raise _busy(e)
     except Exception as e:
         print(f"❌ Error generating itinerary: {e}", file=sys.stderr)
         raise HTTPException(
@@ -130,6 +332,91 @@ async def plan_trip(
         )
 
 
+@app.post("/plan/jobs", status_code=status.HTTP_202_ACCEPTED, tags=["Planning"])
+async def create_plan_job(
+    request: PlanRequest,
+    response: Response,
+    current_user: dict = Depends(get_current_user)
+):
+    """
+    Queue an itinerary generation and return at once (Protected - requires authentication).
+    
+    Takes the same body as `/plan`. Poll `GET /plan/jobs/{job_id}` for the
+    status; when it is `succeeded` the response contains the itinerary, which
+    is also saved to the user's history.
+    """
+    job = await run_in_threadpool(create_job, request, current_user)
+    runner = get_job_runner()
+    if runner is not None:
+        runner.notify()
+    
+    job_id = str(job["_id"])
+    response.headers["Location"] = f"/plan/jobs/{job_id}"
+    return {"id": job_id, "status": job["status"], "status_url": f"/plan/jobs/{job_id}"}
+
+
+@app.get("/plan/jobs/{job_id}", tags=["Planning"])
+async def get_plan_job(
+    job_id: str,
+    response: Response,
+    current_user: dict = Depends(get_current_user)
+):
+    """
+    Get the status of a plan job, with the itinerary once it has succeeded.
+    
+    Status is `queued`, `running`, `succeeded` or `failed` (with `error`).
+    Unfinished jobs carry a `Retry-After` header suggesting when to poll again.
+    
+    Requires: Authorization header with Bearer token
+    """
+    user_id = str(current_user["_id"])
+    job = await run_in_threadpool(find_user_job, user_id, job_id)
+    if job is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Job not found"
+        )
+    
+    view = job_view(job)
+    if job["status"] == SUCCEEDED:
+        doc = await run_in_threadpool(find_user_itinerary, user_id, view["itinerary_id"])
+        view["result"] = load_itinerary_body(doc) if doc is not None else None
+    elif job["status"] != FAILED:
+        response.headers["Retry-After"] = str(max(1, int(get_settings().plan_job_poll_interval)))
+    return view
+
+
+@app.post("/plan/batch", tags=["Planning"])
+async def plan_trips_batch(
+    request: BatchPlanRequest,
+    current_user: dict = Depends(get_current_user)
+):
+    """
+    Generate many itineraries in one call (Protected - requires authentication).
+    
+    - **requests**: List of `/plan` requests (at most `BATCH_MAX_ITEMS`)
+    
+    Streams NDJSON, one line per item in completion order:
+    `{"index", "status": "ok", "id", "itinerary"}` or
+    `{"index", "status": "error", "status_code", "error"}`, followed by a
+    final `{"done": true, ...}` summary. Items sharing a destination and travel
+    style share retrieval; identical items share one generation. A failed item
+    does not fail the batch. Every itinerary is saved to the user's history.
+    """
+    settings = get_settings()
+    if len(request.requests) > settings.batch_max_items:
+        raise HTTPException(
+            status_code=413,
+            detail=f"A batch may contain at most {settings.batch_max_items} requests"
+        )
+    
+    async def stream():
+        async for result in plan_batch(request.requests, current_user):
+            yield orjson.dumps(result) + b"\n"
+    
+    return StreamingResponse(stream(), media_type="application/x-ndjson")
+
+
 @app.post("/ingest", tags=["Admin"])
 async def ingest_travel_document(request: IngestRequest):
     """
@@ -138,15 +425,21 @@ async def ingest_travel_document(request: IngestRequest):
     - **text**: Document text content
     - **metadata**: Document metadata (type, destination, etc.)
     
-    Returns the number of chunks created.
+    Returns the number of chunks created and a report of near-duplicate chunks
+    that were skipped or replaced (`DEDUP_MODE`). Runs at lower priority than
+    `/plan` under admission control.
     """
     try:
-        num_chunks = ingest_document(request.text, request.metadata)
+        async with get_admission_controller().admit(Priority.ADMIN):
+            report = await run_in_threadpool(ingest_document_with_report, request.text, request.metadata)
         return {
             "message": "Document ingested successfully",
-            "chunks_created": num_chunks,
+            "chunks_created": report["stored"],
+            "near_duplicates": report,
             "metadata": request.metadata
         }
+    except (AdmissionRejected, ProviderUnavailable) as e:
+        raise _busy(e)
     except Exception as e:
         print(f"❌ Error ingesting document: {e}", file=sys.stderr)
         raise HTTPException(
@@ -156,41 +449,30 @@ async def ingest_travel_document(request: IngestRequest):
 
 
 @app.get("/itineraries", tags=["Planning"])
-async def get_user_itineraries(current_user: dict = Depends(get_current_user)):
+async def get_user_itineraries(
+    include_details: bool = True,
+    current_user: dict = Depends(get_current_user)
+):
     """
     Get all itineraries for the current logged-in user.
     
     Requires: Authorization header with Bearer token
     
+    - **include_details**: Include the full itinerary body (set to false for a
+      summary-only listing; the compressed body is then never read)
+    
     Returns list of past trip itineraries ordered by creation date (newest first).
+    Stored bodies are decompressed into the response without being parsed.
     """
-    try:
-        itineraries_collection = get_database()["itineraries"]
-        
-        # Find all itineraries for this user
-        user_itineraries = list(
-            itineraries_collection.find(
-                {"user_id": str(current_user["_id"])}
-            ).sort("created_at", -1)  # Newest first
+    def build():
+        user_itineraries = find_user_itineraries(
+            str(current_user["_id"]),
+            include_body=include_details
         )
-        
-        # Format response
-        result = []
-        for doc in user_itineraries:
-            result.append({
-                "id": str(doc["_id"]),
-                "destination": doc["destination"],
-                "total_days": doc["total_days"],
-                "total_budget": doc["total_budget"],
-                "travel_style": doc["travel_style"],
-                "created_at": doc["created_at"],
-                "itinerary": doc["itinerary_data"]
-            })
-        
-        return {
-            "count": len(result),
-            "itineraries": result
-        }
+        return itinerary_list_response(user_itineraries, include_details)
+    
+    try:
+        return await run_in_threadpool(build)
         
     except Exception as e:
         print(f"❌ Error fetching itineraries: {e}", file=sys.stderr)
@@ -200,6 +482,23 @@ async def get_user_itineraries(current_user: dict = Depends(get_current_user)):
         )
 
 
+@app.get("/itineraries/{itinerary_id}", tags=["Planning"])
+async def get_user_itinerary(itinerary_id: str, current_user: dict = Depends(get_current_user)):
+    """
+    Get a single saved itinerary with its full body.
+    
+    Requires: Authorization header with Bearer token
+    """
+    doc = await run_in_threadpool(find_user_itinerary, str(current_user["_id"]), itinerary_id)
+    if doc is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Itinerary not found"
+        )
+    
+    return await run_in_threadpool(itinerary_detail_response, doc)
+
+
 # ============= Authentication Endpoints =============
 
 @app.post("/auth/register", response_model=UserResponse, status_code=status.HTTP_201_CREATED, tags=["Authentication"])
@@ -0,0 +1,127 @@
+"""
+Prometheus metrics for the RAG pipeline
+
+Exposed in text format at `/metrics`. Stage latencies are recorded per
+pipeline (`plan`, `retrieve`, `ingest`, `persist`) so a slow `/plan` can be
+attributed to the destination check, embedding, vector search, LLM call,
+parsing or the database write.
+"""
+import time
+from contextlib import contextmanager
+
+from prometheus_client import Counter, Gauge, Histogram, generate_latest, CONTENT_TYPE_LATEST
+
+
+# Buckets cover fast local work (parsing, chunking) up to slow LLM calls
+STAGE_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+STAGE_LATENCY = Histogram(
+    "wandergenie_stage_duration_seconds",
+    "Latency of individual RAG pipeline stages",
+    ["pipeline", "stage"],
+    buckets=STAGE_BUCKETS
+)
+
+FALLBACK_ITINERARIES = Counter(
+    "wandergenie_fallback_itineraries_total",
+    "Itineraries replaced by the placeholder fallback because the LLM response could not be parsed"
+)
+
+ITINERARY_PARSE_OUTCOMES = Counter(
+    "wandergenie_itinerary_parse_outcomes_total",
+    "LLM itinerary responses by outcome: clean, repaired (JSON fixed locally), days_regenerated "
+    "(missing days re-requested), partial_fallback (some placeholder days) or fallback",
+    ["outcome"]
+)
+
+ITINERARY_DEFECTS = Counter(
+    "wandergenie_itinerary_defects_total",
+    "Defects found in LLM itinerary responses",
+    ["defect"]
+)
+
+AUTO_GENERATED_GUIDES = Counter(
+    "wandergenie_auto_generated_guides_total",
+    "Destination guides generated on demand for unknown destinations",
+    ["outcome"]
+)
+
+PROVIDER_ERRORS = Counter(
+    "wandergenie_provider_errors_total",
+    "Errors returned by external providers",
+    ["provider", "operation"]
+)
+
+CONTEXT_BUNDLE_LOOKUPS = Counter(
+    "wandergenie_context_bundle_lookups_total",
+    "Precomputed context bundle lookups by /plan (hit, miss, stale)",
+    ["result"]
+)
+
+VECTOR_BYTES = Counter(
+    "wandergenie_vector_bytes_total",
+    "Bytes of embedding data sent to MongoDB (stored chunk vectors and search query vectors)",
+    ["direction"]
+)
+
+DEDUP_CHUNKS = Counter(
+    "wandergenie_dedup_chunks_total",
+    "Ingested chunks by near-duplicate outcome (stored, skipped, replaced)",
+    ["action"]
+)
+
+REEMBEDDED_CHUNKS = Counter(
+    "wandergenie_reembedded_chunks_total",
+    "Chunks handled by the embedding migration worker (embedded, unchanged, removed)",
+    ["result"]
+)
+
+LLM_IN_FLIGHT = Gauge(
+    "wandergenie_llm_in_flight",
+    "LLM calls currently in progress",
+    ["provider"]
+)
+
+
+@contextmanager
+def track_stage(pipeline: str, stage: str):
+    """
+    Time a pipeline stage.
+
+    Args:
+        pipeline: Pipeline name (e.g., "plan", "ingest")
+        stage: Stage name (e.g., "vector_search")
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        STAGE_LATENCY.labels(pipeline=pipeline, stage=stage).observe(time.perf_counter() - start)
+
+
+@contextmanager
+def track_provider_call(provider: str, operation: str, llm: bool = False):
+    """
+    Count provider errors (and in-flight LLM calls) around an external call.
+
+    Args:
+        provider: Provider name (e.g., "groq", "gemini")
+        operation: Operation name (e.g., "chat_completion", "embed_content")
+        llm: Whether the call should be counted in the in-flight LLM gauge
+    """
+    if llm:
+        LLM_IN_FLIGHT.labels(provider=provider).inc()
+    try:
+        yield
+    except Exception:
+        PROVIDER_ERRORS.labels(provider=provider, operation=operation).inc()
+        raise
+    finally:
+        if llm:
+            LLM_IN_FLIGHT.labels(provider=provider).dec()
+
+
+def render_metrics() -> bytes:
+    """Render all metrics in Prometheus text format"""
+    return generate_latest()
+
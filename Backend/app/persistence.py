@@ -0,0 +1,317 @@
+"""
+Write-behind persistence queue for generated itineraries
+
+`/plan` hands finished itinerary documents (with a pre-allocated `_id`) to
+this queue and returns immediately. A background task owned by the app
+lifespan batches the documents into `insert_many` calls, retries with
+exponential backoff, and spills to a local JSONL file when MongoDB stays
+unreachable. Spilled documents are replayed on the next successful write
+and on startup, and the queue is drained on shutdown.
+
+Only connectivity errors are retried and spilled. When MongoDB rejects a
+batch for another reason (e.g. an invalid document), its documents are
+written one by one and the ones that still fail are set aside in
+`rejected-<pid>.jsonl`, like unreadable spill lines, so one bad document
+never stops the writer.
+"""
+import asyncio
+import glob
+import json
+import os
+from typing import Dict, List, Optional
+
+from bson import json_util
+
+from app.config import get_settings
+from app.db import get_itineraries_collection
+from app.metrics import track_stage
+
+
+DUPLICATE_KEY_ERROR = 11000
+
+
+class ItineraryWriteQueue:
+    """Batches itinerary inserts in the background"""
+
+    def __init__(
+        self,
+        batch_size: int = 50,
+        flush_interval: float = 0.5,
+        max_retries: int = 5,
+        retry_backoff: float = 0.5,
+        spill_dir: str = "data/spill"
+    ):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self.spill_dir = spill_dir
+        self.spill_path = os.path.join(spill_dir, f"itineraries-{os.getpid()}.jsonl")
+        self.rejected_path = os.path.join(spill_dir, f"rejected-{os.getpid()}.jsonl")
+
+        self._queue: Optional[asyncio.Queue] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._task: Optional[asyncio.Task] = None
+        self.stats = {"written": 0, "spilled": 0, "replayed": 0, "retries": 0, "rejected": 0}
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def pending(self) -> int:
+        """Number of documents waiting to be written"""
+        return self._queue.qsize() if self._queue is not None else 0
+
+    async def start(self):
+        """Start the writer task (spilled documents are replayed in the background)"""
+        self._queue = asyncio.Queue()
+        self._loop = asyncio.get_running_loop()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Flush everything still queued and stop the writer task"""
+        if self._task is None:
+            return
+        await self._queue.put(None)
+        await self._task
+        self._task = None
+
+    def enqueue(self, doc: Dict):
+        """
+        Queue a document for insertion (from the event loop or a worker thread).
+
+        Args:
+            doc: Document with a pre-allocated `_id`
+        """
+        if not self.running:
+            raise RuntimeError("Itinerary write queue is not running")
+        try:
+            on_loop = asyncio.get_running_loop() is self._loop
+        except RuntimeError:
+            on_loop = False
+        if on_loop:
+            self._queue.put_nowait(doc)
+        else:
+            # asyncio.Queue is not thread-safe
+            self._loop.call_soon_threadsafe(self._queue.put_nowait, doc)
+
+    async def _run(self):
+        try:
+            await self._replay_spill()
+        except Exception as e:
+            print(f"❌ Replaying spilled itineraries failed: {e!r}")
+        stopping = False
+        while not stopping:
+            first = await self._queue.get()
+            if first is None:
+                break
+
+            batch = [first]
+            loop = asyncio.get_running_loop()
+            deadline = loop.time() + self.flush_interval
+            while len(batch) < self.batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    doc = await asyncio.wait_for(self._queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                if doc is None:
+                    stopping = True
+                    break
+                batch.append(doc)
+
+            await self._flush(batch)
+
+        # Drain anything that was queued after the stop sentinel
+        remaining = []
+        while not self._queue.empty():
+            doc = self._queue.get_nowait()
+            if doc is not None:
+                remaining.append(doc)
+        for i in range(0, len(remaining), self.batch_size):
+            await self._flush(remaining[i:i + self.batch_size])
+
+    async def _flush(self, batch: List[Dict]):
+        try:
+            rejected = self.stats["rejected"]
+            written = await self._write(batch)
+            if written:
+                self.stats["written"] += len(batch) - (self.stats["rejected"] - rejected)
+            else:
+                await asyncio.to_thread(self._spill, batch)
+                self.stats["spilled"] += len(batch)
+                print(f"⚠️  MongoDB unreachable - spilled {len(batch)} itineraries to {self.spill_path}")
+        except Exception as e:
+            # Never let the writer task die; the batch is lost but logged
+            ids = ", ".join(str(doc.get("_id")) for doc in batch)
+            print(f"❌ Dropped {len(batch)} itineraries ({ids}): {e!r}")
+            return
+
+        if written:
+            try:
+                await self._replay_spill()
+            except Exception as e:
+                print(f"❌ Replaying spilled itineraries failed: {e!r}")
+
+    async def _write(self, batch: List[Dict]) -> bool:
+        """
+        Write a batch, setting aside documents MongoDB rejects.
+
+        Returns:
+            False when MongoDB stayed unreachable (the batch should be kept)
+        """
+        try:
+            return await self._write_with_retry(batch)
+        except Exception as e:
+            if len(batch) == 1:
+                await asyncio.to_thread(self._reject, batch[0], e)
+                return True
+            print(f"⚠️  Itinerary batch rejected ({e!r}) - writing its {len(batch)} documents one by one")
+
+        for doc in batch:
+            # If MongoDB goes away midway the whole batch is kept; documents already
+            # inserted are then duplicates, which _insert_batch ignores
+            if not await self._write([doc]):
+                return False
+        return True
+
+    async def _write_with_retry(self, batch: List[Dict]) -> bool:
+        """
+        Insert a batch, retrying connectivity errors.
+
+        Returns:
+            False when every attempt failed
+
+        Raises:
+            Errors retrying would not fix (documents the server refused,
+            invalid BSON)
+        """
+        from pymongo.errors import BulkWriteError, PyMongoError, WriteError
+
+        for attempt in range(self.max_retries + 1):
+            try:
+                await asyncio.to_thread(_insert_batch, batch)
+                return True
+            except (BulkWriteError, WriteError):
+                raise  # the server refused documents; sending them again would not help
+            except PyMongoError as e:
+                if attempt == self.max_retries:
+                    print(f"❌ Itinerary batch write failed after {attempt + 1} attempts: {e}")
+                    return False
+                self.stats["retries"] += 1
+                await asyncio.sleep(self.retry_backoff * (2 ** attempt))
+        return False
+
+    def _spill(self, batch: List[Dict]):
+        os.makedirs(self.spill_dir, exist_ok=True)
+        with open(self.spill_path, "a", encoding="utf-8") as f:
+            for doc in batch:
+                f.write(json_util.dumps(doc, json_options=json_util.CANONICAL_JSON_OPTIONS) + "\n")
+
+    def _set_aside(self, record: Dict):
+        self.stats["rejected"] += 1
+        try:
+            os.makedirs(self.spill_dir, exist_ok=True)
+            with open(self.rejected_path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(record, default=str) + "\n")
+        except OSError as e:
+            print(f"⚠️  Could not record rejected itinerary in {self.rejected_path}: {e}")
+
+    def _reject(self, doc: Dict, error: Exception):
+        """Set aside a document MongoDB will not accept"""
+        print(f"❌ Itinerary {doc.get('_id')} rejected: {error!r} - set aside in {self.rejected_path}")
+        try:
+            document = json_util.dumps(doc, json_options=json_util.CANONICAL_JSON_OPTIONS)
+        except Exception:
+            document = repr(doc)
+        self._set_aside({"error": repr(error), "document": document})
+
+    def _read_spill(self, path: str) -> List[Dict]:
+        """Documents of a spill file, setting aside lines that do not parse"""
+        docs = []
+        with open(path, encoding="utf-8") as f:
+            for number, line in enumerate(f, 1):
+                if not line.strip():
+                    continue
+                try:
+                    docs.append(json_util.loads(line))
+                except Exception as e:
+                    print(f"❌ Unreadable spill line {path}:{number}: {e!r} - set aside in {self.rejected_path}")
+                    self._set_aside({"error": repr(e), "line": line.rstrip("\n")})
+        return docs
+
+    async def _replay_spill(self):
+        """Re-insert documents from spill files left by this or earlier processes"""
+        for path in glob.glob(os.path.join(self.spill_dir, "itineraries-*.jsonl")):
+            # Claim the file so concurrent workers do not replay it twice
+            claimed = f"{path}.replaying-{os.getpid()}"
+            try:
+                os.replace(path, claimed)
+            except OSError:
+                continue
+
+            try:
+                docs = await asyncio.to_thread(self._read_spill, claimed)
+                ok = True
+                for i in range(0, len(docs), self.batch_size):
+                    if not await self._write(docs[i:i + self.batch_size]):
+                        ok = False
+                        break
+            except Exception as e:
+                print(f"❌ Replaying {path} failed: {e!r}")
+                ok = False
+
+            if ok:
+                os.remove(claimed)
+                self.stats["replayed"] += len(docs)
+                print(f"✓ Replayed {len(docs)} spilled itineraries from {path}")
+            else:
+                # Put the file back for the next attempt
+                os.replace(claimed, path)
+                return
+
+def _insert_batch(batch: List[Dict]):
+    """Insert a batch, treating already-inserted documents as success"""
+    from pymongo.errors import BulkWriteError
+
+    try:
+        with track_stage("persist", "insert_many"):
+            get_itineraries_collection().insert_many(batch, ordered=False)
+    except BulkWriteError as e:
+        errors = e.details.get("writeErrors", [])
+        if any(err.get("code") != DUPLICATE_KEY_ERROR for err in errors):
+            raise
+
+
+_write_queue: Optional[ItineraryWriteQueue] = None
+
+
+def get_write_queue() -> Optional[ItineraryWriteQueue]:
+    """Get the running write queue (None outside the app lifespan)"""
+    if _write_queue is not None and _write_queue.running:
+        return _write_queue
+    return None
+
+
+async def start_write_queue() -> ItineraryWriteQueue:
+    """Create and start the process-wide write queue"""
+    global _write_queue
+    settings = get_settings()
+    _write_queue = ItineraryWriteQueue(
+        batch_size=settings.write_queue_batch_size,
+        flush_interval=settings.write_queue_flush_interval,
+        max_retries=settings.write_queue_max_retries,
+        spill_dir=settings.write_queue_spill_dir
+    )
+    await _write_queue.start()
+    return _write_queue
+
+
+async def stop_write_queue():
+    """Flush and stop the process-wide write queue"""
+    global _write_queue
+    if _write_queue is not None:
+        await _write_queue.stop()
+        _write_queue = None
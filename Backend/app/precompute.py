@@ -0,0 +1,541 @@
+"""
+Demand-driven precomputation of guides and canonical itineraries
+
+Saved `itineraries` record which destinations, trip lengths and travel
+styles are requested. During the off-peak window
+(`Settings.precompute_window`, UTC), a scheduler reads the demand of the
+last `Settings.precompute_history_days`:
+
+- destinations in demand without a guide get one generated and ingested,
+  so their first `/plan` does not pay for it;
+- the `Settings.precompute_top_combinations` most requested destination x
+  days x travel style combinations (seen at least
+  `Settings.precompute_min_requests` times) get a canonical itinerary,
+  planned for the combination's average budget and stored in
+  `canonical_itineraries`.
+
+All of it is paid from a daily LLM token budget
+(`Settings.precompute_daily_tokens`) shared by every worker process. Each
+task reserves its estimated tokens before calling the model and records
+the actual usage afterwards. Generations run at admin priority and pause
+while the process is busy.
+
+`/plan` (and `/plan/jobs`, `/plan/batch`) serve a request from its
+combination's canonical itinerary with one lookup by `_id` when the
+request's budget is within `Settings.precompute_budget_tolerance` of the
+canonical budget; the plan's costs are scaled to the request's budget.
+Plans built from an older corpus of the destination are not served.
+Canonical itineraries are rebuilt after
+`Settings.precompute_ttl_days`, or when the destination's corpus changed.
+"""
+import asyncio
+import os
+import socket
+import sys
+import time
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+from prometheus_client import Counter
+from starlette.concurrency import run_in_threadpool
+
+from app.admission import Priority, get_admission_controller
+from app.config import get_settings
+from app.corpus import get_generations, normalize_destination
+from app.db import get_database, get_itineraries_collection
+from app.generate import auto_generate_destination_guide, check_destination_exists, generate_itinerary
+from app.router import estimate_output_tokens
+from app.schemas import Itinerary, PlanRequest
+
+
+# Token estimates reserved before a call (prompt with retrieved context + completion)
+ITINERARY_PROMPT_TOKENS = 1500
+GUIDE_TOKENS = 2500
+
+PRECOMPUTE_TASKS = Counter(
+    "wandergenie_precompute_tasks_total",
+    "Precomputation tasks by kind (guide, itinerary) and result (built, failed, no_budget)",
+    ["kind", "result"]
+)
+
+PRECOMPUTED_LOOKUPS = Counter(
+    "wandergenie_precomputed_lookups_total",
+    "Canonical itinerary lookups by /plan (hit, miss, budget_mismatch, expired)",
+    ["result"]
+)
+
+
+def get_canonical_collection():
+    """Get canonical itineraries collection"""
+    return get_database()["canonical_itineraries"]
+
+
+def get_precompute_state_collection():
+    """Get precomputation state collection (token budget per day, scheduler lease)"""
+    return get_database()["precompute_state"]
+
+
+def canonical_id(destination_key: str, days: int, travel_style) -> str:
+    """Canonical itinerary `_id` for a destination key, trip length and travel style"""
+    return f"{destination_key}:{days}:{getattr(travel_style, 'value', travel_style)}"
+
+
+def in_window(window: str, now: Optional[datetime] = None) -> bool:
+    """
+    Whether a UTC time falls in an "HH:MM-HH:MM" window.
+
+    Windows may wrap midnight ("22:00-04:00"); an empty window is always open.
+    """
+    if not window:
+        return True
+    start, end = (datetime.strptime(part.strip(), "%H:%M").time() for part in window.split("-"))
+    current = (now or datetime.utcnow()).time()
+    if start <= end:
+        return start <= current < end
+    return current >= start or current < end
+
+
+# ============= Demand =============
+
+def top_combinations(limit: int, history_days: int, min_requests: int = 1) -> List[Dict[str, Any]]:
+    """
+    Most requested destination x days x travel style combinations.
+
+    Destinations are merged by normalized key ("tokyo" and "Tokyo, Japan").
+
+    Args:
+        limit: Maximum number of combinations
+        history_days: How far back to count saved itineraries
+        min_requests: Ignore combinations requested fewer times
+
+    Returns:
+        Dicts with "destination" (the most used spelling), "destination_key",
+        "days", "travel_style", "requests" and "budget" (average, rounded
+        to 50), most requested first
+    """
+    since = (datetime.utcnow() - timedelta(days=history_days)).isoformat()
+    combos: Dict[tuple, Dict[str, Any]] = {}
+    for group in get_itineraries_collection().aggregate([
+        {"$match": {"created_at": {"$gte": since}}},
+        {"$group": {
+            "_id": {"destination": "$destination", "days": "$total_days", "travel_style": "$travel_style"},
+            "requests": {"$sum": 1},
+            "budget": {"$avg": "$total_budget"},
+        }},
+    ]):
+        spec = group["_id"]
+        key = normalize_destination(spec["destination"])
+        if not key or not spec.get("days") or not spec.get("travel_style"):
+            continue
+        combo = combos.setdefault((key, spec["days"], spec["travel_style"]), {
+            "destination": spec["destination"],
+            "destination_key": key,
+            "days": spec["days"],
+            "travel_style": spec["travel_style"],
+            "requests": 0,
+            "budget_total": 0.0,
+            "spelling_requests": 0,
+        })
+        combo["requests"] += group["requests"]
+        combo["budget_total"] += (group["budget"] or 0) * group["requests"]
+        if group["requests"] > combo["spelling_requests"]:
+            combo["destination"], combo["spelling_requests"] = spec["destination"], group["requests"]
+
+    ranked = sorted(combos.values(), key=lambda c: c["requests"], reverse=True)
+    result = []
+    for combo in ranked:
+        if combo["requests"] < min_requests or len(result) >= limit:
+            break
+        budget = combo.pop("budget_total") / combo["requests"]
+        combo.pop("spelling_requests")
+        combo["budget"] = max(50.0, round(budget / 50) * 50.0)
+        result.append(combo)
+    return result
+
+
+# ============= Token budget =============
+
+def _budget_day() -> str:
+    return f"tokens:{datetime.utcnow().date().isoformat()}"
+
+
+def reserve_tokens(tokens: int, daily_budget: int) -> bool:
+    """
+    Reserve tokens from today's budget (atomic across processes).
+
+    Returns:
+        False if the reservation would exceed the budget
+    """
+    collection = get_precompute_state_collection()
+    day = _budget_day()
+    collection.update_one({"_id": day}, {"$setOnInsert": {"used": 0}}, upsert=True)
+    result = collection.update_one(
+        {"_id": day, "used": {"$lte": daily_budget - tokens}},
+        {"$inc": {"used": tokens}}
+    )
+    return result.modified_count == 1
+
+
+def settle_tokens(reserved: int, used: int):
+    """Replace a reservation with the tokens actually used"""
+    if used != reserved:
+        get_precompute_state_collection().update_one({"_id": _budget_day()}, {"$inc": {"used": used - reserved}})
+
+
+def tokens_used_today() -> int:
+    doc = get_precompute_state_collection().find_one({"_id": _budget_day()})
+    return doc["used"] if doc else 0
+
+
+# ============= Canonical itineraries =============
+
+def store_canonical_itinerary(combo: Dict[str, Any], itinerary: Itinerary, corpus_generation: int):
+    """Save a canonical itinerary for a combination"""
+    now = datetime.utcnow()
+    get_canonical_collection().replace_one(
+        {"_id": canonical_id(combo["destination_key"], combo["days"], combo["travel_style"])},
+        {
+            "destination_key": combo["destination_key"],
+            "destination": combo["destination"],
+            "days": combo["days"],
+            "travel_style": combo["travel_style"],
+            "budget": combo["budget"],
+            "requests": combo["requests"],
+            "itinerary": itinerary.model_dump(),
+            "generation": itinerary.generation,
+            "corpus_generation": corpus_generation,
+            "built_at": now,
+            "expires_at": now + timedelta(days=get_settings().precompute_ttl_days),
+        },
+        upsert=True
+    )
+
+
+def rescale_budget(itinerary_data: Dict[str, Any], budget: float) -> Dict[str, Any]:
+    """
+    Scale an itinerary's budget and every cost in it to another budget.
+
+    Args:
+        itinerary_data: Itinerary dict (modified in place)
+        budget: New total budget
+
+    Returns:
+        The same dict
+    """
+    factor = budget / itinerary_data["total_budget"] if itinerary_data["total_budget"] else 1.0
+    itinerary_data["total_budget"] = budget
+    if factor == 1.0:
+        return itinerary_data
+    for day in itinerary_data["days"]:
+        day["daily_budget"] = round(day["daily_budget"] * factor, 2)
+        for slot in ("morning", "afternoon", "evening"):
+            for attraction in day[slot]:
+                attraction["estimated_cost"] = round(attraction["estimated_cost"] * factor, 2)
+    for transport in itinerary_data["transport"]:
+        transport["estimated_cost"] = round(transport["estimated_cost"] * factor, 2)
+    return itinerary_data
+
+
+def find_precomputed_itinerary(request: PlanRequest) -> Optional[Itinerary]:
+    """
+    Canonical itinerary for a request's destination, days and travel style.
+
+    Args:
+        request: Travel planning request
+
+    Returns:
+        Itinerary (with `generation.route == "precomputed"`) with its costs
+        scaled to the request's budget, or None if there is none, it
+        expired, it predates the destination's corpus, or it was planned
+        for a budget outside the tolerance
+    """
+    settings = get_settings()
+    destination_key = normalize_destination(request.destination)
+    if not destination_key:
+        return None
+
+    started = time.perf_counter()
+    doc = get_canonical_collection().find_one(
+        {"_id": canonical_id(destination_key, request.days, request.travel_style)},
+        {"itinerary": 1, "budget": 1, "generation": 1, "built_at": 1, "expires_at": 1, "corpus_generation": 1}
+    )
+    if doc is None:
+        PRECOMPUTED_LOOKUPS.labels(result="miss").inc()
+        return None
+    # A plan built from an older corpus of the destination counts as expired
+    if (doc["expires_at"] <= datetime.utcnow()
+            or doc.get("corpus_generation") != get_generations([destination_key])[destination_key]):
+        PRECOMPUTED_LOOKUPS.labels(result="expired").inc()
+        return None
+    if abs(request.budget - doc["budget"]) > settings.precompute_budget_tolerance * doc["budget"]:
+        PRECOMPUTED_LOOKUPS.labels(result="budget_mismatch").inc()
+        return None
+
+    PRECOMPUTED_LOOKUPS.labels(result="hit").inc()
+    itinerary_data = rescale_budget({**doc["itinerary"], "destination": request.destination}, request.budget)
+    itinerary = Itinerary(**itinerary_data)
+    itinerary._generation = {
+        "route": "precomputed",
+        "model": (doc.get("generation") or {}).get("model"),
+        "canonical_id": doc["_id"],
+        "canonical_budget": doc["budget"],
+        "built_at": doc["built_at"].isoformat(),
+        "latency_ms": round((time.perf_counter() - started) * 1000, 1),
+        "outcome": "precomputed",
+    }
+    return itinerary
+
+
+async def lookup_precomputed(request: PlanRequest) -> Optional[Itinerary]:
+    """`find_precomputed_itinerary` off the event loop; None when disabled or on errors"""
+    if not get_settings().precompute_enabled:
+        return None
+    try:
+        return await run_in_threadpool(find_precomputed_itinerary, request)
+    except Exception as e:
+        print(f"⚠️  Canonical itinerary lookup failed: {e}", file=sys.stderr)
+        return None
+
+
+def ensure_precompute_indexes():
+    """
+    Create the indexes used to list and expire canonical itineraries.
+    """
+    collection = get_canonical_collection()
+    collection.create_index("destination_key")
+    collection.create_index("expires_at", expireAfterSeconds=7 * 86400)
+
+
+# ============= Scheduler =============
+
+class PrecomputeScheduler:
+    """Periodically spends the daily token budget on the most requested work"""
+
+    def __init__(self, window: str = "01:00-06:00", interval: float = 900.0, daily_tokens: int = 200_000,
+                 top_combinations: int = 50, min_requests: int = 3, history_days: int = 30):
+        self.window = window
+        self.interval = interval
+        self.daily_tokens = daily_tokens
+        self.top_combinations = top_combinations
+        self.min_requests = min_requests
+        self.history_days = history_days
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}"
+        self.last_cycle: Optional[Dict[str, Any]] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        self._task = asyncio.create_task(self._loop())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        try:
+            await asyncio.to_thread(self._release)
+        except Exception as e:
+            print(f"⚠️  Could not release precompute lease: {e}", file=sys.stderr)
+
+    async def _loop(self):
+        while True:
+            if in_window(self.window):
+                try:
+                    await self.run_cycle()
+                except Exception as e:
+                    print(f"⚠️  Precompute cycle failed: {e}", file=sys.stderr)
+            await asyncio.sleep(self.interval)
+
+    def _claim(self) -> bool:
+        """One scheduler per deployment: lease the cycle for `interval` seconds (renewed as it runs)"""
+        from pymongo.errors import DuplicateKeyError
+
+        now = datetime.utcnow()
+        try:
+            get_precompute_state_collection().update_one(
+                {"_id": "scheduler", "$or": [{"owner": self.worker_id}, {"lease_expires_at": {"$lt": now}}]},
+                {"$set": {"owner": self.worker_id, "lease_expires_at": now + timedelta(seconds=self.interval)}},
+                upsert=True
+            )
+        except DuplicateKeyError:
+            # Leased by another process
+            return False
+        return True
+
+    def _renew(self) -> bool:
+        """Extend the lease while a cycle runs (False if another process took it over)"""
+        result = get_precompute_state_collection().update_one(
+            {"_id": "scheduler", "owner": self.worker_id},
+            {"$set": {"lease_expires_at": datetime.utcnow() + timedelta(seconds=self.interval)}}
+        )
+        return result.matched_count == 1
+
+    def _release(self):
+        get_precompute_state_collection().update_one(
+            {"_id": "scheduler", "owner": self.worker_id},
+            {"$set": {"lease_expires_at": datetime.utcnow()}}
+        )
+
+    def _busy(self) -> bool:
+        """Leave capacity to real traffic that arrives during the window"""
+        controller = get_admission_controller()
+        return controller.queue_depth() > 0 or controller.active >= max(1, controller.max_concurrency // 2)
+
+    async def run_cycle(self) -> Dict[str, Any]:
+        """
+        Build missing guides and stale canonical itineraries, most requested first.
+
+        Returns:
+            Cycle report (also kept as `last_cycle`)
+        """
+        report = {
+            "started_at": datetime.utcnow().isoformat(),
+            "combinations": 0,
+            "guides_built": 0,
+            "itineraries_built": 0,
+            "up_to_date": 0,
+            "failed": 0,
+            "stopped": None,
+        }
+        self.last_cycle = report
+        if not await asyncio.to_thread(self._claim):
+            report["stopped"] = "leased by another worker"
+            return report
+
+        combos = await asyncio.to_thread(top_combinations, self.top_combinations, self.history_days, self.min_requests)
+        report["combinations"] = len(combos)
+        guides_checked = set()
+        for combo in combos:
+            if not in_window(self.window):
+                report["stopped"] = "window closed"
+                break
+            if self._busy():
+                report["stopped"] = "busy"
+                break
+            # A cycle can outlast one lease: renew it before each combination
+            if not await asyncio.to_thread(self._renew):
+                report["stopped"] = "lease lost"
+                break
+
+            if combo["destination_key"] not in guides_checked:
+                guides_checked.add(combo["destination_key"])
+                outcome = await self._ensure_guide(combo)
+                if outcome == "no_budget":
+                    report["stopped"] = "token budget exhausted"
+                    break
+                if outcome == "built":
+                    report["guides_built"] += 1
+
+            outcome = await self._ensure_itinerary(combo)
+            if outcome == "no_budget":
+                report["stopped"] = "token budget exhausted"
+                break
+            report[{"built": "itineraries_built", "fresh": "up_to_date", "failed": "failed"}[outcome]] += 1
+
+        report["tokens_used_today"] = await asyncio.to_thread(tokens_used_today)
+        report["finished_at"] = datetime.utcnow().isoformat()
+        if report["guides_built"] or report["itineraries_built"]:
+            print(
+                f"🗓️  Precomputed {report['guides_built']} guides and {report['itineraries_built']} itineraries "
+                f"({report['tokens_used_today']}/{self.daily_tokens} tokens used today)"
+            )
+        return report
+
+    async def _ensure_guide(self, combo: Dict[str, Any]) -> str:
+        if await asyncio.to_thread(check_destination_exists, combo["destination"]):
+            return "fresh"
+        if not await asyncio.to_thread(reserve_tokens, GUIDE_TOKENS, self.daily_tokens):
+            PRECOMPUTE_TASKS.labels(kind="guide", result="no_budget").inc()
+            return "no_budget"
+        try:
+            async with get_admission_controller().admit(Priority.ADMIN):
+                built = await asyncio.to_thread(auto_generate_destination_guide, combo["destination"])
+        except Exception as e:
+            print(f"⚠️  Could not generate a guide for {combo['destination']}: {e}", file=sys.stderr)
+            built = False
+
+        # The guide generator does not report its usage: a built guide keeps the estimate
+        await asyncio.to_thread(settle_tokens, GUIDE_TOKENS, GUIDE_TOKENS if built else 0)
+        PRECOMPUTE_TASKS.labels(kind="guide", result="built" if built else "failed").inc()
+        return "built" if built else "failed"
+
+    async def _ensure_itinerary(self, combo: Dict[str, Any]) -> str:
+        settings = get_settings()
+        doc = await asyncio.to_thread(
+            get_canonical_collection().find_one,
+            {"_id": canonical_id(combo["destination_key"], combo["days"], combo["travel_style"])},
+            {"budget": 1, "expires_at": 1, "corpus_generation": 1}
+        )
+        corpus_generation = (await asyncio.to_thread(get_generations, [combo["destination_key"]]))[combo["destination_key"]]
+        if (doc is not None and doc["expires_at"] > datetime.utcnow()
+                and doc.get("corpus_generation") == corpus_generation
+                and abs(doc["budget"] - combo["budget"]) <= settings.precompute_budget_tolerance * doc["budget"]):
+            return "fresh"
+
+        estimate = ITINERARY_PROMPT_TOKENS + estimate_output_tokens(combo["days"])
+        if not await asyncio.to_thread(reserve_tokens, estimate, self.daily_tokens):
+            PRECOMPUTE_TASKS.labels(kind="itinerary", result="no_budget").inc()
+            return "no_budget"
+
+        request = PlanRequest(
+            destination=combo["destination"], days=combo["days"],
+            budget=combo["budget"], travel_style=combo["travel_style"]
+        )
+        try:
+            async with get_admission_controller().admit(Priority.ADMIN):
+                itinerary = await asyncio.to_thread(generate_itinerary, request)
+        except Exception as e:
+            print(f"⚠️  Could not precompute {request.destination} ({request.days} days, "
+                  f"{request.travel_style.value}): {e}", file=sys.stderr)
+            await asyncio.to_thread(settle_tokens, estimate, 0)
+            PRECOMPUTE_TASKS.labels(kind="itinerary", result="failed").inc()
+            return "failed"
+
+        generation = itinerary.generation or {}
+        await asyncio.to_thread(settle_tokens, estimate, generation.get("tokens") or estimate)
+        if generation.get("outcome") in ("fallback", "partial_fallback"):
+            # Never pin a fallback plan as the answer for a popular combination
+            PRECOMPUTE_TASKS.labels(kind="itinerary", result="failed").inc()
+            return "failed"
+        await asyncio.to_thread(store_canonical_itinerary, combo, itinerary, corpus_generation)
+        PRECOMPUTE_TASKS.labels(kind="itinerary", result="built").inc()
+        return "built"
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "window": self.window,
+            "in_window": in_window(self.window),
+            "daily_tokens": self.daily_tokens,
+            "last_cycle": self.last_cycle,
+        }
+
+
+_scheduler: Optional[PrecomputeScheduler] = None
+
+
+def get_precompute_scheduler() -> Optional[PrecomputeScheduler]:
+    """Get the running scheduler (None outside the app lifespan or when disabled)"""
+    return _scheduler
+
+
+def start_precompute_scheduler() -> PrecomputeScheduler:
+    """Create and start the process-wide scheduler"""
+    global _scheduler
+    settings = get_settings()
+    _scheduler = PrecomputeScheduler(
+        window=settings.precompute_window,
+        interval=settings.precompute_interval,
+        daily_tokens=settings.precompute_daily_tokens,
+        top_combinations=settings.precompute_top_combinations,
+        min_requests=settings.precompute_min_requests,
+        history_days=settings.precompute_history_days,
+    )
+    _scheduler.start()
+    return _scheduler
+
+
+async def stop_precompute_scheduler():
+    """Stop the process-wide scheduler"""
+    global _scheduler
+    if _scheduler is not None:
+        await _scheduler.stop()
+        _scheduler = None
@@ -0,0 +1,87 @@
+"""
+Lazily created clients for external providers
+
+The provider SDKs are slow to import (google.genai alone takes hundreds of
+milliseconds), so they are imported on first use rather than at startup.
+Clients are created once per process and reused.
+
+LLM completions go through `chat_completion`, which applies deadlines,
+hedging and circuit breakers (see `app.resilience`) and falls back to
+`Settings.generation_fallback_model` when the requested model fails.
+"""
+from functools import lru_cache
+from typing import Dict, List, Optional
+
+from prometheus_client import Counter
+
+from app.config import get_settings
+from app.metrics import track_provider_call
+from app.resilience import BudgetExhausted, call_provider
+
+
+FALLBACK_MODEL_CALLS = Counter(
+    "wandergenie_fallback_model_calls_total",
+    "LLM calls retried on the fallback model",
+    ["operation", "model", "fallback_model"]
+)
+
+
+@lru_cache()
+def get_groq_client():
+    """Get cached Groq client"""
+    from groq import Groq
+
+    settings = get_settings()
+    return Groq(api_key=settings.groq_api_key)
+
+
+@lru_cache()
+def get_genai_client():
+    """Get cached Google Gemini client"""
+    from google import genai
+
+    settings = get_settings()
+    return genai.Client(api_key=settings.gemini_api_key)
+
+
+def chat_completion(operation: str, messages: List[Dict], model: Optional[str] = None,
+                    fallback_models: Optional[List[str]] = None, **kwargs):
+    """
+    Create a Groq chat completion with deadline, breaker and model fallback.
+    
+    Args:
+        operation: Operation name for metrics (e.g., "chat_completion")
+        messages: Chat messages
+        model: Model to use (default `Settings.generation_model`)
+        fallback_models: Models to try in order if it fails
+            (default `Settings.generation_fallback_model`)
+        **kwargs: Extra arguments for `chat.completions.create`
+        
+    Returns:
+        Completion response (`response.model` is the model that answered)
+    """
+    settings = get_settings()
+    client = get_groq_client()
+    if fallback_models is None:
+        fallback_models = [settings.generation_fallback_model] if settings.generation_fallback_model else []
+    models = list(dict.fromkeys([model or settings.generation_model, *fallback_models]))
+    
+    for i, candidate in enumerate(models):
+        try:
+            with track_provider_call("groq", operation, llm=True):
+                return call_provider(
+                    "groq", candidate, operation,
+                    # Bind the model now: a queued call may start after the loop moved on
+                    lambda timeout, candidate=candidate: client.chat.completions.create(
+                        model=candidate, messages=messages, timeout=timeout, **kwargs
+                    ),
+                    timeout=settings.provider_timeout
+                )
+        except BudgetExhausted:
+            # No time left for another model
+            raise
+        except Exception as e:
+            if i + 1 == len(models):
+                raise
+            print(f"⚠️  {candidate} failed ({e}), falling back to {models[i + 1]}")
+            FALLBACK_MODEL_CALLS.labels(operation=operation, model=candidate, fallback_model=models[i + 1]).inc()
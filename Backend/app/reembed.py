@@ -0,0 +1,611 @@
+"""
+Online embedding-model migration
+
+Changing `Settings.embedding_model` on its own leaves every stored chunk
+with vectors from the previous model, which retrieval then never finds. A
+migration re-embeds the corpus with a new model while the old one keeps
+serving:
+
+1. copying: a worker walks `travel_documents` in `_id` order and writes a
+   copy of every chunk of the source model, embedded with the target model
+   (`source_id` points at the original). The position is checkpointed in
+   the migration document after every batch, so a worker that stops or
+   dies resumes where it left off.
+2. verifying: a second walk re-embeds chunks that were added or changed
+   during the copy, and copies whose original was deleted are removed.
+3. switched: the active embedding (`app.corpus.get_active_embedding`) is
+   changed with one document update. Until then every request reads the
+   complete set of old vectors; afterwards, the complete set of new ones.
+   After `Settings.reembed_switch_grace` seconds, chunks that an in-flight
+   ingest still wrote with the old model are copied as well and the context
+   bundles are rebuilt.
+4. completed: the old chunks stay until `cleanup_source_chunks` removes
+   them, so `rollback_migration` can switch back in the meantime.
+
+Migrations run in the API processes (`Settings.reembed_worker_enabled`) or
+in `scripts/reembed_corpus.py run`; a lease on the migration document keeps
+one worker at a time. Embedding calls are paced to `Settings.reembed_rate`
+chunks per second and go through the provider circuit breaker; a failed
+batch is retried after a back-off instead of failing the migration.
+"""
+import os
+import socket
+import sys
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from bson import ObjectId
+
+from app.config import get_settings
+from app.corpus import get_active_embedding, set_active_embedding
+from app.db import get_collection, get_database
+from app.embeddings import get_embedding_backend
+from app.metrics import REEMBEDDED_CHUNKS
+from app.vectors import encode_vector
+
+
+COPYING, VERIFYING, READY, SWITCHED = "copying", "verifying", "ready", "switched"
+COMPLETED, CANCELLED, ROLLED_BACK = "completed", "cancelled", "rolled_back"
+
+# A migration in one of these states blocks starting another
+ACTIVE_STATES = (COPYING, VERIFYING, READY, SWITCHED)
+# States a worker makes progress on (READY waits for a manual switch)
+WORK_STATES = (COPYING, VERIFYING, SWITCHED)
+
+
+def get_migrations_collection():
+    """Get embedding migrations collection"""
+    return get_database()["embedding_migrations"]
+
+
+def find_migration(migration_id: Optional[str] = None) -> Optional[Dict[str, Any]]:
+    """
+    Fetch a migration by id, or the most recent one.
+
+    Args:
+        migration_id: Migration id (default: the most recently started)
+
+    Returns:
+        Migration document or None
+    """
+    collection = get_migrations_collection()
+    if migration_id is not None:
+        if not ObjectId.is_valid(migration_id):
+            return None
+        return collection.find_one({"_id": ObjectId(migration_id)})
+    return next(iter(collection.find().sort("created_at", -1).limit(1)), None)
+
+
+def _pass_fields(now: datetime, source_model: str) -> Dict[str, Any]:
+    """Reset the position and counters of a walk over the source chunks"""
+    return {
+        "last_id": None,
+        "processed": 0,
+        "total": get_collection().count_documents({"embedding_model": source_model}),
+        "pass_started_at": now,
+    }
+
+
+def start_migration(target_model: str, vector_index_name: Optional[str] = None,
+                    auto_switch: bool = True) -> Dict[str, Any]:
+    """
+    Start re-embedding the corpus of the active model with another model.
+
+    Args:
+        target_model: Embedding model to migrate to
+        vector_index_name: Atlas vector index for the target vectors (default:
+            the active index, which only works if the dimensions match)
+        auto_switch: Switch to the target as soon as it is complete;
+            otherwise wait in "ready" for `switch_migration`
+
+    Returns:
+        Migration document
+
+    Raises:
+        ValueError: A migration is already in progress, or the target is
+            already the active model
+    """
+    collection = get_migrations_collection()
+    running = collection.find_one({"status": {"$in": list(ACTIVE_STATES)}})
+    if running is not None:
+        raise ValueError(
+            f"Migration {running['_id']} to {running['target_model']} is {running['status']}; "
+            "finish or cancel it first"
+        )
+    active = get_active_embedding()
+    if target_model == active["model"]:
+        raise ValueError(f"{target_model} is already the active embedding model")
+
+    now = datetime.utcnow()
+    migration = {
+        "_id": ObjectId(),
+        "source_model": active["model"],
+        "source_index": active["vector_index_name"],
+        "target_model": target_model,
+        "target_index": vector_index_name or active["vector_index_name"],
+        "auto_switch": auto_switch,
+        "status": COPYING,
+        "embedded": 0,
+        "removed": 0,
+        "errors": 0,
+        "worker": None,
+        "lease_expires_at": None,
+        "created_at": now,
+        "updated_at": now,
+        **_pass_fields(now, active["model"]),
+    }
+    collection.insert_one(migration)
+    return migration
+
+
+def _update_migration(migration: Dict[str, Any], update: Dict[str, Any],
+                      expected_status: Optional[str] = None) -> Optional[Dict[str, Any]]:
+    """Update a migration still in the expected state (None if it moved on)"""
+    from pymongo import ReturnDocument
+
+    update.setdefault("$set", {})["updated_at"] = datetime.utcnow()
+    return get_migrations_collection().find_one_and_update(
+        {"_id": migration["_id"], "status": expected_status or migration["status"]},
+        update,
+        return_document=ReturnDocument.AFTER,
+    )
+
+
+def vector_index_ready(index_name: str) -> Optional[bool]:
+    """
+    Whether an Atlas vector index exists and can be queried.
+
+    Returns:
+        True / False, or None if search indexes cannot be listed here
+    """
+    try:
+        indexes = list(get_collection().list_search_indexes(index_name))
+    except Exception as e:
+        print(f"⚠️  Could not list search indexes: {e}", file=sys.stderr)
+        return None
+    return any(idx.get("queryable", True) for idx in indexes)
+
+
+def switch_migration(migration: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """
+    Make a verified migration's target the active embedding model.
+
+    Args:
+        migration: Migration in "verifying" (end of the walk) or "ready"
+
+    Returns:
+        Updated migration document, or None if its state changed meanwhile
+    """
+    settings = get_settings()
+    now = datetime.utcnow()
+    set_active_embedding(
+        migration["target_model"], migration["target_index"],
+        previous_model=migration["source_model"],
+        previous_vector_index_name=migration["source_index"],
+        migration_id=migration["_id"],
+    )
+    print(f"🔀 Switched embeddings from {migration['source_model']} to {migration['target_model']}")
+    return _update_migration(migration, {
+        "$set": {
+            "status": SWITCHED,
+            "switched_at": now,
+            "catch_up_after": now + timedelta(seconds=settings.reembed_switch_grace),
+            "note": None,
+            **_pass_fields(now, migration["source_model"]),
+        },
+    })
+
+
+def rollback_migration(migration: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """
+    Switch back to a migration's source model.
+
+    Only possible until `cleanup_source_chunks` removed the old chunks.
+    The target chunks are kept, so migrating to the same model again only
+    re-embeds chunks that changed in the meantime.
+
+    Returns:
+        Updated migration document, or None if its state changed meanwhile
+
+    Raises:
+        ValueError: The migration has not switched, or its source chunks
+            were already removed
+    """
+    if migration["status"] not in (SWITCHED, COMPLETED) or migration.get("cleaned_at"):
+        raise ValueError(f"Migration {migration['_id']} cannot be rolled back ({migration['status']})")
+    set_active_embedding(
+        migration["source_model"], migration["source_index"],
+        previous_model=migration["target_model"],
+        previous_vector_index_name=migration["target_index"],
+        migration_id=migration["_id"],
+    )
+    print(f"↩️  Switched embeddings back to {migration['source_model']}")
+    return _update_migration(migration, {"$set": {"status": ROLLED_BACK, "rolled_back_at": datetime.utcnow()}})
+
+
+def cancel_migration(migration: Dict[str, Any]) -> int:
+    """
+    Stop a migration that has not switched yet and delete its copies.
+
+    Returns:
+        Number of target chunks deleted
+
+    Raises:
+        ValueError: The migration already switched (use `rollback_migration`)
+            or is finished
+    """
+    if migration["status"] not in (COPYING, VERIFYING, READY):
+        raise ValueError(f"Migration {migration['_id']} cannot be cancelled ({migration['status']})")
+    if _update_migration(migration, {"$set": {"status": CANCELLED, "cancelled_at": datetime.utcnow()}}) is None:
+        raise ValueError(f"Migration {migration['_id']} changed state; check its status and retry")
+    result = get_collection().delete_many(
+        {"embedding_model": migration["target_model"], "source_id": {"$exists": True}}
+    )
+    return result.deleted_count
+
+
+def cleanup_source_chunks(migration: Dict[str, Any], batch_size: int = 500) -> int:
+    """
+    Delete the old model's chunks once a migration has completed.
+
+    Args:
+        migration: Completed migration
+        batch_size: Chunks deleted per call
+
+    Returns:
+        Number of chunks deleted
+
+    Raises:
+        ValueError: The migration has not completed, or its source model is
+            active again
+    """
+    if migration["status"] != COMPLETED:
+        raise ValueError(f"Migration {migration['_id']} has not completed ({migration['status']})")
+    if get_active_embedding()["model"] == migration["source_model"]:
+        raise ValueError(f"{migration['source_model']} is the active embedding model")
+
+    collection = get_collection()
+    deleted = 0
+    while True:
+        ids = [doc["_id"] for doc in collection.find(
+            {"embedding_model": migration["source_model"]}, {"_id": 1}
+        ).limit(batch_size)]
+        if not ids:
+            break
+        deleted += collection.delete_many({"_id": {"$in": ids}}).deleted_count
+    get_migrations_collection().update_one(
+        {"_id": migration["_id"]},
+        {"$set": {"cleaned_at": datetime.utcnow(), "source_chunks_deleted": deleted}}
+    )
+    return deleted
+
+
+def migration_progress(migration: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Public view of a migration with the progress of its current walk.
+
+    Args:
+        migration: Migration document
+
+    Returns:
+        Dict with models, status, counters, percent done, chunks per
+        second and estimated seconds until the current walk finishes
+    """
+    def iso(value):
+        return value.isoformat() if isinstance(value, datetime) else value
+
+    now = datetime.utcnow()
+    processed, total = migration.get("processed", 0), migration.get("total", 0)
+    elapsed = (now - migration["pass_started_at"]).total_seconds() if migration.get("pass_started_at") else 0
+    rate = processed / elapsed if processed and elapsed > 0 else None
+
+    eta = None
+    if migration["status"] in WORK_STATES:
+        if migration["status"] == SWITCHED and migration.get("catch_up_after", now) > now:
+            eta = (migration["catch_up_after"] - now).total_seconds()
+        elif rate:
+            eta = max(0, total - processed) / rate
+
+    return {
+        "id": str(migration["_id"]),
+        "status": migration["status"],
+        "source_model": migration["source_model"],
+        "target_model": migration["target_model"],
+        "target_index": migration["target_index"],
+        "processed": processed,
+        "total": total,
+        "percent": round(min(processed, total) / total * 100, 1) if total else 100.0,
+        "chunks_per_second": round(rate, 2) if rate else None,
+        "eta_seconds": round(eta) if eta is not None else None,
+        "embedded": migration.get("embedded", 0),
+        "removed": migration.get("removed", 0),
+        "errors": migration.get("errors", 0),
+        "last_error": migration.get("last_error"),
+        "note": migration.get("note"),
+        "worker": migration.get("worker"),
+        "created_at": iso(migration["created_at"]),
+        "updated_at": iso(migration.get("updated_at")),
+        "switched_at": iso(migration.get("switched_at")),
+        "completed_at": iso(migration.get("completed_at")),
+    }
+
+
+# ============= Worker =============
+
+class ReembedWorker:
+    """Advances embedding migrations one checkpointed batch at a time"""
+
+    def __init__(self, batch_size: int = 100, rate: float = 20.0, lease_seconds: float = 300.0):
+        self.batch_size = batch_size
+        self.rate = rate
+        self.lease_seconds = lease_seconds
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}"
+
+    def claim(self) -> Optional[Dict[str, Any]]:
+        """Take (or renew) the lease on a migration that has work to do"""
+        from pymongo import ReturnDocument
+
+        now = datetime.utcnow()
+        return get_migrations_collection().find_one_and_update(
+            {
+                "status": {"$in": list(WORK_STATES)},
+                "$or": [
+                    {"worker": self.worker_id},
+                    {"lease_expires_at": None},
+                    {"lease_expires_at": {"$lt": now}},
+                ],
+            },
+            {"$set": {"worker": self.worker_id, "lease_expires_at": now + timedelta(seconds=self.lease_seconds)}},
+            sort=[("created_at", 1)],
+            return_document=ReturnDocument.AFTER,
+        )
+
+    def release(self):
+        """Give up this worker's lease, so another worker can continue at once"""
+        get_migrations_collection().update_many(
+            {"worker": self.worker_id},
+            {"$set": {"worker": None, "lease_expires_at": None}}
+        )
+
+    def step(self, migration: Dict[str, Any]) -> Tuple[Optional[Dict[str, Any]], Optional[int]]:
+        """
+        Process the next batch of a claimed migration, or finish its walk.
+
+        Args:
+            migration: Migration leased by this worker
+
+        Returns:
+            (updated migration or None if the lease was lost, number of
+            chunks embedded, or None if the migration is waiting)
+        """
+        from pymongo import ReturnDocument
+
+        if migration["status"] == SWITCHED and datetime.utcnow() < migration["catch_up_after"]:
+            return migration, None
+
+        query = {"embedding_model": migration["source_model"]}
+        if migration.get("last_id") is not None:
+            query["_id"] = {"$gt": migration["last_id"]}
+        batch = list(get_collection().find(query, {"embedding": 0}).sort("_id", 1).limit(self.batch_size))
+        if not batch:
+            return self._finish_walk(migration), 0
+
+        embedded = self._copy_batch(migration, batch)
+        updated = get_migrations_collection().find_one_and_update(
+            {"_id": migration["_id"], "status": migration["status"], "worker": self.worker_id},
+            {
+                "$set": {
+                    "last_id": batch[-1]["_id"],
+                    "updated_at": datetime.utcnow(),
+                    "lease_expires_at": datetime.utcnow() + timedelta(seconds=self.lease_seconds),
+                },
+                "$inc": {"processed": len(batch), "embedded": embedded},
+            },
+            return_document=ReturnDocument.AFTER,
+        )
+        return updated, embedded
+
+    def _copy_batch(self, migration: Dict[str, Any], batch) -> int:
+        """Embed and store target copies of the chunks that have none (or a stale one)"""
+        from pymongo import UpdateOne
+
+        settings = get_settings()
+        collection = get_collection()
+        target = migration["target_model"]
+        copies = {
+            doc["source_id"]: doc["text"]
+            for doc in collection.find(
+                {"embedding_model": target, "source_id": {"$in": [doc["_id"] for doc in batch]}},
+                {"source_id": 1, "text": 1}
+            )
+        }
+        todo = [doc for doc in batch if copies.get(doc["_id"]) != doc["text"]]
+        REEMBEDDED_CHUNKS.labels(result="unchanged").inc(len(batch) - len(todo))
+        if not todo:
+            return 0
+
+        # Straight to the backend: migration vectors would only evict hot entries from the shared cache
+        vectors = get_embedding_backend(target).embed_documents([doc["text"] for doc in todo])
+        ops = []
+        for doc, vector in zip(todo, vectors):
+            copy = {key: value for key, value in doc.items() if key != "_id"}
+            copy.update(
+                embedding=encode_vector(vector, settings.embedding_storage),
+                embedding_model=target,
+                embedding_dim=len(vector),
+                source_id=doc["_id"],
+            )
+            ops.append(UpdateOne({"source_id": doc["_id"], "embedding_model": target}, {"$set": copy}, upsert=True))
+        collection.bulk_write(ops, ordered=False)
+        REEMBEDDED_CHUNKS.labels(result="embedded").inc(len(todo))
+        return len(todo)
+
+    def _remove_orphans(self, migration: Dict[str, Any]) -> int:
+        """Delete copies whose original chunk was deleted during the migration"""
+        collection = get_collection()
+        copies = collection.find(
+            {"embedding_model": migration["target_model"], "source_id": {"$exists": True}},
+            {"source_id": 1}
+        ).batch_size(self.batch_size)
+
+        removed = 0
+        pending = []
+
+        def flush():
+            source_ids = [doc["source_id"] for doc in pending]
+            alive = {doc["_id"] for doc in collection.find({"_id": {"$in": source_ids}}, {"_id": 1})}
+            orphans = [doc["_id"] for doc in pending if doc["source_id"] not in alive]
+            if orphans:
+                collection.delete_many({"_id": {"$in": orphans}})
+            return len(orphans)
+
+        for doc in copies:
+            pending.append(doc)
+            if len(pending) >= self.batch_size:
+                removed += flush()
+                pending = []
+        if pending:
+            removed += flush()
+        REEMBEDDED_CHUNKS.labels(result="removed").inc(removed)
+        return removed
+
+    def _finish_walk(self, migration: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Move a migration to its next state once a walk reached the end"""
+        now = datetime.utcnow()
+        status = migration["status"]
+
+        if status == COPYING:
+            print(f"✓ Copied {migration['embedded']} chunks to {migration['target_model']}; verifying")
+            return _update_migration(migration, {"$set": {"status": VERIFYING, **_pass_fields(now, migration["source_model"])}})
+
+        if status == VERIFYING:
+            removed = self._remove_orphans(migration)
+            migration = _update_migration(migration, {"$inc": {"removed": removed}})
+            if migration is None:
+                return None
+            if not migration.get("auto_switch", True):
+                return _update_migration(migration, {"$set": {"status": READY, "note": "Verified; waiting for a manual switch"}})
+            if vector_index_ready(migration["target_index"]) is False:
+                return _update_migration(migration, {"$set": {
+                    "status": READY,
+                    "note": f"Vector index '{migration['target_index']}' is missing or not queryable; "
+                            "create it, then switch",
+                }})
+            return switch_migration(migration)
+
+        # SWITCHED: chunks written with the old model around the switch are now copied
+        migration = _update_migration(migration, {"$set": {"status": COMPLETED, "completed_at": now}})
+        if migration is not None:
+            print(f"✅ Embedding migration to {migration['target_model']} completed")
+            self._rebuild_bundles(migration)
+        return migration
+
+    def _rebuild_bundles(self, migration: Dict[str, Any]):
+        """Rebuild context bundles, which were built from the old model's vectors"""
+        from app.ingest import rebuild_context_bundles
+
+        if not get_settings().context_bundles_enabled:
+            return
+        destinations = get_collection().distinct("metadata.destination", {"embedding_model": migration["target_model"]})
+        for destination in destinations:
+            if destination:
+                rebuild_context_bundles(destination)
+
+    def _record_error(self, migration: Dict[str, Any], error: Exception):
+        get_migrations_collection().update_one(
+            {"_id": migration["_id"]},
+            {"$set": {"last_error": str(error), "updated_at": datetime.utcnow()}, "$inc": {"errors": 1}}
+        )
+
+    def run(self, stop: threading.Event, poll_interval: float = 30.0, exit_when_idle: bool = False,
+            on_progress: Optional[Callable[[Dict[str, Any]], None]] = None):
+        """
+        Work on migrations until `stop` is set.
+
+        Args:
+            stop: Event that ends the loop (checked between batches)
+            poll_interval: Seconds to wait when there is nothing to do
+            exit_when_idle: Return instead of waiting when there is nothing to do
+            on_progress: Called with the migration after every batch
+        """
+        backoff = 0.0
+        try:
+            while not stop.is_set():
+                try:
+                    migration = self.claim()
+                except Exception as e:
+                    print(f"⚠️  Could not claim embedding migration: {e}", file=sys.stderr)
+                    migration = None
+                if migration is None:
+                    if exit_when_idle:
+                        return
+                    stop.wait(poll_interval)
+                    continue
+
+                started = time.monotonic()
+                try:
+                    updated, embedded = self.step(migration)
+                    backoff = 0.0
+                except Exception as e:
+                    # Provider down or rate limited: retry the same batch later
+                    backoff = min(60.0, max(getattr(e, "retry_after", 1.0), backoff * 2))
+                    print(f"⚠️  Re-embedding batch failed, retrying in {backoff:.0f}s: {e}", file=sys.stderr)
+                    try:
+                        self._record_error(migration, e)
+                    except Exception:
+                        pass
+                    stop.wait(backoff)
+                    continue
+
+                if updated is not None and on_progress is not None:
+                    on_progress(updated)
+                if embedded is None:
+                    # Waiting for the grace period after the switch
+                    wait = (migration["catch_up_after"] - datetime.utcnow()).total_seconds()
+                    stop.wait(min(poll_interval, max(0.1, wait)))
+                elif embedded and self.rate > 0:
+                    stop.wait(max(0.0, embedded / self.rate - (time.monotonic() - started)))
+        finally:
+            try:
+                self.release()
+            except Exception as e:
+                print(f"⚠️  Could not release embedding migration lease: {e}", file=sys.stderr)
+
+
+def get_reembed_worker() -> ReembedWorker:
+    """Create a worker configured from settings"""
+    settings = get_settings()
+    return ReembedWorker(
+        batch_size=settings.reembed_batch_size,
+        rate=settings.reembed_rate,
+        lease_seconds=settings.reembed_lease,
+    )
+
+
+_worker_thread: Optional[threading.Thread] = None
+_worker_stop: Optional[threading.Event] = None
+
+
+def start_reembed_worker():
+    """Run migrations in a background thread of this process"""
+    global _worker_thread, _worker_stop
+    _worker_stop = threading.Event()
+    _worker_thread = threading.Thread(
+        target=get_reembed_worker().run,
+        args=(_worker_stop, get_settings().reembed_poll_interval),
+        name="reembed",
+        daemon=True,
+    )
+    _worker_thread.start()
+
+
+def stop_reembed_worker(timeout: float = 15.0):
+    """Stop the background thread after its current batch (its lease is released)"""
+    global _worker_thread, _worker_stop
+    if _worker_thread is None:
+        return
+    _worker_stop.set()
+    _worker_thread.join(timeout)
+    _worker_thread = _worker_stop = None
@@ -0,0 +1,226 @@
+"""
+Repair of malformed or truncated itinerary JSON
+
+LLM responses are repaired instead of being discarded:
+
+1. `repair_json` strips markdown fences and surrounding prose, removes
+   trailing commas, and closes JSON that was cut off mid-generation
+   (e.g. at `max_tokens`) by dropping the incomplete tail.
+2. `split_valid_days` validates every day on its own, so one broken day
+   does not invalidate the rest of the itinerary.
+
+The generation pipeline then re-requests only the days that are missing.
+Well-formed responses skip all of this: `parse_clean_itinerary` validates
+them straight from the JSON text.
+"""
+import json
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+from pydantic import BaseModel, ValidationError
+
+from app.schemas import DayItinerary, TransportInfo
+
+
+class DaysPatch(BaseModel):
+    """Response schema when re-requesting individual days"""
+    days: List[DayItinerary]
+
+
+class ItineraryBody(BaseModel):
+    """The generated parts of an itinerary response (the request is authoritative for the rest)"""
+    days: List[DayItinerary]
+    transport: List[TransportInfo]
+    tips: List[str]
+
+
+_FENCE = re.compile(r"```(?:json)?\s*(.*?)(?:```|$)", re.DOTALL | re.IGNORECASE)
+
+# Truncation points tried (from the end) before giving up
+MAX_CUT_ATTEMPTS = 50
+
+
+def _strip_trailing_commas(text: str) -> str:
+    """Remove commas before a closing bracket (outside of strings)"""
+    out = []
+    in_string = escaped = False
+    for i, ch in enumerate(text):
+        if in_string:
+            if escaped:
+                escaped = False
+            elif ch == "\\":
+                escaped = True
+            elif ch == '"':
+                in_string = False
+        elif ch == '"':
+            in_string = True
+        elif ch == ",":
+            rest = text[i + 1:i + 64].lstrip()
+            if rest[:1] in ("}", "]"):
+                continue
+        out.append(ch)
+    return "".join(out)
+
+
+def _close_truncated(text: str) -> Optional[str]:
+    """
+    Close JSON that was cut off, dropping the incomplete trailing value.
+
+    Candidate cut points are the ends of complete values inside a container
+    (before a comma or after a closing bracket); the latest one that parses
+    after appending the missing closing brackets wins.
+    """
+    stack: List[str] = []
+    cuts: List[Tuple[int, str]] = []
+    in_string = escaped = False
+    for i, ch in enumerate(text):
+        if in_string:
+            if escaped:
+                escaped = False
+            elif ch == "\\":
+                escaped = True
+            elif ch == '"':
+                in_string = False
+            continue
+        if ch == '"':
+            in_string = True
+        elif ch in "{[":
+            stack.append("}" if ch == "{" else "]")
+        elif ch in "}]":
+            if not stack:
+                break
+            stack.pop()
+            cuts.append((i + 1, "".join(reversed(stack))))
+            if not stack:
+                break
+        elif ch == "," and stack:
+            cuts.append((i, "".join(reversed(stack))))
+
+    for position, closing in reversed(cuts[-MAX_CUT_ATTEMPTS:]):
+        candidate = text[:position] + closing
+        try:
+            json.loads(candidate)
+            return candidate
+        except json.JSONDecodeError:
+            continue
+    return None
+
+
+def parse_clean_itinerary(response_text: str, expected_days: int) -> Optional[ItineraryBody]:
+    """
+    Validate a well-formed itinerary response in one pass.
+
+    The JSON text goes straight into the schema (`model_validate_json`),
+    without an intermediate dict.
+
+    Args:
+        response_text: Raw LLM response
+        expected_days: Number of days requested
+
+    Returns:
+        The validated body, or None unless the response is a bare JSON
+        object with exactly days 1..expected_days in order, transport and
+        non-empty tips (`repair_json` then handles it)
+    """
+    text = response_text.strip()
+    if not text.startswith("{"):
+        return None
+    try:
+        body = ItineraryBody.model_validate_json(text)
+    except ValidationError:
+        return None
+    if [day.day for day in body.days] != list(range(1, expected_days + 1)):
+        return None
+    if not body.transport or not body.tips or not all(tip.strip() for tip in body.tips):
+        return None
+    return body
+
+
+def repair_json(response_text: str) -> Tuple[Optional[Dict[str, Any]], List[str]]:
+    """
+    Parse a JSON object from an LLM response, repairing common defects.
+
+    Args:
+        response_text: Raw LLM response
+
+    Returns:
+        (parsed object or None, list of defects that were repaired:
+        "fence", "trailing_comma", "truncated")
+    """
+    defects = []
+    text = response_text.strip()
+
+    fenced = _FENCE.search(text)
+    if fenced and "{" in fenced.group(1):
+        text = fenced.group(1).strip()
+        defects.append("fence")
+
+    start = text.find("{")
+    if start == -1:
+        return None, defects
+    text = text[start:]
+
+    # Fast path: well-formed JSON (possibly followed by prose)
+    try:
+        data, _ = json.JSONDecoder().raw_decode(text)
+        return (data, defects) if isinstance(data, dict) else (None, defects)
+    except json.JSONDecodeError:
+        pass
+
+    cleaned = _strip_trailing_commas(text)
+    if cleaned != text:
+        defects.append("trailing_comma")
+        try:
+            data, _ = json.JSONDecoder().raw_decode(cleaned)
+            return (data, defects) if isinstance(data, dict) else (None, defects)
+        except json.JSONDecodeError:
+            pass
+
+    closed = _close_truncated(cleaned)
+    if closed is None:
+        return None, defects
+    if len(closed) < len(cleaned.rstrip()):
+        defects.append("truncated")
+    data = json.loads(closed)
+    return (data, defects) if isinstance(data, dict) else (None, defects)
+
+
+def split_valid_days(days: Any, expected_days: int) -> Tuple[Dict[int, Dict], List[int]]:
+    """
+    Validate days individually.
+
+    Args:
+        days: The "days" value from a parsed response
+        expected_days: Number of days requested
+
+    Returns:
+        (validated days keyed by day number, sorted list of missing day numbers)
+    """
+    valid: Dict[int, Dict] = {}
+    for day in days if isinstance(days, list) else []:
+        try:
+            parsed = DayItinerary.model_validate(day)
+        except ValidationError:
+            continue
+        if 1 <= parsed.day <= expected_days and parsed.day not in valid:
+            # The coerced data, so that e.g. "day": "1" merges as day 1
+            valid[parsed.day] = parsed.model_dump()
+
+    missing = [n for n in range(1, expected_days + 1) if n not in valid]
+    return valid, missing
+
+
+def valid_transport(transport: Any) -> List[Dict]:
+    """Transport entries that validate (others are dropped)"""
+    entries = []
+    for item in transport if isinstance(transport, list) else []:
+        try:
+            entries.append(TransportInfo.model_validate(item).model_dump())
+        except ValidationError:
+            continue
+    return entries
+
+
+def valid_tips(tips: Any) -> List[str]:
+    """Tips that are non-empty strings"""
+    return [tip for tip in tips if isinstance(tip, str) and tip.strip()] if isinstance(tips, list) else []
@@ -0,0 +1,375 @@
+"""
+Deadlines, hedged requests and circuit breakers for provider calls
+
+- Deadlines: a request sets a total time budget (`request_deadline`), and
+  each provider call gets the smaller of its own timeout and the time
+  left in the budget, so a slow provider cannot hold a worker for minutes.
+- Hedging (optional): when a call has not returned after the configured
+  latency percentile of recent calls, a second identical call is started
+  and whichever finishes first wins.
+- Circuit breakers: one per provider and model. After
+  `breaker_failure_threshold` consecutive failures the breaker opens and
+  calls fail fast for `breaker_reset_timeout` seconds; then one probe call
+  is let through to decide whether to close it again.
+
+Calls run on a shared thread pool so they can be abandoned at their
+deadline; SDK-level timeouts are passed as well so abandoned threads end.
+"""
+import contextvars
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from contextlib import contextmanager
+from typing import Callable, Dict, Optional, Tuple, TypeVar
+
+from prometheus_client import Counter, Gauge
+
+from app.config import get_settings
+
+
+T = TypeVar("T")
+
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+_STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+# Recent latencies kept per provider/model/operation for the hedge delay
+LATENCY_WINDOW = 200
+
+CIRCUIT_STATE = Gauge(
+    "wandergenie_circuit_state",
+    "Circuit breaker state per provider and model (0 closed, 1 half-open, 2 open)",
+    ["provider", "model"]
+)
+
+PROVIDER_TIMEOUTS = Counter(
+    "wandergenie_provider_timeouts_total",
+    "Provider calls abandoned at their deadline",
+    ["provider", "operation"]
+)
+
+HEDGED_REQUESTS = Counter(
+    "wandergenie_hedged_requests_total",
+    "Hedged provider calls by which call finished first",
+    ["provider", "operation", "winner"]
+)
+
+SHORT_CIRCUITED = Counter(
+    "wandergenie_short_circuited_calls_total",
+    "Provider calls rejected because the circuit breaker was open",
+    ["provider", "model"]
+)
+
+
+class ProviderUnavailable(Exception):
+    """A provider call could not be made or completed in time"""
+    retry_after: int = 1
+
+
+class CircuitOpenError(ProviderUnavailable):
+    """The circuit breaker for a provider/model is open"""
+
+    def __init__(self, name: str, retry_after: float):
+        super().__init__(f"Circuit open for {name}")
+        self.retry_after = max(1, int(retry_after + 0.999))
+
+
+class DeadlineExceeded(ProviderUnavailable):
+    """A call did not finish in time"""
+
+
+class BudgetExhausted(DeadlineExceeded):
+    """The request's time budget is used up"""
+
+
+# ============= Deadlines =============
+
+_deadline: contextvars.ContextVar[Optional[float]] = contextvars.ContextVar("request_deadline", default=None)
+
+
+@contextmanager
+def request_deadline(seconds: float):
+    """
+    Limit the total time of provider calls made inside the block.
+
+    Nested deadlines never extend an outer one.
+
+    Args:
+        seconds: Time budget
+    """
+    deadline = time.monotonic() + seconds
+    outer = _deadline.get()
+    token = _deadline.set(min(deadline, outer) if outer is not None else deadline)
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def call_timeout(timeout: float) -> float:
+    """
+    Timeout for the next call: `timeout`, capped by the remaining budget.
+
+    Raises:
+        BudgetExhausted: If the request budget is used up
+    """
+    deadline = _deadline.get()
+    if deadline is None:
+        return timeout
+    remaining = deadline - time.monotonic()
+    if remaining <= 0:
+        raise BudgetExhausted("Request time budget exhausted")
+    return min(timeout, remaining)
+
+
+# ============= Circuit breakers =============
+
+class CircuitBreaker:
+    """Consecutive-failure circuit breaker"""
+
+    def __init__(self, provider: str, model: str, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.provider = provider
+        self.model = model
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+        self._set_state(CLOSED)
+
+    @property
+    def name(self) -> str:
+        return f"{self.provider}/{self.model}"
+
+    def before_call(self):
+        """
+        Admit a call or fail fast.
+
+        Raises:
+            CircuitOpenError: If the breaker is open (or its probe is running)
+        """
+        with self._lock:
+            if self.state == OPEN:
+                waited = time.monotonic() - self.opened_at
+                if waited < self.reset_timeout:
+                    SHORT_CIRCUITED.labels(provider=self.provider, model=self.model).inc()
+                    raise CircuitOpenError(self.name, self.reset_timeout - waited)
+                self._set_state(HALF_OPEN)
+            if self.state == HALF_OPEN:
+                if self._probe_in_flight:
+                    SHORT_CIRCUITED.labels(provider=self.provider, model=self.model).inc()
+                    raise CircuitOpenError(self.name, 1)
+                self._probe_in_flight = True
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self._probe_in_flight = False
+            if self.state != CLOSED:
+                print(f"✓ Circuit closed for {self.name}")
+                self._set_state(CLOSED)
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._probe_in_flight = False
+            if self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+                if self.state != OPEN:
+                    print(f"⚠️  Circuit opened for {self.name} after {self.failures} failures")
+                self.opened_at = time.monotonic()
+                self._set_state(OPEN)
+
+    def snapshot(self) -> Dict:
+        return {"provider": self.provider, "model": self.model, "state": self.state, "failures": self.failures}
+
+    def _set_state(self, state: str):
+        self.state = state
+        CIRCUIT_STATE.labels(provider=self.provider, model=self.model).set(_STATE_VALUES[state])
+
+
+_breakers: Dict[Tuple[str, str], CircuitBreaker] = {}
+_breakers_lock = threading.Lock()
+
+
+def get_breaker(provider: str, model: str) -> CircuitBreaker:
+    """Get the circuit breaker of a provider/model (created on first use)"""
+    key = (provider, model)
+    with _breakers_lock:
+        breaker = _breakers.get(key)
+        if breaker is None:
+            settings = get_settings()
+            breaker = CircuitBreaker(
+                provider, model,
+                failure_threshold=settings.breaker_failure_threshold,
+                reset_timeout=settings.breaker_reset_timeout
+            )
+            _breakers[key] = breaker
+        return breaker
+
+
+def breaker_states() -> list:
+    """Snapshot of all circuit breakers"""
+    with _breakers_lock:
+        return [b.snapshot() for b in _breakers.values()]
+
+
+def is_provider_failure(error: Exception) -> bool:
+    """
+    Whether an error says something about provider health.
+
+    Client errors (4xx other than 429) are caused by the request and do not
+    count towards opening the breaker.
+    """
+    status = getattr(error, "status_code", None)
+    return status is None or status >= 500 or status == 429
+
+
+# ============= Latency tracking =============
+
+class LatencyTracker:
+    """Recent call latencies and outcomes for one provider/model/operation"""
+
+    def __init__(self, window: int = LATENCY_WINDOW):
+        self.samples = deque(maxlen=window)
+        self.outcomes = deque(maxlen=window)  # True for success
+        self._lock = threading.Lock()
+
+    def add(self, seconds: float):
+        with self._lock:
+            self.samples.append(seconds)
+            self.outcomes.append(True)
+
+    def add_error(self):
+        with self._lock:
+            self.outcomes.append(False)
+
+    def error_rate(self) -> float:
+        """Share of recent calls that failed"""
+        with self._lock:
+            return self.outcomes.count(False) / len(self.outcomes) if self.outcomes else 0.0
+
+    def percentile(self, pct: float, min_samples: int) -> Optional[float]:
+        """Latency percentile, or None with too few samples"""
+        with self._lock:
+            if len(self.samples) < min_samples:
+                return None
+            ordered = sorted(self.samples)
+        index = min(len(ordered) - 1, max(0, int(len(ordered) * pct / 100.0 + 0.999) - 1))
+        return ordered[index]
+
+
+_latencies: Dict[Tuple[str, str, str], LatencyTracker] = {}
+
+
+def _tracker(provider: str, model: str, operation: str) -> LatencyTracker:
+    key = (provider, model, operation)
+    tracker = _latencies.get(key)
+    if tracker is None:
+        tracker = _latencies.setdefault(key, LatencyTracker())
+    return tracker
+
+
+def provider_stats(provider: str, model: str, operation: str) -> Dict:
+    """
+    Live statistics of recent calls.
+
+    Returns:
+        Dict with "calls", "error_rate", "p50_s" and "p95_s" (None without samples)
+    """
+    tracker = _tracker(provider, model, operation)
+    return {
+        "calls": len(tracker.outcomes),
+        "error_rate": round(tracker.error_rate(), 4),
+        "p50_s": tracker.percentile(50, 1),
+        "p95_s": tracker.percentile(95, 1),
+    }
+
+
+# ============= Calls =============
+
+_executor = ThreadPoolExecutor(max_workers=32, thread_name_prefix="provider")
+
+
+def call_provider(provider: str, model: str, operation: str, func: Callable[[float], T],
+                  timeout: float, hedge: Optional[bool] = None) -> T:
+    """
+    Call a provider with a deadline, optional hedging and a circuit breaker.
+
+    Args:
+        provider: Provider name (e.g., "groq")
+        model: Model name (one breaker per provider and model)
+        operation: Operation name (latencies are tracked per operation)
+        func: Makes the call; receives the timeout in seconds to pass to the SDK
+        timeout: Maximum seconds for this call (capped by the request deadline)
+        hedge: Override `Settings.hedge_enabled`
+
+    Returns:
+        The call's result
+
+    Raises:
+        CircuitOpenError: If the breaker is open
+        DeadlineExceeded: If the call did not finish in time
+        Exception: The provider's error
+    """
+    settings = get_settings()
+    timeout = call_timeout(timeout)
+    breaker = get_breaker(provider, model)
+    breaker.before_call()
+
+    tracker = _tracker(provider, model, operation)
+    hedge_after = None
+    if settings.hedge_enabled if hedge is None else hedge:
+        hedge_after = tracker.percentile(settings.hedge_percentile, settings.hedge_min_samples)
+        if hedge_after is not None and hedge_after >= timeout:
+            hedge_after = None
+
+    started = time.monotonic()
+    deadline = started + timeout
+    primary = _executor.submit(func, timeout)
+    pending = {primary}
+    hedged = False
+    error = None
+
+    while pending:
+        wake_at = deadline if hedge_after is None else min(deadline, started + hedge_after)
+        done, pending = wait(pending, timeout=max(0.0, wake_at - time.monotonic()), return_when=FIRST_COMPLETED)
+        for future in done:
+            if future.exception() is None:
+                # A hedge or primary still queued on the executor is no longer needed
+                for other in pending:
+                    other.cancel()
+                breaker.record_success()
+                tracker.add(time.monotonic() - started)
+                if hedged:
+                    HEDGED_REQUESTS.labels(provider=provider, operation=operation,
+                                           winner="primary" if future is primary else "hedge").inc()
+                return future.result()
+            error = future.exception()
+
+        now = time.monotonic()
+        if pending and now >= deadline:
+            break
+        if pending and hedge_after is not None:
+            # Hedge delay reached without an answer: race a second call
+            remaining = deadline - now
+            pending.add(_executor.submit(func, remaining))
+            hedge_after = None
+            hedged = True
+
+    if pending:
+        # Calls still queued would run after the caller gave up (running ones cannot be stopped)
+        for future in pending:
+            future.cancel()
+        breaker.record_failure()
+        tracker.add_error()
+        PROVIDER_TIMEOUTS.labels(provider=provider, operation=operation).inc()
+        raise DeadlineExceeded(f"{provider}/{model} {operation} timed out after {timeout:.1f}s")
+
+    if is_provider_failure(error):
+        breaker.record_failure()
+        tracker.add_error()
+    else:
+        breaker.record_success()
+    raise error
@@ -0,0 +1,97 @@
+"""
+JSON responses built from already serialized itineraries
+
+An itinerary is serialized once (`app.storage.serialize_itinerary`): the
+same bytes are compressed into the stored payload and sent as the `/plan`
+response. Reads decompress the payload and embed the bytes in the response
+without parsing them. Everything else is encoded with orjson
+(`ORJSONResponse` is the app's default response class).
+"""
+from typing import Any, Dict, Iterable
+
+import orjson
+from fastapi.responses import JSONResponse, Response
+
+from app.storage import load_itinerary_raw
+
+
+class ORJSONResponse(JSONResponse):
+    """JSON response encoded with orjson"""
+
+    def render(self, content: Any) -> bytes:
+        return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY)
+
+
+class RawJSONResponse(Response):
+    """Response whose content is already JSON bytes"""
+    media_type = "application/json"
+
+
+def embed_json(obj: Dict[str, Any], **raw_fields: bytes) -> bytes:
+    """
+    Serialize a dict with extra fields whose values are already JSON.
+
+    Args:
+        obj: Fields to serialize (at least one)
+        **raw_fields: Field name -> serialized JSON value, appended after `obj`
+
+    Returns:
+        JSON object bytes
+    """
+    extra = b"".join(b"," + orjson.dumps(name) + b":" + raw for name, raw in raw_fields.items())
+    return orjson.dumps(obj)[:-1] + extra + b"}"
+
+
+def plan_response(raw: bytes, itinerary_id: str) -> RawJSONResponse:
+    """
+    `/plan` response (`PlanResponse`) from a serialized itinerary.
+
+    Args:
+        raw: Output of `serialize_itinerary`
+        itinerary_id: Saved itinerary id
+
+    Returns:
+        Response with the itinerary fields followed by `id`
+    """
+    return RawJSONResponse(raw[:-1] + b',"id":' + orjson.dumps(itinerary_id) + b"}")
+
+
+def itinerary_summary(doc: Dict[str, Any]) -> Dict[str, Any]:
+    """Listing fields of a stored itinerary document"""
+    return {
+        "id": str(doc["_id"]),
+        "destination": doc["destination"],
+        "total_days": doc["total_days"],
+        "total_budget": doc["total_budget"],
+        "travel_style": doc["travel_style"],
+        "created_at": doc["created_at"],
+    }
+
+
+def itinerary_list_response(docs: Iterable[Dict[str, Any]], include_details: bool) -> RawJSONResponse:
+    """
+    `/itineraries` response, embedding each stored body without parsing it.
+
+    Args:
+        docs: Itinerary documents, in response order
+        include_details: Include each full itinerary body
+
+    Returns:
+        Response with `count` and `itineraries`
+    """
+    items = [
+        embed_json(itinerary_summary(doc), itinerary=load_itinerary_raw(doc)) if include_details
+        else orjson.dumps(itinerary_summary(doc))
+        for doc in docs
+    ]
+    return RawJSONResponse(b'{"count":%d,"itineraries":[%b]}' % (len(items), b",".join(items)))
+
+
+def itinerary_detail_response(doc: Dict[str, Any]) -> RawJSONResponse:
+    """`/itineraries/{id}` response, embedding the stored body without parsing it"""
+    fields = {
+        **itinerary_summary(doc),
+        "stored_bytes": doc.get("stored_bytes"),
+        "generation": doc.get("generation"),
+    }
+    return RawJSONResponse(embed_json(fields, itinerary=load_itinerary_raw(doc)))
@@ -1,40 +1,71 @@
 """
 Vector search retrieval using MongoDB Atlas Vector Search
+
+Results of `retrieve_context` are cached in the shared cache, keyed by a
+hash of the query embedding, top_k and filters. Each entry records the
+corpus generations it was computed from (see `app.corpus`) and is reused
+until ingestion bumps one of them.
 """
-from typing import List, Dict
+import hashlib
+import json
+import struct
+from typing import List, Dict, Optional, Tuple
+from app.cache import cache_get, cache_set
+from app.corpus import (
+    ALL_DESTINATIONS, embedding_model_filter, get_active_embedding, get_generations, normalize_destination
+)
 from app.db import get_collection
 from app.embeddings import get_query_embedding
 from app.config import get_settings
+from app.metrics import track_stage, VECTOR_BYTES
+from app.vectors import encode_vector, stored_size
 
 
-def retrieve_context(query: str, top_k: int = None, filter_metadata: Dict = None) -> List[str]:
+def build_query_vector(query: str, model: Optional[str] = None) -> Tuple[object, str]:
     """
-    Retrieve relevant documents using MongoDB Atlas Vector Search.
+    Embed a search query and encode it for `$vectorSearch`.
+    
+    The vector is sent as a packed float32 binary vector unless embeddings
+    are stored in the legacy array format.
     
     Args:
-        query: User query text
-        top_k: Number of results to retrieve (default from settings)
-        filter_metadata: Optional metadata filters (e.g., {"destination": "Tokyo"})
-        
+        query: Search query text
+        model: Embedding model (default: the active model)
+    
     Returns:
-        List of relevant document texts
+        (query vector, hex digest of the embedding)
     """
     settings = get_settings()
+    with track_stage("retrieve", "query_embedding"):
+        query_embedding = get_query_embedding(query, model=model)
+    
+    digest = hashlib.sha256(struct.pack(f"<{len(query_embedding)}f", *query_embedding)).hexdigest()
+    storage = "array" if settings.embedding_storage == "array" else "float32"
+    query_vector = encode_vector(query_embedding, storage)
+    VECTOR_BYTES.labels(direction="query").inc(stored_size(query_vector))
+    return query_vector, digest
+
+
+def _search(query_vector, top_k: int, filter_metadata: Optional[Dict], destination_key: Optional[str],
+            active: Dict) -> List[Dict]:
+    """Run `$vectorSearch` over the chunks of the active model, optionally scoped to one destination"""
     collection = get_collection()
-    top_k = top_k or settings.top_k_results
     
-    # Generate query embedding
-    query_embedding = get_query_embedding(query)
+    # Only search chunks embedded by the model the query was embedded with
+    search_filter = embedding_model_filter(active["model"])
+    if destination_key:
+        search_filter = {"$and": [search_filter, {"metadata.destination_key": destination_key}]}
     
     # Build vector search pipeline
     pipeline = [
         {
             "$vectorSearch": {
-                "index": "vector_index",
+                "index": active["vector_index_name"],
                 "path": "embedding",
-                "queryVector": query_embedding,
+                "queryVector": query_vector,
                 "numCandidates": top_k * 10,  # Oversample for better results
-                "limit": top_k
+                "limit": top_k,
+                "filter": search_filter
             }
         },
         {
@@ -51,49 +82,81 @@ def retrieve_context(query: str, top_k: int = None, filter_metadata: Dict = None
         pipeline.insert(1, {"$match": filter_metadata})
     
     # Execute search
-    results = list(collection.aggregate(pipeline))
+    with track_stage("retrieve", "vector_search"):
+        return list(collection.aggregate(pipeline))
+
+
+def retrieve_context(query: str, top_k: int = None, filter_metadata: Dict = None,
+                     destination: str = None) -> List[str]:
+    """
+    Retrieve relevant documents using MongoDB Atlas Vector Search.
+    
+    Args:
+        query: User query text
+        top_k: Number of results to retrieve (default from settings)
+        filter_metadata: Optional metadata filters (e.g., {"metadata.category": "food"})
+        destination: Optional destination to search within (e.g., "Tokyo, Japan");
+            falls back to the whole corpus when it has no chunks
+        
+    Returns:
+        List of relevant document texts
+    """
+    settings = get_settings()
+    top_k = top_k or settings.top_k_results
+    destination_key = normalize_destination(destination)
+    # Read once, so the query vector and the searched chunks always share a model
+    active = get_active_embedding()
+    
+    # Generate query embedding
+    query_vector, embedding_digest = build_query_vector(query, model=active["model"])
+    
+    # Serve repeated searches from the shared cache while the corpus is unchanged
+    cache_key = hashlib.sha256(json.dumps(
+        [active["model"], embedding_digest, top_k, filter_metadata, destination_key],
+        sort_keys=True, default=str
+    ).encode("utf-8")).hexdigest()
+    cached = cache_get("retrieval", cache_key)
+    if cached is not None:
+        if get_generations(cached["generations"]) == cached["generations"]:
+            return cached["texts"]
+    
+    # Read generations before searching, so a concurrent ingest leaves the entry stale
+    scopes = [destination_key] if destination_key else [ALL_DESTINATIONS]
+    generations = get_generations(scopes)
+    results = _search(query_vector, top_k, filter_metadata, destination_key, active)
+    
+    if destination_key and not results:
+        # Chunks ingested before destination keys were recorded
+        generations.update(get_generations([ALL_DESTINATIONS]))
+        results = _search(query_vector, top_k, filter_metadata, None, active)
     
     # Extract text from results
     context_texts = [doc["text"] for doc in results]
     
+    cache_set(
+        "retrieval", cache_key,
+        {"generations": generations, "texts": context_texts},
+        ttl=settings.cache_retrieval_ttl
+    )
+    
     return context_texts
 
 
-def retrieve_with_scores(query: str, top_k: int = None) -> List[Dict]:
+def retrieve_with_scores(query: str, top_k: int = None, destination: str = None) -> List[Dict]:
     """
     Retrieve documents with similarity scores.
     
     Args:
         query: User query text
         top_k: Number of results to retrieve
+        destination: Optional destination to search within
         
     Returns:
         List of dicts with 'text', 'metadata', and 'score' keys
     """
     settings = get_settings()
-    collection = get_collection()
     top_k = top_k or settings.top_k_results
     
-    query_embedding = get_query_embedding(query)
-    
-    pipeline = [
-        {
-            "$vectorSearch": {
-                "index": "vector_index",
-                "path": "embedding",
-                "queryVector": query_embedding,
-                "numCandidates": top_k * 10,
-                "limit": top_k
-            }
-        },
-        {
-            "$project": {
-                "text": 1,
-                "metadata": 1,
-                "score": {"$meta": "vectorSearchScore"}
-            }
-        }
-    ]
-    
-    results = list(collection.aggregate(pipeline))
-    return results
+    active = get_active_embedding()
+    query_vector, _ = build_query_vector(query, model=active["model"])
+    return _search(query_vector, top_k, None, normalize_destination(destination), active)
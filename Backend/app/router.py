@@ -0,0 +1,164 @@
+"""
+Latency-aware model routing for LLM generation
+
+`Settings.generation_routes` is an ordered list of rules. The first rule
+matching the operation and trip wins:
+
+    {
+      "name": "short",                 # recorded with each itinerary
+      "operation": "itinerary",        # "itinerary" (default) or "guide"
+      "max_days": 3,                   # optional trip length bounds
+      "min_days": 1,
+      "travel_styles": ["budget"],     # optional
+      "max_output_tokens": 2500,       # optional bound on the expected output size
+      "latency_budget_s": 8,           # optional p95 limit for a model to be preferred
+      "models": ["llama-3.1-8b-instant", "llama-3.3-70b-versatile"]
+    }
+
+Within a rule, models are tried in order of preference. A model is skipped
+while its circuit breaker is open, while its recent error rate exceeds
+`Settings.router_max_error_rate`, or while its recent p95 latency exceeds
+the rule's latency budget. If every model is unhealthy, the one with the
+best latency/error score is used. The remaining models are fallbacks.
+"""
+from typing import Any, Dict, List, Optional
+
+from prometheus_client import Counter
+
+from app.config import get_settings
+from app.resilience import OPEN, get_breaker, provider_stats
+
+
+PROVIDER = "groq"
+
+# Provider operation whose live statistics drive each routing operation
+OPERATION_STATS = {
+    "itinerary": "chat_completion",
+    "guide": "guide_completion",
+}
+
+# Expected completion size: fixed JSON overhead plus tokens per planned day
+OUTPUT_TOKENS_BASE = 300
+OUTPUT_TOKENS_PER_DAY = 450
+
+# Recent calls needed before a model's error rate is trusted
+MIN_CALLS_FOR_ERROR_RATE = 5
+
+ROUTED_REQUESTS = Counter(
+    "wandergenie_routed_requests_total",
+    "Model routing decisions",
+    ["operation", "route", "model", "reason"]
+)
+
+
+def estimate_output_tokens(days: int) -> int:
+    """Expected completion tokens for an itinerary of `days` days"""
+    return OUTPUT_TOKENS_BASE + OUTPUT_TOKENS_PER_DAY * days
+
+
+def match_route(operation: str, days: Optional[int] = None, travel_style: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Find the first routing rule matching a request.
+
+    Args:
+        operation: "itinerary" or "guide"
+        days: Trip length
+        travel_style: Travel style value
+
+    Returns:
+        Matching rule (a default rule with the configured model if none match)
+    """
+    settings = get_settings()
+    output_tokens = estimate_output_tokens(days) if days else None
+
+    for rule in settings.generation_routes:
+        if rule.get("operation", "itinerary") != operation:
+            continue
+        if days is not None and not (rule.get("min_days", 1) <= days <= rule.get("max_days", days)):
+            continue
+        if travel_style and rule.get("travel_styles") and travel_style not in rule["travel_styles"]:
+            continue
+        if output_tokens and rule.get("max_output_tokens") and output_tokens > rule["max_output_tokens"]:
+            continue
+        if rule.get("models"):
+            return rule
+
+    return {"name": "default", "models": [settings.generation_model]}
+
+
+def _health(model: str, operation: str, rule: Dict[str, Any]) -> Optional[str]:
+    """Reason a model should not be preferred right now, or None if healthy"""
+    settings = get_settings()
+    if get_breaker(PROVIDER, model).state == OPEN:
+        return "circuit_open"
+    stats = provider_stats(PROVIDER, model, OPERATION_STATS.get(operation, operation))
+    if stats["calls"] >= MIN_CALLS_FOR_ERROR_RATE and stats["error_rate"] > settings.router_max_error_rate:
+        return "error_rate"
+    budget = rule.get("latency_budget_s")
+    if budget and stats["p95_s"] is not None and stats["p95_s"] > budget:
+        return "slow"
+    return None
+
+
+def _score(model: str, operation: str) -> float:
+    """Lower is better: median latency inflated by the error rate"""
+    if get_breaker(PROVIDER, model).state == OPEN:
+        return float("inf")
+    stats = provider_stats(PROVIDER, model, OPERATION_STATS.get(operation, operation))
+    return (stats["p50_s"] or 0.0) * (1 + 4 * stats["error_rate"])
+
+
+def choose_model(operation: str = "itinerary", days: Optional[int] = None,
+                 travel_style: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Pick the model for a generation.
+
+    Args:
+        operation: "itinerary" or "guide"
+        days: Trip length
+        travel_style: Travel style value
+
+    Returns:
+        Decision dict: "route", "model", "fallbacks" (models to try next)
+        and "reason" ("preferred", "demoted" or "least_bad")
+    """
+    settings = get_settings()
+    rule = match_route(operation, days, travel_style)
+    models: List[str] = list(dict.fromkeys(rule["models"]))
+    if settings.generation_fallback_model and settings.generation_fallback_model not in models:
+        models.append(settings.generation_fallback_model)
+
+    chosen, reason = None, "preferred"
+    for i, model in enumerate(rule["models"]):
+        if _health(model, operation, rule) is None:
+            chosen, reason = model, "preferred" if i == 0 else "demoted"
+            break
+    if chosen is None:
+        chosen, reason = min(models, key=lambda m: _score(m, operation)), "least_bad"
+
+    ROUTED_REQUESTS.labels(operation=operation, route=rule["name"], model=chosen, reason=reason).inc()
+    return {
+        "route": rule["name"],
+        "model": chosen,
+        "fallbacks": [m for m in models if m != chosen],
+        "reason": reason,
+    }
+
+
+def routing_stats() -> List[Dict[str, Any]]:
+    """Configured routes with live statistics of their models"""
+    routes = []
+    for rule in get_settings().generation_routes:
+        operation = rule.get("operation", "itinerary")
+        routes.append({
+            **rule,
+            "operation": operation,
+            "live": {
+                model: {
+                    "circuit": get_breaker(PROVIDER, model).state,
+                    **provider_stats(PROVIDER, model, OPERATION_STATS.get(operation, operation))
+                }
+                for model in rule.get("models", [])
+            }
+        })
+    return routes
@@ -1,8 +1,8 @@
 """
 Pydantic schemas for request/response validation
 """
-from pydantic import BaseModel, Field
-from typing import List, Optional
+from pydantic import BaseModel, Field, PrivateAttr
+from typing import Any, Dict, List, Optional
 from enum import Enum
 
 
@@ -34,6 +34,21 @@ class PlanRequest(BaseModel):
         }
 
 
+class BatchPlanRequest(BaseModel):
+    """Request schema for /plan/batch endpoint"""
+    requests: List[PlanRequest] = Field(..., min_length=1, description="Trips to plan")
+    
+    class Config:
+        json_schema_extra = {
+            "example": {
+                "requests": [
+                    {"destination": "Tokyo, Japan", "days": 5, "budget": 3000, "travel_style": "cultural"},
+                    {"destination": "Tokyo, Japan", "days": 3, "budget": 1200, "travel_style": "budget"}
+                ]
+            }
+        }
+
+
 class Attraction(BaseModel):
     """Single attraction/activity"""
     name: str
@@ -70,12 +85,26 @@ class Itinerary(BaseModel):
     transport: List[TransportInfo]
     tips: List[str]
     
+    # How the itinerary was generated (route, model, latency); stored with the
+    # saved itinerary but not part of the API response
+    _generation: Optional[Dict[str, Any]] = PrivateAttr(default=None)
+    
+    @property
+    def generation(self) -> Optional[Dict[str, Any]]:
+        return self._generation
+
+
+class PlanResponse(Itinerary):
+    """Itinerary returned by /plan, with the id it is saved under"""
+    id: str = Field(..., description="Saved itinerary ID")
+    
 
 class HealthResponse(BaseModel):
     """Health check response"""
     status: str
     version: str
     database: str
+    warmup: Optional[Dict[str, Any]] = None
 
 
 class IngestRequest(BaseModel):
@@ -0,0 +1,324 @@
+"""
+Compact storage format for saved itineraries
+
+Each itinerary document keeps only the summary fields needed for listing
+and filtering as plain (indexed) columns. The full itinerary body is stored
+once, as zlib-compressed JSON in a binary ``payload`` field, and is only
+decompressed when a detail read asks for it.
+
+Document layout (schema_version 2):
+
+    {
+      "schema_version": 2,
+      "user_id": "...",
+      "user_email": "...",
+      "destination": "Tokyo, Japan",
+      "total_days": 5,
+      "total_budget": 3000.0,
+      "travel_style": "cultural",
+      "created_at": "2025-12-20T23:00:00",
+      "payload": BinData(zlib(json(itinerary))),
+      "payload_encoding": "zlib+json",
+      "raw_bytes": 10240,
+      "stored_bytes": 2048
+    }
+
+Legacy documents (schema_version 1, no version field) store the body
+uncompressed under ``itinerary_data``; they are still readable and can be
+converted with ``migrate_legacy_itineraries``.
+"""
+import zlib
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+import orjson
+from bson import ObjectId
+from bson.binary import Binary
+
+from app.cache import cache_get, cache_set
+from app.db import get_itineraries_collection
+from app.persistence import get_write_queue
+from app.metrics import track_stage
+
+
+ITINERARY_SCHEMA_VERSION = 2
+PAYLOAD_ENCODING = "zlib+json"
+COMPRESSION_LEVEL = 6
+ITINERARY_CACHE_TTL = 24 * 60 * 60  # seconds
+
+# Fields returned by list queries - the payload is never transferred for them
+SUMMARY_PROJECTION = {
+    "user_id": 1,
+    "destination": 1,
+    "total_days": 1,
+    "total_budget": 1,
+    "travel_style": 1,
+    "created_at": 1,
+    "schema_version": 1,
+    "stored_bytes": 1,
+    "generation": 1,
+}
+
+
+def serialize_itinerary(itinerary_data: Dict[str, Any]) -> bytes:
+    """Serialize an itinerary body to compact UTF-8 JSON (also used as the response body)"""
+    return orjson.dumps(itinerary_data)
+
+
+def encode_payload(raw: bytes) -> Binary:
+    """
+    Compress a serialized itinerary body.
+
+    Args:
+        raw: Output of ``serialize_itinerary``
+
+    Returns:
+        Compressed BSON binary payload
+    """
+    return Binary(zlib.compress(raw, COMPRESSION_LEVEL))
+
+
+def decode_payload(payload: bytes) -> Dict[str, Any]:
+    """
+    Decompress and deserialize an itinerary payload.
+
+    Args:
+        payload: Compressed payload as stored in MongoDB
+
+    Returns:
+        Itinerary dict
+    """
+    return orjson.loads(zlib.decompress(payload))
+
+
+def build_itinerary_document(
+    itinerary_data: Dict[str, Any],
+    user_id: str,
+    user_email: str,
+    created_at: Optional[str] = None,
+    generation: Optional[Dict[str, Any]] = None,
+    raw: Optional[bytes] = None
+) -> Dict[str, Any]:
+    """
+    Build a schema_version 2 itinerary document.
+
+    Args:
+        itinerary_data: Itinerary as a plain dict (dumped exactly once by the caller)
+        user_id: Owner's user id
+        user_email: Owner's email
+        created_at: Optional creation timestamp (defaults to now)
+        generation: Optional generation info (route, model, latency)
+        raw: ``serialize_itinerary(itinerary_data)`` if the caller already has it
+
+    Returns:
+        Document ready for insertion
+    """
+    if raw is None:
+        raw = serialize_itinerary(itinerary_data)
+    payload = encode_payload(raw)
+
+    doc = {
+        "schema_version": ITINERARY_SCHEMA_VERSION,
+        "user_id": user_id,
+        "user_email": user_email,
+        "destination": itinerary_data["destination"],
+        "total_days": itinerary_data["total_days"],
+        "total_budget": itinerary_data["total_budget"],
+        "travel_style": itinerary_data["travel_style"],
+        "created_at": created_at or datetime.utcnow().isoformat(),
+        "payload": payload,
+        "payload_encoding": PAYLOAD_ENCODING,
+        "raw_bytes": len(raw),
+        "stored_bytes": len(payload),
+    }
+    if generation:
+        doc["generation"] = generation
+    return doc
+
+
+def save_itinerary(itinerary_data: Dict[str, Any], user: dict,
+                   generation: Optional[Dict[str, Any]] = None,
+                   itinerary_id: Optional[ObjectId] = None,
+                   raw: Optional[bytes] = None) -> ObjectId:
+    """
+    Store an itinerary for a user in the compact format.
+
+    The document id is allocated up front (or given by the caller, which
+    makes retried saves idempotent). When the app's write-behind queue is
+    running the insert happens in the background; otherwise (scripts,
+    tests) it is written synchronously.
+
+    Args:
+        itinerary_data: Itinerary as a plain dict
+        user: Authenticated user document
+        generation: Optional generation info stored next to the summary
+        itinerary_id: Pre-allocated document id (a new one if omitted)
+        raw: ``serialize_itinerary(itinerary_data)`` if the caller already has it
+
+    Returns:
+        Document id
+    """
+    with track_stage("plan", "encode_itinerary"):
+        doc = build_itinerary_document(
+            itinerary_data,
+            user_id=str(user["_id"]),
+            user_email=user["email"],
+            generation=generation,
+            raw=raw
+        )
+    doc["_id"] = itinerary_id or ObjectId()
+
+    queue = get_write_queue()
+    if queue is not None:
+        queue.enqueue(doc)
+    else:
+        from pymongo.errors import DuplicateKeyError
+
+        try:
+            with track_stage("persist", "insert_one"):
+                get_itineraries_collection().insert_one(doc)
+        except DuplicateKeyError:
+            # Already saved by an earlier attempt with the same id
+            if itinerary_id is None:
+                raise
+
+    # Detail reads from any worker are served from the shared cache, which
+    # also covers documents still waiting in the write-behind queue
+    cached = {k: v for k, v in doc.items() if k not in ("payload", "user_email")}
+    cached["_id"] = str(doc["_id"])
+    cached["itinerary_data"] = itinerary_data
+    cache_set("itineraries", cached["_id"], cached, ttl=ITINERARY_CACHE_TTL)
+
+    print(
+        f"💾 Stored itinerary {doc['_id']}: "
+        f"{doc['stored_bytes']} bytes ({doc['raw_bytes']} uncompressed)"
+    )
+    return doc["_id"]
+
+
+def load_itinerary_body(doc: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Return the full itinerary body of a stored document.
+
+    Handles both the compressed format and legacy documents.
+
+    Args:
+        doc: Itinerary document (must include ``payload`` or ``itinerary_data``)
+
+    Returns:
+        Itinerary dict
+    """
+    if "payload" in doc:
+        return decode_payload(doc["payload"])
+    return doc["itinerary_data"]
+
+
+def load_itinerary_raw(doc: Dict[str, Any]) -> bytes:
+    """
+    Return the full itinerary body of a stored document as JSON bytes.
+
+    The compressed payload is only decompressed, never parsed, so it can be
+    embedded in a response as is.
+
+    Args:
+        doc: Itinerary document (must include ``payload`` or ``itinerary_data``)
+
+    Returns:
+        Serialized itinerary
+    """
+    if "payload" in doc:
+        return zlib.decompress(doc["payload"])
+    return serialize_itinerary(doc["itinerary_data"])
+
+
+def find_user_itineraries(user_id: str, include_body: bool = True) -> list:
+    """
+    List a user's itineraries, newest first.
+
+    Args:
+        user_id: Owner's user id
+        include_body: Also fetch the payload (decompressed lazily by the caller)
+
+    Returns:
+        List of raw itinerary documents
+    """
+    projection = None if include_body else SUMMARY_PROJECTION
+    cursor = get_itineraries_collection().find({"user_id": user_id}, projection)
+    return list(cursor.sort("created_at", -1))
+
+
+def find_user_itinerary(user_id: str, itinerary_id: str) -> Optional[Dict[str, Any]]:
+    """
+    Fetch a single itinerary document owned by a user.
+
+    Args:
+        user_id: Owner's user id
+        itinerary_id: Itinerary document id
+
+    Returns:
+        Raw itinerary document or None
+    """
+    if not ObjectId.is_valid(itinerary_id):
+        return None
+
+    cached = cache_get("itineraries", itinerary_id)
+    if cached is not None:
+        return cached if cached["user_id"] == user_id else None
+
+    return get_itineraries_collection().find_one(
+        {"_id": ObjectId(itinerary_id), "user_id": user_id}
+    )
+
+
+def ensure_itinerary_indexes():
+    """
+    Create the indexes used by itinerary list queries.
+    """
+    collection = get_itineraries_collection()
+    collection.create_index([("user_id", 1), ("created_at", -1)])
+    collection.create_index([("destination", 1), ("travel_style", 1)])
+
+
+def migrate_legacy_itineraries(batch_size: int = 500, dry_run: bool = False) -> Dict[str, int]:
+    """
+    Convert legacy (uncompressed) itinerary documents to the compact format.
+
+    Documents are rewritten in place, keeping their ``_id`` and ``created_at``.
+
+    Args:
+        batch_size: Documents per bulk write
+        dry_run: Only compute the size report, do not write
+
+    Returns:
+        Migration report with document and byte counts
+    """
+    from pymongo import ReplaceOne
+
+    collection = get_itineraries_collection()
+    report = {"migrated": 0, "bytes_before": 0, "bytes_after": 0}
+
+    cursor = collection.find({"schema_version": {"$exists": False}, "itinerary_data": {"$exists": True}})
+    batch = []
+    for doc in cursor:
+        new_doc = build_itinerary_document(
+            doc["itinerary_data"],
+            user_id=doc["user_id"],
+            user_email=doc.get("user_email", ""),
+            created_at=doc.get("created_at")
+        )
+        new_doc["_id"] = doc["_id"]
+
+        report["migrated"] += 1
+        report["bytes_before"] += len(serialize_itinerary(doc["itinerary_data"]))
+        report["bytes_after"] += new_doc["stored_bytes"]
+
+        if not dry_run:
+            batch.append(ReplaceOne({"_id": doc["_id"], "schema_version": {"$exists": False}}, new_doc))
+            if len(batch) >= batch_size:
+                collection.bulk_write(batch, ordered=False)
+                batch = []
+
+    if batch:
+        collection.bulk_write(batch, ordered=False)
+
+    return report
@@ -0,0 +1,96 @@
+"""
+Packed binary vector storage for embeddings
+
+Embeddings are stored as BSON binary vectors (subtype 9), which Atlas Vector
+Search indexes directly:
+
+- "float32": 4 bytes per dimension (~3 KB for 768 dims instead of ~9.9 KB
+  for a BSON array of doubles)
+- "int8": scalar-quantized, 1 byte per dimension. Each vector is scaled by
+  its own max magnitude, which preserves cosine similarity up to rounding.
+- "array": legacy BSON array of doubles
+
+Query vectors are sent as float32 binary vectors as well, and stored
+vectors decode zero-copy into NumPy arrays.
+"""
+from typing import List, Sequence, Union
+
+from bson.binary import Binary, BinaryVectorDtype
+
+
+STORAGE_FORMATS = ("float32", "int8", "array")
+
+# Binary vector header: dtype byte + padding byte
+_HEADER_BYTES = 2
+_DTYPE_FLOAT32 = 0x27
+_DTYPE_INT8 = 0x03
+
+
+def quantize_int8(vector: Sequence[float]) -> List[int]:
+    """
+    Scalar-quantize a vector to int8.
+
+    Args:
+        vector: Float vector
+
+    Returns:
+        Integers in [-127, 127]
+    """
+    max_abs = max((abs(v) for v in vector), default=0.0)
+    if max_abs == 0:
+        return [0] * len(vector)
+    scale = 127.0 / max_abs
+    return [int(round(v * scale)) for v in vector]
+
+
+def encode_vector(vector: Sequence[float], storage: str = "float32") -> Union[Binary, List[float]]:
+    """
+    Encode an embedding for storage.
+
+    Args:
+        vector: Float vector
+        storage: One of "float32", "int8" or "array"
+
+    Returns:
+        BSON binary vector (or a plain list for "array")
+    """
+    if storage == "float32":
+        return Binary.from_vector(list(vector), BinaryVectorDtype.FLOAT32)
+    if storage == "int8":
+        return Binary.from_vector(quantize_int8(vector), BinaryVectorDtype.INT8)
+    if storage == "array":
+        return list(vector)
+    raise ValueError(f"Unknown embedding storage format: {storage}")
+
+
+def decode_vector(value):
+    """
+    Decode a stored embedding into a NumPy array.
+
+    Binary vectors are wrapped without copying; int8 values are returned as
+    an int8 view (cosine similarity does not need the original scale).
+
+    Args:
+        value: Stored embedding (binary vector or list of floats)
+
+    Returns:
+        1-D NumPy array
+    """
+    import numpy as np
+
+    if isinstance(value, Binary):
+        data = memoryview(value)
+        dtype = data[0]
+        if dtype == _DTYPE_FLOAT32:
+            return np.frombuffer(data, dtype="<f4", offset=_HEADER_BYTES)
+        if dtype == _DTYPE_INT8:
+            return np.frombuffer(data, dtype=np.int8, offset=_HEADER_BYTES)
+        raise ValueError(f"Unsupported binary vector dtype: {dtype:#x}")
+    return np.asarray(value, dtype=np.float32)
+
+
+def stored_size(value) -> int:
+    """BSON size in bytes of a stored embedding value"""
+    import bson
+
+    return len(bson.encode({"v": value})) - len(bson.encode({"v": None}))
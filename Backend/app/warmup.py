@@ -0,0 +1,208 @@
+"""
+Cache warmup for hot destinations
+
+After a deploy every worker starts cold, and the first `/plan` for a
+popular city pays for the context lookup, the query embedding and the
+vector search. Right after startup, a background task loads the context of
+the most requested destination x travel style pairs the way `/plan` does:
+the context bundle, or else the query embedding and retrieval result,
+which land in the shared cache. It also opens the MongoDB and provider
+connections the first requests would otherwise set up.
+
+Targets come from recent `itineraries` (most requested first) and are
+topped up from `POPULAR_DESTINATIONS`. Destinations without a guide are
+skipped: warmup never generates guides. It runs at admin priority under
+admission control, so it yields to real traffic, and startup does not wait
+for it. Progress is reported by `/health`.
+"""
+import asyncio
+import sys
+import time
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+from prometheus_client import Counter
+
+from app.admission import AdmissionRejected, Priority, get_admission_controller
+from app.bundles import context_query, get_context_bundle
+from app.config import get_settings
+from app.corpus import normalize_destination
+from app.db import get_itineraries_collection
+from app.destinations import POPULAR_DESTINATIONS
+from app.generate import check_destination_exists
+from app.retrieve import retrieve_context
+from app.schemas import TravelStyle
+
+
+WARMUP_RESULTS = ("bundle", "retrieval", "missing", "failed")
+
+WARMED_DESTINATIONS = Counter(
+    "wandergenie_warmup_destinations_total",
+    "Destination x travel style pairs handled by the startup warmup (bundle, retrieval, missing, failed)",
+    ["result"]
+)
+
+
+def hot_destinations(limit: int, history_days: int) -> List[Tuple[str, str]]:
+    """
+    Pick the destination x travel style pairs to warm.
+
+    Args:
+        limit: Maximum number of pairs
+        history_days: How far back to count requests in `itineraries`
+
+    Returns:
+        (destination, travel style) pairs, most requested first, then
+        popular destinations in every travel style
+    """
+    since = (datetime.utcnow() - timedelta(days=history_days)).isoformat()
+    targets: List[Tuple[str, str]] = []
+    seen = set()
+
+    def add(destination: str, style: str):
+        key = (normalize_destination(destination), style)
+        if key[0] and key not in seen and len(targets) < limit:
+            seen.add(key)
+            targets.append((destination, style))
+
+    try:
+        for group in get_itineraries_collection().aggregate([
+            {"$match": {"created_at": {"$gte": since}}},
+            {"$group": {
+                "_id": {"destination": "$destination", "travel_style": "$travel_style"},
+                "count": {"$sum": 1},
+            }},
+            {"$sort": {"count": -1}},
+            {"$limit": limit * 2},
+        ]):
+            add(group["_id"]["destination"], group["_id"]["travel_style"])
+    except Exception as e:
+        print(f"⚠️  Could not read request history for warmup: {e}", file=sys.stderr)
+
+    for destination in POPULAR_DESTINATIONS:
+        for style in TravelStyle:
+            add(destination, style.value)
+    return targets
+
+
+def warm_destination(destination: str, travel_style: str) -> str:
+    """
+    Load the context `/plan` would use for a destination and travel style.
+
+    Returns:
+        "bundle" (precomputed context found), "retrieval" (query embedding
+        and search results cached) or "missing" (no guide for the destination)
+    """
+    if get_context_bundle(destination, travel_style) is not None:
+        return "bundle"
+    if not check_destination_exists(destination):
+        return "missing"
+    texts = retrieve_context(
+        context_query(destination, travel_style),
+        top_k=get_settings().top_k_results,
+        destination=destination
+    )
+    return "retrieval" if texts else "missing"
+
+
+class CacheWarmup:
+    """Background warmup of the hottest destinations, with progress"""
+
+    def __init__(self, limit: int = 60, history_days: int = 30, concurrency: int = 2):
+        self.limit = limit
+        self.history_days = history_days
+        self.concurrency = concurrency
+        self.status = "pending"
+        self.total = 0
+        self.completed = 0
+        self.results = {result: 0 for result in WARMUP_RESULTS}
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        self._task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+
+    async def run(self):
+        self.status = "running"
+        self.started_at = time.monotonic()
+        try:
+            targets = await asyncio.to_thread(hot_destinations, self.limit, self.history_days)
+            self.total = len(targets)
+            semaphore = asyncio.Semaphore(self.concurrency)
+            await asyncio.gather(*(self._warm(semaphore, *target) for target in targets))
+            self.status = "done"
+        except asyncio.CancelledError:
+            self.status = "cancelled"
+            raise
+        except Exception as e:
+            print(f"⚠️  Cache warmup failed: {e}", file=sys.stderr)
+            self.status = "failed"
+        finally:
+            self.finished_at = time.monotonic()
+        print(
+            f"🔥 Warmed {self.results['bundle'] + self.results['retrieval']}/{self.total} hot destinations in "
+            f"{self.finished_at - self.started_at:.1f}s ({self.results['bundle']} bundles, "
+            f"{self.results['retrieval']} retrievals, {self.results['missing']} without a guide, "
+            f"{self.results['failed']} failed)"
+        )
+
+    async def _warm(self, semaphore: asyncio.Semaphore, destination: str, travel_style: str):
+        async with semaphore:
+            try:
+                async with get_admission_controller().admit(Priority.ADMIN):
+                    result = await asyncio.to_thread(warm_destination, destination, travel_style)
+            except AdmissionRejected:
+                # Busy with real traffic: that traffic is warming the caches anyway
+                result = "failed"
+            except Exception as e:
+                print(f"⚠️  Could not warm {destination} ({travel_style}): {e}", file=sys.stderr)
+                result = "failed"
+        self.results[result] += 1
+        self.completed += 1
+        WARMED_DESTINATIONS.labels(result=result).inc()
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Warmup progress for `/health`"""
+        end = self.finished_at or time.monotonic()
+        return {
+            "status": self.status,
+            "completed": self.completed,
+            "total": self.total,
+            **self.results,
+            "elapsed_s": round(end - self.started_at, 2) if self.started_at else None,
+        }
+
+
+_warmup: Optional[CacheWarmup] = None
+
+
+def start_warmup() -> CacheWarmup:
+    """Start warming caches in the background (returns at once)"""
+    global _warmup
+    settings = get_settings()
+    _warmup = CacheWarmup(
+        limit=settings.warmup_limit,
+        history_days=settings.warmup_history_days,
+        concurrency=settings.warmup_concurrency
+    )
+    _warmup.start()
+    return _warmup
+
+
+async def stop_warmup():
+    """Cancel a warmup that is still running"""
+    if _warmup is not None:
+        await _warmup.stop()
+
+
+def warmup_status() -> Dict[str, Any]:
+    """Progress of this process's warmup"""
+    if _warmup is None:
+        return {"status": "disabled"}
+    return _warmup.snapshot()
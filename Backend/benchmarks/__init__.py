@@ -0,0 +1,3 @@
+"""
+Benchmarks for the WanderGenie backend (run from the Backend directory)
+"""
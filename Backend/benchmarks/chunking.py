@@ -0,0 +1,110 @@
+"""
+Chunking benchmark: chunk counts, token sizes and speed on long guides.
+
+Compares the token-budget chunker (`app.chunking.chunk_document`) with the
+previous character-window chunker, reproduced here as `legacy_chunk_text`,
+on generated guides from a few KB to several MB. For each it reports the
+number of chunks (= embedding inputs), the spread of chunk token counts,
+how many chunks fall below the minimum useful size, and throughput.
+
+Usage (from the Backend directory):
+    python -m benchmarks.chunking
+    python -m benchmarks.chunking --repeats 1 10 100 500 --overlap 0
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+from typing import Callable, Dict, List, Optional
+
+os.environ.setdefault("MONGODB_URI", "mongodb://localhost:27017")
+os.environ.setdefault("GEMINI_API_KEY", "offline-benchmark")
+os.environ.setdefault("GROQ_API_KEY", "offline-benchmark")
+
+from benchmarks.fixtures import make_guide
+
+
+def legacy_chunk_text(text: str, chunk_size: int = 1000, overlap: int = 200) -> List[str]:
+    """The character-window chunker used before `chunk_document`"""
+    if len(text) <= chunk_size:
+        return [text]
+
+    chunks = []
+    start = 0
+    while start < len(text):
+        end = start + chunk_size
+        chunk = text[start:end]
+        if end < len(text):
+            break_point = max(chunk.rfind('.'), chunk.rfind('\n'))
+            if break_point > chunk_size // 2:
+                chunk = text[start:start + break_point + 1]
+                end = start + break_point + 1
+        chunks.append(chunk.strip())
+        start = end - overlap
+    return chunks
+
+
+def measure(name: str, func: Callable[[], List[str]], text: str, min_tokens: int) -> Dict:
+    """Chunk `text` with `func` and summarize chunk sizes and speed"""
+    from app.chunking import count_tokens
+
+    runs = []
+    for _ in range(3):
+        start = time.perf_counter()
+        chunks = func()
+        runs.append(time.perf_counter() - start)
+    elapsed = min(runs)
+
+    tokens = [count_tokens(chunk) for chunk in chunks]
+    return {
+        "chunker": name,
+        "chunks": len(chunks),
+        "tokens_mean": round(statistics.fmean(tokens), 1),
+        "tokens_stdev": round(statistics.pstdev(tokens), 1),
+        "tokens_min": min(tokens),
+        "tokens_max": max(tokens),
+        "small_chunks": sum(1 for t in tokens if t < min_tokens),
+        "ms": round(elapsed * 1000, 2),
+        "mb_per_s": round(len(text.encode("utf-8")) / elapsed / 1e6, 2),
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    from app.chunking import chunk_document
+    from app.config import get_settings
+
+    settings = get_settings()
+    parser = argparse.ArgumentParser(description="Compare chunk counts and speed of the chunkers")
+    parser.add_argument("--repeats", type=int, nargs="+", default=[1, 5, 20, 100],
+                        help="Guide lengths (section body repeats; 20 is about 75 KB)")
+    parser.add_argument("--tokens", type=int, default=settings.chunk_tokens, help="Token budget per chunk")
+    parser.add_argument("--overlap", type=int, default=settings.chunk_overlap_tokens, help="Overlap tokens")
+    parser.add_argument("--min-tokens", type=int, default=settings.chunk_min_tokens, help="Minimum chunk tokens")
+    args = parser.parse_args(argv)
+
+    print(f"✂️  Chunking benchmark: {args.tokens} tokens/chunk, overlap {args.overlap}, min {args.min_tokens}\n")
+    header = f"{'guide':>10}  {'chunker':<8}{'chunks':>8}{'mean':>8}{'stdev':>8}{'min':>6}{'max':>6}{'small':>7}{'ms':>10}{'MB/s':>8}"
+    print(header)
+    print("-" * len(header))
+
+    for repeats in args.repeats:
+        guide = make_guide("Lisbon", repeats=repeats)
+        size = f"{len(guide) / 1024:,.0f} KB"
+        cases = [
+            ("legacy", lambda: legacy_chunk_text(guide)),
+            ("token", lambda: [c["text"] for c in chunk_document(
+                guide, max_tokens=args.tokens, overlap_tokens=args.overlap, min_tokens=args.min_tokens
+            )]),
+        ]
+        for name, func in cases:
+            r = measure(name, func, guide, args.min_tokens)
+            print(
+                f"{size:>10}  {name:<8}{r['chunks']:>8}{r['tokens_mean']:>8}{r['tokens_stdev']:>8}"
+                f"{r['tokens_min']:>6}{r['tokens_max']:>6}{r['small_chunks']:>7}{r['ms']:>10}{r['mb_per_s']:>8}"
+            )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,758 @@
+"""
+Local stand-ins for MongoDB Atlas, Groq and Gemini used by the benchmarks.
+
+- FakeMongoClient: in-memory databases/collections supporting the query,
+  update and aggregation shapes the app uses, including `$vectorSearch`
+  (exact cosine similarity over the stored vectors).
+- FakeGroq: deterministic chat completions that replay recorded itinerary
+  responses (or synthesize realistic ones) with configurable latency.
+- FakeGenaiClient: deterministic hashed bag-of-words embeddings with
+  configurable latency.
+
+`install_fakes()` patches the app modules to use them.
+"""
+import copy
+import json
+import hashlib
+import math
+import random
+import re
+import threading
+import time
+from types import SimpleNamespace
+from typing import Any, Dict, Iterable, List, Optional
+
+from bson import ObjectId
+
+from app.schemas import PlanRequest, TravelStyle
+from benchmarks.fixtures import make_guide, make_itinerary, make_llm_response
+
+
+EMBEDDING_DIM = 768
+_MISSING = object()
+
+
+# ============= MongoDB =============
+
+def _get_path(doc: Dict, path: str, default=_MISSING):
+    value = doc
+    for part in path.split("."):
+        if isinstance(value, dict) and part in value:
+            value = value[part]
+        else:
+            return default
+    return value
+
+
+def _set_path(doc: Dict, path: str, value):
+    parts = path.split(".")
+    for part in parts[:-1]:
+        doc = doc.setdefault(part, {})
+    doc[parts[-1]] = value
+
+
+def _unset_path(doc: Dict, path: str):
+    parts = path.split(".")
+    for part in parts[:-1]:
+        doc = doc.get(part)
+        if not isinstance(doc, dict):
+            return
+    doc.pop(parts[-1], None)
+
+
+def _compare(value, op: str, operand) -> bool:
+    if op == "$eq":
+        return value == operand or (isinstance(value, list) and operand in value)
+    if op == "$ne":
+        return not _compare(value, "$eq", operand)
+    if op == "$in":
+        if isinstance(value, list):
+            return any(v in operand for v in value)
+        return value in operand
+    if op == "$nin":
+        return not _compare(value, "$in", operand)
+    if op == "$exists":
+        return (value is not _MISSING) == bool(operand)
+    if op == "$size":
+        return isinstance(value, list) and len(value) == operand
+    if op == "$type" and operand == "array":
+        return isinstance(value, list)
+    if value is _MISSING or value is None:
+        return False
+    if op == "$gt":
+        return value > operand
+    if op == "$gte":
+        return value >= operand
+    if op == "$lt":
+        return value < operand
+    if op == "$lte":
+        return value <= operand
+    raise NotImplementedError(f"Unsupported query operator: {op}")
+
+
+def matches(doc: Dict, query: Optional[Dict]) -> bool:
+    """Evaluate a (subset of) MongoDB query against a document"""
+    if not query:
+        return True
+    for key, condition in query.items():
+        if key == "$and":
+            if not all(matches(doc, q) for q in condition):
+                return False
+            continue
+        if key == "$or":
+            if not any(matches(doc, q) for q in condition):
+                return False
+            continue
+
+        value = _get_path(doc, key)
+        if isinstance(condition, dict) and any(k.startswith("$") for k in condition):
+            if "$regex" in condition:
+                flags = re.IGNORECASE if "i" in condition.get("$options", "") else 0
+                if not isinstance(value, str) or not re.search(condition["$regex"], value, flags):
+                    return False
+            for op, operand in condition.items():
+                if op in ("$regex", "$options"):
+                    continue
+                if not _compare(value, op, operand):
+                    return False
+        else:
+            if value is _MISSING:
+                if condition is not None:
+                    return False
+            elif not _compare(value, "$eq", condition):
+                return False
+    return True
+
+
+def _project(doc: Dict, projection: Optional[Dict], score: Optional[float] = None) -> Dict:
+    if not projection:
+        return copy.deepcopy(doc)
+
+    fields = {k: v for k, v in projection.items() if k != "_id"}
+    if all(v in (0, False) for v in fields.values()):
+        # Exclusion projection (or only `_id` specified)
+        result = copy.deepcopy(doc)
+        for key in fields:
+            _unset_path(result, key)
+        if projection.get("_id", 1) in (0, False):
+            result.pop("_id", None)
+        return result
+
+    result = {}
+    if projection.get("_id", 1) and "_id" in doc:
+        result["_id"] = doc["_id"]
+    for key, spec in fields.items():
+        if isinstance(spec, dict) and spec.get("$meta") == "vectorSearchScore":
+            result[key] = score
+        elif spec:
+            value = _get_path(doc, key)
+            if value is not _MISSING:
+                _set_path(result, key, copy.deepcopy(value))
+    return result
+
+
+def _apply_update(doc: Dict, update: Dict, inserting: bool = False):
+    if not any(k.startswith("$") for k in update):
+        keep_id = doc.get("_id")
+        doc.clear()
+        doc.update(copy.deepcopy(update))
+        if keep_id is not None:
+            doc["_id"] = keep_id
+        return
+    for op, fields in update.items():
+        for path, value in fields.items():
+            if op == "$set":
+                _set_path(doc, path, copy.deepcopy(value))
+            elif op == "$setOnInsert":
+                if inserting:
+                    _set_path(doc, path, copy.deepcopy(value))
+            elif op == "$inc":
+                current = _get_path(doc, path, 0)
+                _set_path(doc, path, current + value)
+            elif op == "$unset":
+                _unset_path(doc, path)
+            elif op == "$push":
+                current = _get_path(doc, path, None)
+                if current is None:
+                    current = []
+                    _set_path(doc, path, current)
+                current.append(copy.deepcopy(value))
+            elif op == "$max":
+                current = _get_path(doc, path, None)
+                if current is None or value > current:
+                    _set_path(doc, path, value)
+            elif op == "$min":
+                current = _get_path(doc, path, None)
+                if current is None or value < current:
+                    _set_path(doc, path, value)
+            else:
+                raise NotImplementedError(f"Unsupported update operator: {op}")
+
+
+def _cosine(a: List[float], b: List[float]) -> float:
+    dot = sum(x * y for x, y in zip(a, b))
+    norm = math.sqrt(sum(x * x for x in a)) * math.sqrt(sum(y * y for y in b))
+    return dot / norm if norm else 0.0
+
+
+def _as_floats(vector) -> Optional[List[float]]:
+    """Decode list or BSON binary vectors into a list of floats"""
+    if vector is None or vector is _MISSING:
+        return None
+    if isinstance(vector, (list, tuple)):
+        return list(vector)
+    as_vector = getattr(vector, "as_vector", None)
+    if as_vector is not None:
+        return list(as_vector().data)
+    return None
+
+
+def _sort_key(value):
+    # Missing/None values sort first, like MongoDB
+    return (0, 0) if value is None else (1, value)
+
+
+class FakeCursor:
+    """Minimal pymongo cursor"""
+
+    def __init__(self, docs: List[Dict]):
+        self._docs = docs
+
+    def sort(self, key, direction=1):
+        keys = key if isinstance(key, list) else [(key, direction)]
+        for field, order in reversed(keys):
+            self._docs.sort(key=lambda d: _sort_key(_get_path(d, field, None)), reverse=order == -1)
+        return self
+
+    def limit(self, n: int):
+        if n:
+            self._docs = self._docs[:n]
+        return self
+
+    def skip(self, n: int):
+        self._docs = self._docs[n:]
+        return self
+
+    def batch_size(self, n: int):
+        return self
+
+    def __iter__(self):
+        return iter(self._docs)
+
+    def __next__(self):
+        if not self._docs:
+            raise StopIteration
+        return self._docs.pop(0)
+
+
+class FakeCollection:
+    """In-memory collection"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self._docs: Dict[Any, Dict] = {}
+        self._indexes = [{"name": "_id_", "key": {"_id": 1}}]
+        self._search_indexes: List[Dict] = []
+        self._lock = threading.RLock()
+
+    # ----- writes -----
+
+    def insert_one(self, doc: Dict, **kwargs):
+        with self._lock:
+            if "_id" not in doc:
+                doc["_id"] = ObjectId()
+            if doc["_id"] in self._docs:
+                from pymongo.errors import DuplicateKeyError
+                raise DuplicateKeyError("duplicate key", 11000)
+            self._docs[doc["_id"]] = copy.deepcopy(doc)
+            return SimpleNamespace(inserted_id=doc["_id"], acknowledged=True)
+
+    def insert_many(self, docs: Iterable[Dict], ordered: bool = True, **kwargs):
+        ids = []
+        errors = []
+        with self._lock:
+            for i, doc in enumerate(docs):
+                if "_id" not in doc:
+                    doc["_id"] = ObjectId()
+                if doc["_id"] in self._docs:
+                    errors.append({"index": i, "code": 11000, "errmsg": "duplicate key"})
+                    if ordered:
+                        break
+                    continue
+                self._docs[doc["_id"]] = copy.deepcopy(doc)
+                ids.append(doc["_id"])
+        if errors:
+            from pymongo.errors import BulkWriteError
+            raise BulkWriteError({"writeErrors": errors, "nInserted": len(ids)})
+        return SimpleNamespace(inserted_ids=ids, acknowledged=True)
+
+    def _upsert_doc(self, filter: Dict, update: Dict) -> Dict:
+        doc = {k: copy.deepcopy(v) for k, v in filter.items() if not k.startswith("$") and not isinstance(v, dict)}
+        doc.setdefault("_id", ObjectId())
+        if doc["_id"] in self._docs:
+            # The filter did not match the document with this _id
+            from pymongo.errors import DuplicateKeyError
+            raise DuplicateKeyError("duplicate key", 11000)
+        _apply_update(doc, update, inserting=True)
+        self._docs[doc["_id"]] = doc
+        return doc
+
+    def update_one(self, filter: Dict, update: Dict, upsert: bool = False, **kwargs):
+        with self._lock:
+            for doc in self._docs.values():
+                if matches(doc, filter):
+                    _apply_update(doc, update)
+                    return SimpleNamespace(matched_count=1, modified_count=1, upserted_id=None)
+            if upsert:
+                doc = self._upsert_doc(filter, update)
+                return SimpleNamespace(matched_count=0, modified_count=0, upserted_id=doc["_id"])
+            return SimpleNamespace(matched_count=0, modified_count=0, upserted_id=None)
+
+    def update_many(self, filter: Dict, update: Dict, upsert: bool = False, **kwargs):
+        with self._lock:
+            count = 0
+            for doc in self._docs.values():
+                if matches(doc, filter):
+                    _apply_update(doc, update)
+                    count += 1
+            if not count and upsert:
+                doc = self._upsert_doc(filter, update)
+                return SimpleNamespace(matched_count=0, modified_count=0, upserted_id=doc["_id"])
+            return SimpleNamespace(matched_count=count, modified_count=count, upserted_id=None)
+
+    def replace_one(self, filter: Dict, replacement: Dict, upsert: bool = False, **kwargs):
+        return self.update_one(filter, replacement, upsert=upsert)
+
+    def find_one_and_update(self, filter: Dict, update: Dict, upsert: bool = False,
+                            return_document: bool = False, projection: Optional[Dict] = None,
+                            sort=None, **kwargs):
+        with self._lock:
+            candidates = [d for d in self._docs.values() if matches(d, filter)]
+            if sort:
+                candidates = list(FakeCursor(candidates).sort(sort))
+            if candidates:
+                doc = candidates[0]
+                before = _project(doc, projection)
+                _apply_update(doc, update)
+                return _project(doc, projection) if return_document else before
+            if upsert:
+                doc = self._upsert_doc(filter, update)
+                return _project(doc, projection) if return_document else None
+            return None
+
+    def delete_one(self, filter: Dict, **kwargs):
+        with self._lock:
+            for key, doc in list(self._docs.items()):
+                if matches(doc, filter):
+                    del self._docs[key]
+                    return SimpleNamespace(deleted_count=1)
+            return SimpleNamespace(deleted_count=0)
+
+    def delete_many(self, filter: Dict, **kwargs):
+        with self._lock:
+            keys = [k for k, d in self._docs.items() if matches(d, filter)]
+            for key in keys:
+                del self._docs[key]
+            return SimpleNamespace(deleted_count=len(keys))
+
+    def bulk_write(self, requests: List, ordered: bool = True, **kwargs):
+        for request in requests:
+            name = type(request).__name__
+            doc = request._doc
+            if name == "ReplaceOne":
+                self.replace_one(request._filter, doc, upsert=bool(request._upsert))
+            elif name == "UpdateOne":
+                self.update_one(request._filter, doc, upsert=bool(request._upsert))
+            elif name == "UpdateMany":
+                self.update_many(request._filter, doc, upsert=bool(request._upsert))
+            elif name == "InsertOne":
+                self.insert_one(doc)
+            elif name == "DeleteOne":
+                self.delete_one(request._filter)
+            elif name == "DeleteMany":
+                self.delete_many(request._filter)
+            else:
+                raise NotImplementedError(f"Unsupported bulk operation: {name}")
+        return SimpleNamespace(acknowledged=True)
+
+    # ----- reads -----
+
+    def find(self, filter: Optional[Dict] = None, projection: Optional[Dict] = None, **kwargs):
+        with self._lock:
+            docs = [_project(d, projection) for d in self._docs.values() if matches(d, filter)]
+        return FakeCursor(docs)
+
+    def find_one(self, filter: Optional[Dict] = None, projection: Optional[Dict] = None, **kwargs):
+        with self._lock:
+            for doc in self._docs.values():
+                if matches(doc, filter):
+                    return _project(doc, projection)
+        return None
+
+    def count_documents(self, filter: Dict, limit: int = 0, **kwargs) -> int:
+        with self._lock:
+            count = sum(1 for d in self._docs.values() if matches(d, filter))
+        return min(count, limit) if limit else count
+
+    def estimated_document_count(self, **kwargs) -> int:
+        return len(self._docs)
+
+    def distinct(self, key: str, filter: Optional[Dict] = None, **kwargs) -> List:
+        values = []
+        with self._lock:
+            for doc in self._docs.values():
+                if matches(doc, filter):
+                    value = _get_path(doc, key)
+                    if value is not _MISSING and value not in values:
+                        values.append(value)
+        return values
+
+    def aggregate(self, pipeline: List[Dict], **kwargs):
+        with self._lock:
+            docs = list(self._docs.values())
+            scores: Dict[Any, float] = {}
+            projected = False
+
+            for stage in pipeline:
+                (op, spec), = stage.items()
+                if op == "$vectorSearch":
+                    query = _as_floats(spec["queryVector"])
+                    scored = []
+                    for doc in docs:
+                        if spec.get("filter") and not matches(doc, spec["filter"]):
+                            continue
+                        vector = _as_floats(_get_path(doc, spec["path"], None))
+                        if vector is None or len(vector) != len(query):
+                            continue
+                        # Atlas cosine score is normalized to [0, 1]
+                        scored.append(((1 + _cosine(query, vector)) / 2, doc))
+                    scored.sort(key=lambda pair: pair[0], reverse=True)
+                    scored = scored[:spec.get("numCandidates", len(scored))][:spec["limit"]]
+                    docs = [doc for _, doc in scored]
+                    scores = {id(doc): score for score, doc in scored}
+                elif op == "$match":
+                    docs = [d for d in docs if matches(d, spec)]
+                elif op == "$project":
+                    docs = [_project(d, spec, scores.get(id(d))) for d in docs]
+                    projected = True
+                elif op == "$limit":
+                    docs = docs[:spec]
+                elif op == "$skip":
+                    docs = docs[spec:]
+                elif op == "$sort":
+                    docs = list(FakeCursor(list(docs)).sort(list(spec.items())))
+                elif op == "$group":
+                    docs = self._group(docs, spec)
+                    projected = True
+                else:
+                    raise NotImplementedError(f"Unsupported aggregation stage: {op}")
+
+            if not projected:
+                docs = [copy.deepcopy(d) for d in docs]
+        return iter(docs)
+
+    @staticmethod
+    def _group(docs: List[Dict], spec: Dict) -> List[Dict]:
+        def resolve(doc, expr):
+            if isinstance(expr, str) and expr.startswith("$"):
+                return _get_path(doc, expr[1:], None)
+            if isinstance(expr, dict) and set(expr) == {"$size"}:
+                return len(resolve(doc, expr["$size"]) or [])
+            if isinstance(expr, dict):
+                return {k: resolve(doc, v) for k, v in expr.items()}
+            return expr
+
+        groups: Dict[str, Dict] = {}
+        for doc in docs:
+            key = resolve(doc, spec["_id"])
+            group_key = repr(key)
+            group = groups.setdefault(group_key, {"_id": key})
+            for field, accumulator in spec.items():
+                if field == "_id":
+                    continue
+                (acc, expr), = accumulator.items()
+                value = resolve(doc, expr)
+                if acc == "$sum":
+                    group[field] = group.get(field, 0) + (value or 0)
+                elif acc == "$max":
+                    group[field] = value if field not in group else max(group[field], value)
+                elif acc == "$min":
+                    group[field] = value if field not in group else min(group[field], value)
+                elif acc == "$first":
+                    group.setdefault(field, value)
+                elif acc == "$last":
+                    group[field] = value
+                elif acc == "$avg":
+                    total, count = group.get(f"__{field}", (0, 0))
+                    group[f"__{field}"] = (total + value, count + 1)
+                    group[field] = (total + value) / (count + 1)
+                else:
+                    raise NotImplementedError(f"Unsupported accumulator: {acc}")
+        return [{k: v for k, v in g.items() if not k.startswith("__")} for g in groups.values()]
+
+    # ----- indexes -----
+
+    def create_index(self, keys, name: Optional[str] = None, **kwargs) -> str:
+        if isinstance(keys, str):
+            keys = [(keys, 1)]
+        name = name or "_".join(f"{k}_{v}" for k, v in keys)
+        if not any(idx["name"] == name for idx in self._indexes):
+            self._indexes.append({"name": name, "key": dict(keys), **kwargs})
+        return name
+
+    def list_indexes(self):
+        # Atlas lists search indexes separately; the app's startup check looks
+        # for the vector index here, so report it as present.
+        return iter(self._indexes + [{"name": "vector_index"}])
+
+    def list_search_indexes(self, name: Optional[str] = None, **kwargs):
+        indexes = self._search_indexes or [{"name": "vector_index", "status": "READY", "queryable": True}]
+        return iter([idx for idx in indexes if name is None or idx["name"] == name])
+
+    def drop(self):
+        with self._lock:
+            self._docs.clear()
+
+
+class FakeDatabase:
+    """In-memory database"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self._collections: Dict[str, FakeCollection] = {}
+        self._lock = threading.Lock()
+
+    def __getitem__(self, name: str) -> FakeCollection:
+        with self._lock:
+            if name not in self._collections:
+                self._collections[name] = FakeCollection(name)
+            return self._collections[name]
+
+    __getattr__ = __getitem__
+
+    def command(self, command, *args, **kwargs):
+        if command == "ping" or command == {"ping": 1}:
+            return {"ok": 1.0}
+        raise NotImplementedError(f"Unsupported command: {command}")
+
+    def list_collection_names(self) -> List[str]:
+        return list(self._collections)
+
+
+class FakeMongoClient:
+    """In-memory MongoClient"""
+
+    def __init__(self, *args, **kwargs):
+        self._databases: Dict[str, FakeDatabase] = {}
+        self.admin = self["admin"]
+
+    def __getitem__(self, name: str) -> FakeDatabase:
+        if name not in self._databases:
+            self._databases[name] = FakeDatabase(name)
+        return self._databases[name]
+
+    def close(self):
+        pass
+
+
+# ============= Gemini =============
+
+def fake_embedding(text: str, dim: int = EMBEDDING_DIM) -> List[float]:
+    """
+    Deterministic hashed bag-of-words embedding.
+
+    Texts sharing words get similar vectors, so vector search over fake
+    embeddings still ranks same-destination chunks first.
+    """
+    vector = [0.0] * dim
+    for word in re.findall(r"\w+", text.lower()):
+        digest = hashlib.blake2b(word.encode("utf-8"), digest_size=8).digest()
+        bucket = int.from_bytes(digest[:4], "little") % dim
+        sign = 1.0 if digest[4] & 1 else -1.0
+        vector[bucket] += sign
+    norm = math.sqrt(sum(v * v for v in vector)) or 1.0
+    return [v / norm for v in vector]
+
+
+class _FakeEmbedModels:
+    def __init__(self, latency: float):
+        self.latency = latency
+        self.calls = 0
+
+    def embed_content(self, model: str, contents, config=None, **kwargs):
+        self.calls += 1
+        if self.latency:
+            time.sleep(self.latency)
+        texts = contents if isinstance(contents, list) else [contents]
+        return SimpleNamespace(embeddings=[SimpleNamespace(values=fake_embedding(t)) for t in texts])
+
+    def get(self, model: str, config=None, **kwargs):
+        return SimpleNamespace(name=model)
+
+
+class FakeGenaiClient:
+    """Stand-in for google.genai.Client"""
+    latency = 0.0
+    models_instance: Optional[_FakeEmbedModels] = None
+
+    def __init__(self, api_key: str = None, http_options=None, **kwargs):
+        if FakeGenaiClient.models_instance is None:
+            FakeGenaiClient.models_instance = _FakeEmbedModels(FakeGenaiClient.latency)
+        self.models = FakeGenaiClient.models_instance
+
+
+# ============= Groq =============
+
+class _FakeCompletions:
+    def __init__(self, owner: "FakeGroq"):
+        self.owner = owner
+
+    def create(self, model: str, messages: List[Dict], max_tokens: int = 1024, **kwargs):
+        return self.owner._complete(model, messages, max_tokens, kwargs)
+
+
+class FakeGroq:
+    """
+    Stand-in for groq.Groq.
+
+    Replays recorded itinerary responses (chosen deterministically from the
+    prompt) or synthesizes a realistic one, after a configurable latency.
+    A share of itinerary responses can be cut off mid-JSON, as when a
+    completion hits `max_tokens`.
+    """
+    latency = 0.0
+    jitter = 0.0
+    truncate_rate = 0.0
+    recordings: List[str] = []
+    calls = 0
+    _lock = threading.Lock()
+
+    def __init__(self, api_key: str = None, timeout=None, max_retries=None, **kwargs):
+        self.chat = SimpleNamespace(completions=_FakeCompletions(self))
+        self.models = SimpleNamespace(list=lambda **kw: SimpleNamespace(data=[]))
+
+    def with_options(self, **kwargs):
+        return self
+
+    def _complete(self, model: str, messages: List[Dict], max_tokens: int, kwargs: Dict):
+        prompt = "\n".join(m["content"] for m in messages)
+        seed = int.from_bytes(hashlib.blake2b(prompt.encode("utf-8"), digest_size=4).digest(), "little")
+
+        with FakeGroq._lock:
+            FakeGroq.calls += 1
+
+        delay = FakeGroq.latency
+        if FakeGroq.jitter:
+            delay += random.Random(seed).uniform(0, FakeGroq.jitter)
+        if delay:
+            time.sleep(delay)
+
+        if any(m["role"] == "system" and "guide writer" in m["content"] for m in messages):
+            city = re.search(r"travel guide for ([^,\n]+)", prompt)
+            content = make_guide(city.group(1) if city else "the city", repeats=2, seed=seed)
+        elif "Plan ONLY days" in prompt:
+            content = _missing_days_response(prompt, seed)
+        elif FakeGroq.recordings:
+            content = FakeGroq.recordings[seed % len(FakeGroq.recordings)]
+        else:
+            content = make_llm_response(_request_from_prompt(prompt), seed=seed)
+
+        finish_reason = "stop"
+        rng = random.Random(seed + 1)
+        if "Plan ONLY days" not in prompt and rng.random() < FakeGroq.truncate_rate:
+            content = content[:int(len(content) * rng.uniform(0.3, 0.9))]
+            finish_reason = "length"
+
+        return SimpleNamespace(
+            model=model,
+            choices=[SimpleNamespace(message=SimpleNamespace(content=content), finish_reason=finish_reason)],
+            usage=SimpleNamespace(
+                prompt_tokens=len(prompt) // 4,
+                completion_tokens=len(content) // 4,
+                total_tokens=(len(prompt) + len(content)) // 4
+            )
+        )
+
+
+def _request_from_prompt(prompt: str) -> PlanRequest:
+    """Recover the planning request from an itinerary prompt"""
+    destination = re.search(r'"destination": "([^"]+)"', prompt)
+    days = re.search(r'"total_days": (\d+)', prompt)
+    budget = re.search(r'"total_budget": ([\d.]+)', prompt)
+    style = re.search(r'"travel_style": "(\w+)"', prompt)
+    return PlanRequest(
+        destination=destination.group(1) if destination else "Lisbon, Portugal",
+        days=int(days.group(1)) if days else 3,
+        budget=float(budget.group(1)) if budget else 1000.0,
+        travel_style=TravelStyle(style.group(1)) if style else TravelStyle.CULTURAL
+    )
+
+
+def _missing_days_response(prompt: str, seed: int) -> str:
+    """Answer a missing-days prompt with just the requested days"""
+    trip = re.search(r"completing a (\d+)-day itinerary for (.+?)\.\n", prompt)
+    request = PlanRequest(
+        destination=trip.group(2) if trip else "Lisbon, Portugal",
+        days=int(trip.group(1)) if trip else 3,
+        budget=1000.0,
+        travel_style=TravelStyle.CULTURAL
+    )
+    wanted = {int(n) for n in re.search(r"Plan ONLY days ([\d, ]+)", prompt).group(1).replace(" ", "").split(",") if n}
+    days = [day for day in make_itinerary(request, seed)["days"] if day["day"] in wanted]
+    return json.dumps({"days": days})
+
+
+# ============= Wiring =============
+
+def install_fakes(groq_latency: float = 0.0, groq_jitter: float = 0.0, embed_latency: float = 0.0,
+                  recordings: Optional[List[str]] = None, truncate_rate: float = 0.0) -> FakeMongoClient:
+    """
+    Patch the app to use the local stand-ins.
+
+    Args:
+        groq_latency: Seconds per chat completion
+        groq_jitter: Extra uniform random latency (deterministic per prompt)
+        embed_latency: Seconds per embedding call
+        recordings: Raw LLM responses to replay instead of synthesized ones
+        truncate_rate: Share of itinerary responses cut off mid-JSON
+
+    Returns:
+        The in-memory Mongo client
+    """
+    import os
+    import sys
+    import tempfile
+
+    import app.config
+    import app.cache
+    import app.corpus
+    import app.db
+    import app.embeddings
+    import app.providers
+
+    FakeGroq.latency = groq_latency
+    FakeGroq.jitter = groq_jitter
+    FakeGroq.recordings = list(recordings or [])
+    FakeGroq.truncate_rate = truncate_rate
+    FakeGenaiClient.latency = embed_latency
+    FakeGenaiClient.models_instance = None
+
+    # The app imports provider SDKs lazily, so swapping the modules is enough
+    fake_genai = SimpleNamespace(Client=FakeGenaiClient)
+    sys.modules["groq"] = SimpleNamespace(Groq=FakeGroq)
+    sys.modules["google.genai"] = fake_genai
+    import google
+    google.genai = fake_genai
+
+    # Start every run with an empty shared cache
+    os.environ["CACHE_PATH"] = os.path.join(tempfile.mkdtemp(prefix="wandergenie-bench-"), "cache.sqlite3")
+    app.config.get_settings.cache_clear()
+    app.cache.get_shared_cache.cache_clear()
+
+    client = FakeMongoClient()
+    app.db.get_mongo_client = lambda: client
+    app.providers.get_groq_client.cache_clear()
+    app.providers.get_genai_client.cache_clear()
+    app.embeddings.get_embedding_backend.cache_clear()
+    app.corpus.forget_active_embedding()
+    return client
@@ -0,0 +1,154 @@
+"""
+Deterministic fixtures for benchmarks: realistic travel guides and LLM
+itinerary responses of any length.
+"""
+import json
+import random
+from typing import Any, Dict
+
+from app.schemas import PlanRequest, TravelStyle
+
+
+ATTRACTIONS = [
+    ("Old Town Walking Tour", "Guided walk through cobbled lanes, merchant houses and hidden courtyards"),
+    ("National Museum", "Flagship collection of regional art, archaeology and design history"),
+    ("Central Market", "Covered market with street food stalls, spices and local produce"),
+    ("Cathedral Square", "Historic square framed by a gothic cathedral and baroque facades"),
+    ("Riverside Promenade", "Tree-lined path along the river with viewpoints and cafes"),
+    ("Botanical Garden", "Glasshouses and themed gardens with over 5,000 plant species"),
+    ("Hilltop Fortress", "Medieval fortress with panoramic views over the city"),
+    ("Harbour Cruise", "One-hour boat tour past the docks, lighthouse and islands"),
+    ("Contemporary Art Gallery", "Rotating exhibitions from local and international artists"),
+    ("Night Food Street", "Lively evening street lined with grills, noodle bars and dessert stands"),
+    ("Jazz Cellar", "Intimate live music venue in a vaulted brick cellar"),
+    ("Sunset Viewpoint", "Popular terrace for sunset with a view of the skyline"),
+]
+
+SECTIONS = [
+    ("Overview", "{city} is a vibrant destination where centuries of history meet a lively modern culture. "
+                 "Visitors come for the architecture, the food scene and the easy pace of neighbourhood life."),
+    ("Must-Visit Attractions", "- {name}: {desc}. Entry costs around {cost} local currency (about ${usd}). "
+                               "Arrive early to avoid queues; the site is especially photogenic in the morning light."),
+    ("Transportation", "The airport express train reaches the centre in 25 minutes for ${usd}. "
+                       "A 24-hour public transit pass costs ${usd2} and covers metro, trams and buses. "
+                       "Taxis from the airport cost about ${usd3}; ride-share apps are widely used."),
+    ("Accommodation", "Budget hostels in the old town cost ${usd}-{usd2} per night. Mid-range hotels near the "
+                      "river cost ${usd3}-{usd4} per night. Luxury hotels with spa facilities start at ${usd5}."),
+    ("Food & Dining", "Street food snacks cost ${usd}-{usd2}. A mid-range dinner for two costs about ${usd3}. "
+                      "Fine dining tasting menus run ${usd4}-{usd5}. Must-try dishes include the local stew and pastries."),
+    ("Travel Tips", "Visit in spring or autumn for mild weather. Tipping around 10% is customary. "
+                    "Keep valuables close in crowded markets. Many museums are free on the first Sunday of the month."),
+    ("Hidden Gems", "The artisans' quarter behind the station hides workshops and tiny tea rooms. "
+                    "A short ferry ride reaches a quiet island with beaches and seafood shacks."),
+]
+
+
+def make_guide(city: str, repeats: int = 1, seed: int = 0) -> str:
+    """
+    Build a long, realistic destination guide.
+
+    Args:
+        city: City name
+        repeats: How many times each section body is repeated (guide length)
+        seed: Random seed for prices
+
+    Returns:
+        Guide text with section headers
+    """
+    rng = random.Random(seed)
+    lines = []
+    for n, (title, body) in enumerate(SECTIONS, 1):
+        lines.append(f"{n}. **{title}**:")
+        for _ in range(repeats):
+            if title == "Must-Visit Attractions":
+                for name, desc in ATTRACTIONS:
+                    usd = rng.randint(5, 40)
+                    lines.append(body.format(name=name, desc=desc, cost=usd * 10, usd=usd))
+            else:
+                prices = sorted(rng.randint(5, 400) for _ in range(5))
+                lines.append(body.format(
+                    city=city, usd=prices[0], usd2=prices[1], usd3=prices[2], usd4=prices[3], usd5=prices[4]
+                ))
+        lines.append("")
+    return "\n".join(lines)
+
+
+def make_itinerary(request: PlanRequest, seed: int = 0) -> Dict[str, Any]:
+    """
+    Build a realistic itinerary dict matching the prompt's JSON structure.
+
+    Args:
+        request: Planning request
+        seed: Random seed
+
+    Returns:
+        Itinerary dict
+    """
+    rng = random.Random(seed)
+    daily = round(request.budget / request.days, 2)
+
+    def activities(count: int):
+        picks = rng.sample(ATTRACTIONS, count)
+        return [
+            {
+                "name": name,
+                "description": desc,
+                "duration": f"{rng.randint(1, 3)} hours",
+                "estimated_cost": float(rng.randint(0, 60)),
+            }
+            for name, desc in picks
+        ]
+
+    return {
+        "destination": request.destination,
+        "total_days": request.days,
+        "total_budget": request.budget,
+        "travel_style": request.travel_style.value,
+        "days": [
+            {
+                "day": day,
+                "title": f"Day {day}: {rng.choice(ATTRACTIONS)[0]} and surroundings",
+                "morning": activities(3),
+                "afternoon": activities(3),
+                "evening": activities(2),
+                "accommodation": "Boutique hotel in the old town, close to public transport",
+                "daily_budget": daily,
+            }
+            for day in range(1, request.days + 1)
+        ],
+        "transport": [
+            {"type": "Airport Transfer", "details": "Express train from the airport to the central station", "estimated_cost": 15.0},
+            {"type": "Metro", "details": "Multi-day transit pass covering metro, trams and buses", "estimated_cost": 40.0},
+            {"type": "Taxi", "details": "Occasional late-night rides back to the hotel", "estimated_cost": 60.0},
+        ],
+        "tips": [
+            "Buy the transit pass at the airport station",
+            "Book popular museums a few days in advance",
+            "Carry some cash for market stalls",
+            "Dinner is typically served after 8pm",
+        ],
+    }
+
+
+def make_llm_response(request: PlanRequest, seed: int = 0, wrapped: bool = True) -> str:
+    """
+    Build a raw LLM response for an itinerary.
+
+    Args:
+        request: Planning request
+        seed: Random seed
+        wrapped: Surround the JSON with prose, as chat models often do
+
+    Returns:
+        Raw response text
+    """
+    body = json.dumps(make_itinerary(request, seed), indent=2)
+    if wrapped:
+        return f"Here is your personalized itinerary:\n\n{body}\n\nEnjoy your trip!"
+    return body
+
+
+def sample_request(days: int = 5, style: TravelStyle = TravelStyle.CULTURAL,
+                   destination: str = "Lisbon, Portugal") -> PlanRequest:
+    """Build a planning request"""
+    return PlanRequest(destination=destination, days=days, budget=250.0 * days, travel_style=style)
@@ -0,0 +1,276 @@
+"""
+Offline load test for /plan.
+
+Runs the real FastAPI app (including its lifespan) in-process against the
+local stand-ins from `benchmarks.fakes`: an in-memory MongoDB with
+`$vectorSearch`, a deterministic Groq that replays recorded itineraries and
+a fake Gemini embedder. No network access or API quota is used.
+
+Usage (from the Backend directory):
+    python -m benchmarks.load_plan --requests 200 --concurrency 20
+    python -m benchmarks.load_plan --groq-latency 1.5 --embed-latency 0.15 --name baseline
+    python -m benchmarks.load_plan --recordings recorded_responses.jsonl
+    python -m benchmarks.load_plan --batch-size 20 --concurrency 2   # via /plan/batch
+    python -m benchmarks.load_plan --warmup                            # warm start (startup warmup finished first)
+
+Results are written to benchmarks/results/<name>.json; compare two runs with
+    python -m benchmarks.load_plan --compare results/a.json results/b.json
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import platform
+import random
+import statistics
+import time
+from datetime import datetime
+from typing import Dict, List, Optional
+
+# Settings are required at import time; the stand-ins never use these values
+os.environ.setdefault("MONGODB_URI", "mongodb://localhost:27017")
+os.environ.setdefault("GEMINI_API_KEY", "offline-benchmark")
+os.environ.setdefault("GROQ_API_KEY", "offline-benchmark")
+
+from benchmarks.fakes import install_fakes, FakeGroq, FakeGenaiClient
+from benchmarks.fixtures import make_guide
+
+
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), "results")
+
+DESTINATIONS = [
+    ("Tokyo", "Japan"), ("Paris", "France"), ("New York City", "USA"), ("Lisbon", "Portugal"),
+    ("Bangkok", "Thailand"), ("Rome", "Italy"), ("Barcelona", "Spain"), ("Istanbul", "Turkey"),
+]
+STYLES = ["adventure", "relaxation", "cultural", "luxury", "budget", "family"]
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """Nearest-rank percentile"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(1, math.ceil(pct / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+
+def build_workload(count: int, seed: int, unknown_ratio: float) -> List[Dict]:
+    """Deterministic mix of /plan requests"""
+    rng = random.Random(seed)
+    workload = []
+    for i in range(count):
+        if rng.random() < unknown_ratio:
+            destination = f"Newtown {i}, Nowhere"
+        else:
+            city, country = rng.choice(DESTINATIONS)
+            destination = f"{city}, {country}"
+        days = rng.choice([1, 2, 3, 5, 7, 10, 14])
+        workload.append({
+            "destination": destination,
+            "days": days,
+            "budget": float(rng.randint(100, 400) * days),
+            "travel_style": rng.choice(STYLES),
+        })
+    return workload
+
+
+def seed_corpus():
+    """Ingest guides for the known destinations through the real pipeline"""
+    from app.bundles import flush_bundle_rebuilds
+    from app.ingest import ingest_document
+
+    for i, (city, country) in enumerate(DESTINATIONS):
+        ingest_document(
+            make_guide(city, repeats=2, seed=i),
+            {"type": "city_guide", "destination": city, "country": country, "category": "overview"}
+        )
+    # The fake vector index is current at once: build bundles now, not during the run
+    flush_bundle_rebuilds()
+
+
+def create_user() -> str:
+    """Insert a benchmark user and return a bearer token for it"""
+    from app.auth import create_access_token
+    from app.db import get_users_collection
+
+    users = get_users_collection()
+    result = users.insert_one({
+        "email": "loadtest@example.com",
+        "name": "Load Test",
+        "hashed_password": "not-used",
+        "created_at": datetime.utcnow().isoformat(),
+    })
+    return create_access_token({"sub": str(result.inserted_id), "email": "loadtest@example.com"})
+
+
+async def run_load(args) -> Dict:
+    import httpx
+    from app.main import app
+
+    recordings = None
+    if args.recordings:
+        # One recorded response per line: {"content": "..."} or a JSON string
+        with open(args.recordings, encoding="utf-8") as f:
+            records = [json.loads(line) for line in f if line.strip()]
+        recordings = [r["content"] if isinstance(r, dict) else r for r in records]
+
+    # Off by default so runs stay comparable (warmup calls the embedder too)
+    os.environ["WARMUP_ENABLED"] = "true" if args.warmup else "false"
+    # The precompute scheduler would spend its token budget during the run
+    os.environ.setdefault("PRECOMPUTE_ENABLED", "false")
+    install_fakes(
+        groq_latency=args.groq_latency,
+        groq_jitter=args.groq_jitter,
+        embed_latency=args.embed_latency,
+        truncate_rate=args.truncate_rate,
+        recordings=recordings
+    )
+
+    print(f"🧪 Seeding corpus for {len(DESTINATIONS)} destinations...")
+    seed_corpus()
+    token = create_user()
+    headers = {"Authorization": f"Bearer {token}"}
+
+    workload = build_workload(args.requests, args.seed, args.unknown_ratio)
+    latencies: List[float] = []
+    statuses: Dict[str, int] = {}
+    queue: asyncio.Queue = asyncio.Queue()
+    if args.batch_size:
+        for i in range(0, len(workload), args.batch_size):
+            queue.put_nowait({"requests": workload[i:i + args.batch_size]})
+    else:
+        for item in workload:
+            queue.put_nowait(item)
+
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://loadtest", timeout=None) as client:
+            if args.warmup:
+                # Measure a warm start: wait for the startup warmup to finish
+                while (await client.get("/health")).json()["warmup"]["status"] in ("pending", "running"):
+                    await asyncio.sleep(0.05)
+
+            async def worker():
+                while True:
+                    try:
+                        body = queue.get_nowait()
+                    except asyncio.QueueEmpty:
+                        return
+                    start = time.perf_counter()
+                    if args.batch_size:
+                        # One latency per batch; statuses per item from the NDJSON stream
+                        response = await client.post("/plan/batch", json=body, headers=headers)
+                        codes = [
+                            str(line.get("status_code", 200))
+                            for line in map(json.loads, response.text.splitlines()) if "index" in line
+                        ] if response.status_code == 200 else [str(response.status_code)]
+                    else:
+                        response = await client.post("/plan", json=body, headers=headers)
+                        codes = [str(response.status_code)]
+                    latencies.append(time.perf_counter() - start)
+                    for code in codes:
+                        statuses[code] = statuses.get(code, 0) + 1
+
+            print(f"🚀 Sending {len(workload)} requests at concurrency {args.concurrency}...")
+            started = time.perf_counter()
+            await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+            elapsed = time.perf_counter() - started
+
+    latencies_ms = [l * 1000 for l in latencies]
+    return {
+        "name": args.name,
+        "timestamp": datetime.utcnow().isoformat(),
+        "python": platform.python_version(),
+        "config": {
+            "requests": args.requests,
+            "concurrency": args.concurrency,
+            "groq_latency": args.groq_latency,
+            "groq_jitter": args.groq_jitter,
+            "embed_latency": args.embed_latency,
+            "unknown_ratio": args.unknown_ratio,
+            "truncate_rate": args.truncate_rate,
+            "batch_size": args.batch_size,
+            "warmup": args.warmup,
+            "seed": args.seed,
+            "recordings": args.recordings,
+        },
+        "statuses": statuses,
+        "duration_s": round(elapsed, 3),
+        "requests_per_second": round(len(workload) / elapsed, 2) if elapsed else 0.0,
+        "latency_ms": {
+            "p50": round(percentile(latencies_ms, 50), 2),
+            "p95": round(percentile(latencies_ms, 95), 2),
+            "p99": round(percentile(latencies_ms, 99), 2),
+            "mean": round(statistics.fmean(latencies_ms), 2) if latencies_ms else 0.0,
+            "max": round(max(latencies_ms), 2) if latencies_ms else 0.0,
+        },
+        "provider_calls": {
+            "groq": FakeGroq.calls,
+            "gemini": FakeGenaiClient.models_instance.calls if FakeGenaiClient.models_instance else 0,
+        },
+    }
+
+
+def print_report(result: Dict):
+    lat = result["latency_ms"]
+    print(f"\n{'=' * 60}")
+    print(f"📊 {result['name']}: {result['config']['requests']} requests, concurrency {result['config']['concurrency']}")
+    print(f"{'=' * 60}")
+    print(f"   Throughput: {result['requests_per_second']} req/s over {result['duration_s']}s")
+    print(f"   Latency (ms): p50={lat['p50']}  p95={lat['p95']}  p99={lat['p99']}  mean={lat['mean']}  max={lat['max']}")
+    print(f"   Status codes: {result['statuses']}")
+    print(f"   Provider calls: {result['provider_calls']}")
+
+
+def compare(paths: List[str]):
+    runs = []
+    for path in paths:
+        with open(path, encoding="utf-8") as f:
+            runs.append(json.load(f))
+    base = runs[0]
+    print(f"{'run':<24}{'req/s':>10}{'p50':>10}{'p95':>10}{'p99':>10}")
+    for run in runs:
+        lat = run["latency_ms"]
+        print(f"{run['name']:<24}{run['requests_per_second']:>10}{lat['p50']:>10}{lat['p95']:>10}{lat['p99']:>10}")
+    for run in runs[1:]:
+        if base["requests_per_second"]:
+            change = (run["requests_per_second"] / base["requests_per_second"] - 1) * 100
+            print(f"   {run['name']} vs {base['name']}: throughput {change:+.1f}%")
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Offline /plan load test")
+    parser.add_argument("--requests", type=int, default=100, help="Total requests to send")
+    parser.add_argument("--concurrency", type=int, default=10, help="Concurrent clients")
+    parser.add_argument("--groq-latency", type=float, default=0.5, help="Seconds per fake Groq completion")
+    parser.add_argument("--groq-jitter", type=float, default=0.0, help="Extra random seconds per completion")
+    parser.add_argument("--embed-latency", type=float, default=0.05, help="Seconds per fake Gemini embedding")
+    parser.add_argument("--unknown-ratio", type=float, default=0.0, help="Share of requests for destinations without a guide")
+    parser.add_argument("--truncate-rate", type=float, default=0.0, help="Share of LLM responses cut off mid-JSON")
+    parser.add_argument("--recordings", help="JSONL file of recorded LLM responses to replay")
+    parser.add_argument("--batch-size", type=int, default=0, help="Send requests through /plan/batch in batches of this size")
+    parser.add_argument("--warmup", action="store_true", help="Run the startup cache warmup and wait for it before the load")
+    parser.add_argument("--seed", type=int, default=42, help="Workload seed")
+    parser.add_argument("--name", default=None, help="Run name (results file name)")
+    parser.add_argument("--output", default=None, help="Results JSON path")
+    parser.add_argument("--compare", nargs="+", metavar="RESULT", help="Compare saved result files and exit")
+    args = parser.parse_args(argv)
+
+    if args.compare:
+        compare(args.compare)
+        return
+
+    args.name = args.name or datetime.utcnow().strftime("plan-%Y%m%d-%H%M%S")
+    result = asyncio.run(run_load(args))
+    print_report(result)
+
+    output = args.output or os.path.join(RESULTS_DIR, f"{args.name}.json")
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(result, f, indent=2)
+    print(f"\n💾 Results saved to {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,190 @@
+"""
+Microbenchmarks for the CPU-bound hot paths.
+
+Covers `chunk_document`, `build_prompt`, `parse_itinerary_response`,
+`Itinerary(**data)` validation, the itinerary serialization path (JSON
+validation of a clean response, the `/plan` and `/itineraries` response
+bodies) and JWT encode/decode with realistic fixtures (long destination
+guides, 30-day LLM responses). Reports ops/sec
+and memory allocated per call, and fails when a benchmark regresses past a
+threshold compared to a saved baseline.
+
+Usage (from the Backend directory):
+    python -m benchmarks.micro --save-baseline        # record a baseline on this machine
+    python -m benchmarks.micro                        # compare against it (exit 1 on regression)
+    python -m benchmarks.micro --threshold 0.10 --only chunk_document
+"""
+import argparse
+import json
+import os
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+from typing import Callable, Dict, List, Optional, Tuple
+
+os.environ.setdefault("MONGODB_URI", "mongodb://localhost:27017")
+os.environ.setdefault("GEMINI_API_KEY", "offline-benchmark")
+os.environ.setdefault("GROQ_API_KEY", "offline-benchmark")
+
+from benchmarks.fixtures import make_guide, make_itinerary, make_llm_response, sample_request
+
+
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), "results")
+DEFAULT_BASELINE = os.path.join(RESULTS_DIR, "micro-baseline.json")
+
+
+def build_cases() -> Dict[str, Callable[[], object]]:
+    """Benchmark name -> zero-argument callable"""
+    from app.auth import create_access_token, verify_token
+    from app.generate import build_prompt, itinerary_from_body, parse_itinerary_response
+    from app.chunking import chunk_document
+    from app.repair import parse_clean_itinerary
+    from app.responses import itinerary_list_response, plan_response
+    from app.schemas import Itinerary
+    from app.storage import build_itinerary_document, serialize_itinerary
+
+    long_guide = make_guide("Lisbon", repeats=20)           # ~100 KB guide
+    request_30 = sample_request(days=30)
+    response_30 = make_llm_response(request_30)              # 30-day raw LLM response
+    clean_response_30 = make_llm_response(request_30, wrapped=False)
+    itinerary_30 = make_itinerary(request_30)
+    model_30 = Itinerary(**itinerary_30)
+    stored_30 = [
+        {"_id": f"{i:024x}", **build_itinerary_document(make_itinerary(request_30, seed=i), "user", "user@example.com")}
+        for i in range(20)
+    ]
+    context = "\n\n---\n\n".join(make_guide("Lisbon").split("\n\n")[:5])
+    token = create_access_token({"sub": "507f1f77bcf86cd799439011", "email": "user@example.com"})
+
+    def plan_response_30d():
+        # What /plan does after generation: one dump, one serialization for storage and response
+        itinerary_data = model_30.model_dump()
+        raw = serialize_itinerary(itinerary_data)
+        build_itinerary_document(itinerary_data, "user", "user@example.com", raw=raw)
+        return plan_response(raw, "507f1f77bcf86cd799439011").body
+
+    return {
+        "chunk_document": lambda: chunk_document(long_guide),
+        "build_prompt": lambda: build_prompt(request_30, context),
+        "parse_itinerary_response": lambda: parse_itinerary_response(response_30, request_30),
+        "itinerary_validation_30d": lambda: Itinerary(**itinerary_30),
+        "validate_json_30d": lambda: itinerary_from_body(parse_clean_itinerary(clean_response_30, 30), request_30),
+        "plan_response_30d": plan_response_30d,
+        "itineraries_list_20x30d": lambda: itinerary_list_response(stored_30, include_details=True).body,
+        "jwt_encode": lambda: create_access_token({"sub": "507f1f77bcf86cd799439011", "email": "user@example.com"}),
+        "jwt_decode": lambda: verify_token(token),
+    }
+
+
+def measure(func: Callable[[], object], min_time: float = 0.2, repeat: int = 5) -> Tuple[float, int]:
+    """
+    Measure throughput and allocation of a callable.
+
+    Args:
+        func: Callable to benchmark
+        min_time: Minimum seconds per timing run (loop count is calibrated)
+        repeat: Timing runs; the best one is reported
+
+    Returns:
+        (ops per second, bytes allocated per call at peak)
+    """
+    func()  # warm up caches and lazy imports
+
+    loops = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(loops):
+            func()
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time:
+            break
+        loops *= 2
+
+    best = elapsed
+    for _ in range(repeat - 1):
+        start = time.perf_counter()
+        for _ in range(loops):
+            func()
+        best = min(best, time.perf_counter() - start)
+
+    tracemalloc.start()
+    tracemalloc.reset_peak()
+    base, _ = tracemalloc.get_traced_memory()
+    func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return loops / best, peak - base
+
+
+def run(only: Optional[List[str]] = None, min_time: float = 0.2) -> Dict[str, Dict[str, float]]:
+    results = {}
+    for name, func in build_cases().items():
+        if only and name not in only:
+            continue
+        ops, allocated = measure(func, min_time=min_time)
+        results[name] = {"ops_per_sec": round(ops, 2), "alloc_bytes_per_call": allocated}
+        print(f"   {name:<28}{ops:>14,.1f} ops/s{allocated / 1024:>12,.1f} KiB/call")
+    return results
+
+
+def check_regressions(results: Dict, baseline: Dict, threshold: float) -> List[str]:
+    """Names of benchmarks slower than the baseline by more than `threshold`"""
+    failures = []
+    for name, current in results.items():
+        previous = baseline.get(name)
+        if not previous:
+            continue
+        change = current["ops_per_sec"] / previous["ops_per_sec"] - 1
+        marker = "❌" if change < -threshold else "✓"
+        print(f"   {marker} {name:<28}{change * 100:>+8.1f}% vs baseline")
+        if change < -threshold:
+            failures.append(name)
+    return failures
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Microbenchmarks for CPU-bound hot paths")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="Baseline results JSON")
+    parser.add_argument("--save-baseline", action="store_true", help="Write results as the new baseline")
+    parser.add_argument("--threshold", type=float, default=0.20, help="Allowed slowdown (0.20 = 20%%)")
+    parser.add_argument("--only", nargs="+", help="Benchmark names to run")
+    parser.add_argument("--min-time", type=float, default=0.2, help="Minimum seconds per timing run")
+    parser.add_argument("--output", help="Also write results JSON to this path")
+    args = parser.parse_args(argv)
+
+    print("⏱️  Running microbenchmarks...\n")
+    results = run(args.only, args.min_time)
+    payload = {"timestamp": datetime.utcnow().isoformat(), "results": results}
+
+    if args.output:
+        os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(payload, f, indent=2)
+
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(args.baseline) or ".", exist_ok=True)
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(payload, f, indent=2)
+        print(f"\n💾 Baseline saved to {args.baseline}")
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print(f"\n💡 No baseline at {args.baseline} - run with --save-baseline to create one.")
+        return 0
+
+    with open(args.baseline, encoding="utf-8") as f:
+        baseline = json.load(f)["results"]
+
+    print(f"\n📊 Comparing against {args.baseline} (threshold {args.threshold * 100:.0f}%):")
+    failures = check_regressions(results, baseline, args.threshold)
+    if failures:
+        print(f"\n❌ Regressions: {', '.join(failures)}")
+        return 1
+    print("\n✅ No regressions")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,35 @@
+"""
+Script to record the embedding model, dimension and destination key on
+chunks ingested before they were tracked.
+
+The server runs this backfill once per database at startup; the script
+re-runs it (e.g. with another --model). Until then retrieval treats
+untagged chunks as Gemini text-embedding-004, which embedded all of them.
+Destination-scoped searches filter on `metadata.destination_key`, which is
+derived from `metadata.destination`.
+
+Usage:
+    python scripts/backfill_embedding_metadata.py
+    python scripts/backfill_embedding_metadata.py --model models/text-embedding-004
+"""
+import sys
+sys.path.append('.')
+
+import argparse
+
+from app.corpus import UNTAGGED_EMBEDDING_MODEL, backfill_embedding_metadata
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Tag untracked chunks with their embedding model")
+    parser.add_argument("--model", default=UNTAGGED_EMBEDDING_MODEL,
+                        help="Model that embedded the untracked chunks")
+    args = parser.parse_args()
+
+    counts = backfill_embedding_metadata(args.model)
+    print(f"✓ Recorded destination keys on {counts['keyed']} chunks")
+    print(f"\n✅ Backfill complete: {counts['tagged'] + counts['keyed']} chunks updated")
+
+
+if __name__ == "__main__":
+    main()
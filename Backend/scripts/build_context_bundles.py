@@ -0,0 +1,44 @@
+"""
+Script to (re)build precomputed context bundles for every destination.
+
+Ingestion keeps bundles up to date (in the background); run this once after upgrading, after
+changing TOP_K_RESULTS or EMBEDDING_MODEL, or to refresh specific
+destinations.
+
+Usage:
+    python scripts/build_context_bundles.py
+    python scripts/build_context_bundles.py --destination Tokyo --destination Paris
+"""
+import sys
+sys.path.append('.')
+
+import argparse
+
+from app.bundles import build_destination_bundles
+from app.db import get_collection
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build context bundles per destination and travel style")
+    parser.add_argument("--destination", action="append",
+                        help="Destination to rebuild (repeatable; default: all)")
+    args = parser.parse_args()
+
+    destinations = args.destination or sorted(get_collection().distinct("metadata.destination"))
+    print(f"📦 Building context bundles for {len(destinations)} destinations...\n")
+
+    total = 0
+    for destination in destinations:
+        try:
+            written = build_destination_bundles(destination)
+        except Exception as e:
+            print(f"❌ {destination}: {e}")
+            continue
+        total += written
+        print(f"✓ {destination}: {written} bundles")
+
+    print(f"\n✅ Built {total} context bundles")
+
+
+if __name__ == "__main__":
+    main()
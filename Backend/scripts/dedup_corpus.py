@@ -0,0 +1,130 @@
+"""
+Script to report (and optionally remove) near-duplicate chunks already in
+the corpus.
+
+Chunks ingested before near-duplicate detection have no MinHash signature;
+they are signed first (`--backfill`, on by default). Then, per destination,
+chunks are grouped with an LSH index: in every group the oldest chunk is
+kept and the others are reported as duplicates. With `--delete` the
+duplicates are removed and the affected destinations' cached retrieval
+results and context bundles are refreshed.
+
+Usage:
+    python scripts/dedup_corpus.py                      # report only
+    python scripts/dedup_corpus.py --threshold 0.9 --show 5
+    python scripts/dedup_corpus.py --delete
+"""
+import sys
+sys.path.append('.')
+
+import argparse
+from collections import defaultdict
+
+from pymongo import UpdateOne
+
+from app.config import get_settings
+from app.corpus import bump_generation, get_active_embedding
+from app.db import get_collection
+from app.dedup import LSHIndex, decode_signature, encode_signature, lsh_bands, minhash_signature
+from app.ingest import rebuild_context_bundles
+from app.vectors import stored_size
+
+
+def backfill_signatures(collection, model: str, batch_size: int) -> int:
+    """Sign chunks of the active model that have no signature yet"""
+    signed = 0
+    ops = []
+    cursor = collection.find(
+        {"embedding_model": model, "minhash": {"$exists": False}},
+        {"text": 1}
+    ).batch_size(batch_size)
+    for doc in cursor:
+        signature = minhash_signature(doc.get("text", ""))
+        if signature is None:
+            continue
+        ops.append(UpdateOne(
+            {"_id": doc["_id"]},
+            {"$set": {"minhash": encode_signature(signature), "lsh_bands": lsh_bands(signature)}}
+        ))
+        if len(ops) >= batch_size:
+            collection.bulk_write(ops, ordered=False)
+            signed += len(ops)
+            ops = []
+    if ops:
+        collection.bulk_write(ops, ordered=False)
+        signed += len(ops)
+    return signed
+
+
+def main():
+    settings = get_settings()
+    parser = argparse.ArgumentParser(description="Report or remove near-duplicate chunks")
+    parser.add_argument("--threshold", type=float, default=settings.dedup_threshold,
+                        help="Minimum estimated Jaccard similarity")
+    parser.add_argument("--no-backfill", action="store_true", help="Do not sign unsigned chunks first")
+    parser.add_argument("--delete", action="store_true", help="Delete the duplicates")
+    parser.add_argument("--show", type=int, default=3, help="Example duplicates to print per destination")
+    parser.add_argument("--batch-size", type=int, default=500, help="Chunks per bulk write")
+    args = parser.parse_args()
+
+    collection = get_collection()
+    model = get_active_embedding()["model"]
+
+    if not args.no_backfill:
+        signed = backfill_signatures(collection, model, args.batch_size)
+        print(f"✓ Signed {signed} chunks without a MinHash signature")
+
+    # Oldest first, so the first copy of a text is the one kept
+    cursor = collection.find(
+        {"embedding_model": model, "minhash": {"$exists": True}},
+        {"minhash": 1, "lsh_bands": 1, "text": 1, "embedding": 1, "metadata.destination_key": 1,
+         "metadata.destination": 1}
+    ).sort("_id", 1)
+
+    indexes = defaultdict(LSHIndex)
+    duplicates = defaultdict(list)  # destination_key -> [(duplicate doc, kept id, similarity)]
+    destinations = {}
+    total = 0
+    for doc in cursor:
+        total += 1
+        metadata = doc.get("metadata", {})
+        key = metadata.get("destination_key")
+        destinations.setdefault(key, metadata.get("destination"))
+        signature = decode_signature(doc["minhash"])
+        match, score = indexes[key].query(signature, args.threshold, doc["lsh_bands"])
+        if match is not None:
+            duplicates[key].append((doc, match, score))
+        else:
+            indexes[key].add(doc["_id"], signature, doc["lsh_bands"])
+
+    count = sum(len(d) for d in duplicates.values())
+    saved_bytes = sum(stored_size(doc["embedding"]) + len(doc["text"].encode("utf-8"))
+                      for dups in duplicates.values() for doc, _, _ in dups)
+
+    print(f"\n📊 Near-duplicate report (threshold {args.threshold}, model {model})")
+    print(f"   Chunks scanned:     {total}")
+    print(f"   Near-duplicates:    {count} ({count / total * 100 if total else 0:.1f}%)")
+    print(f"   Reclaimable:        ~{saved_bytes / 1024:.1f} KB of vectors and text")
+    for key, dups in sorted(duplicates.items(), key=lambda item: -len(item[1])):
+        print(f"\n   {destinations.get(key) or key or '(no destination)'}: {len(dups)} duplicates")
+        for doc, kept, score in dups[:args.show]:
+            print(f"     - {doc['_id']} ~ {kept} ({score:.2f}): {doc['text'][:80]!r}")
+
+    if not args.delete or not count:
+        if count:
+            print("\n💡 Run with --delete to remove them.")
+        return
+
+    for key, dups in duplicates.items():
+        ids = [doc["_id"] for doc, _, _ in dups]
+        for i in range(0, len(ids), args.batch_size):
+            collection.delete_many({"_id": {"$in": ids[i:i + args.batch_size]}})
+        destination = destinations.get(key)
+        bump_generation(destination)
+        if destination and settings.context_bundles_enabled:
+            rebuild_context_bundles(destination)
+    print(f"\n✅ Deleted {count} near-duplicate chunks")
+
+
+if __name__ == "__main__":
+    main()
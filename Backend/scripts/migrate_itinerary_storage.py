@@ -0,0 +1,48 @@
+"""
+Script to convert saved itineraries to the compact compressed storage format.
+
+Legacy documents duplicate the summary fields and store the full itinerary
+uncompressed under `itinerary_data`. This rewrites them in place (same _id)
+as schema_version 2 documents and reports the bytes saved.
+
+Usage:
+    python scripts/migrate_itinerary_storage.py
+    python scripts/migrate_itinerary_storage.py --dry-run
+"""
+import sys
+sys.path.append('.')
+
+import argparse
+
+from app.storage import migrate_legacy_itineraries, ensure_itinerary_indexes
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Migrate itineraries to compressed storage")
+    parser.add_argument("--dry-run", action="store_true", help="Only report sizes, do not write")
+    parser.add_argument("--batch-size", type=int, default=500, help="Documents per bulk write")
+    args = parser.parse_args()
+
+    print("🗜️  Migrating itineraries to compressed storage...\n")
+
+    report = migrate_legacy_itineraries(batch_size=args.batch_size, dry_run=args.dry_run)
+    ensure_itinerary_indexes()
+
+    migrated = report["migrated"]
+    before = report["bytes_before"]
+    after = report["bytes_after"]
+
+    print(f"📊 Documents {'to migrate' if args.dry_run else 'migrated'}: {migrated}")
+    if migrated:
+        print(f"   Itinerary bodies before: {before:,} bytes ({before // migrated:,} per itinerary)")
+        print(f"   Itinerary bodies after:  {after:,} bytes ({after // migrated:,} per itinerary)")
+        print(f"   Saved: {before - after:,} bytes ({(1 - after / before) * 100:.1f}%)")
+
+    if args.dry_run:
+        print("\n💡 Dry run - no documents were changed.")
+    else:
+        print("\n✅ Migration complete!")
+
+
+if __name__ == "__main__":
+    main()
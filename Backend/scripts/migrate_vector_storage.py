@@ -0,0 +1,101 @@
+"""
+Script to convert stored embeddings to packed binary vectors.
+
+Rewrites the `embedding` field of every chunk that is not already in the
+target format (BSON array of doubles -> float32 or int8 binary vector) and
+reports the storage and query transfer savings.
+
+After migrating to int8, rebuild the Atlas vector index so it picks up the
+quantized vectors.
+
+Usage:
+    python scripts/migrate_vector_storage.py --dry-run
+    python scripts/migrate_vector_storage.py --format float32
+    python scripts/migrate_vector_storage.py --format int8 --batch-size 200
+"""
+import sys
+sys.path.append('.')
+
+import argparse
+
+from bson.binary import Binary
+from pymongo import UpdateOne
+
+from app.config import get_settings
+from app.db import get_collection
+from app.vectors import STORAGE_FORMATS, decode_vector, encode_vector, stored_size
+
+
+def current_format(value) -> str:
+    if isinstance(value, Binary):
+        return "int8" if memoryview(value)[0] == 0x03 else "float32"
+    return "array"
+
+
+def main():
+    settings = get_settings()
+    parser = argparse.ArgumentParser(description="Convert embeddings to packed binary vectors")
+    parser.add_argument("--format", choices=STORAGE_FORMATS, default=settings.embedding_storage,
+                        help="Target storage format (default: EMBEDDING_STORAGE setting)")
+    parser.add_argument("--batch-size", type=int, default=500, help="Documents per bulk write")
+    parser.add_argument("--dry-run", action="store_true", help="Only report sizes, do not write")
+    args = parser.parse_args()
+
+    collection = get_collection()
+    print(f"🧮 Converting embeddings to '{args.format}' storage...\n")
+
+    converted = skipped = quantized = 0
+    bytes_before = bytes_after = 0
+    dims = None
+    batch = []
+
+    for doc in collection.find({}, {"embedding": 1}):
+        value = doc.get("embedding")
+        if value is None:
+            continue
+        if current_format(value) == args.format:
+            skipped += 1
+            continue
+        if current_format(value) == "int8":
+            quantized += 1
+            continue
+
+        vector = decode_vector(value).tolist()
+        dims = len(vector)
+        new_value = encode_vector(vector, args.format)
+
+        converted += 1
+        bytes_before += stored_size(value)
+        bytes_after += stored_size(new_value)
+
+        if not args.dry_run:
+            batch.append(UpdateOne({"_id": doc["_id"]}, {"$set": {"embedding": new_value}}))
+            if len(batch) >= args.batch_size:
+                collection.bulk_write(batch, ordered=False)
+                batch = []
+
+    if batch:
+        collection.bulk_write(batch, ordered=False)
+
+    print(f"📊 Chunks {'to convert' if args.dry_run else 'converted'}: {converted} (already in target format: {skipped})")
+    if quantized:
+        print(f"⚠️  Skipped {quantized} int8 chunks: quantized vectors cannot be converted back without re-embedding")
+    if converted:
+        print(f"   Embedding storage before: {bytes_before:,} bytes ({bytes_before // converted:,} per chunk)")
+        print(f"   Embedding storage after:  {bytes_after:,} bytes ({bytes_after // converted:,} per chunk)")
+        print(f"   Saved: {bytes_before - bytes_after:,} bytes ({(1 - bytes_after / bytes_before) * 100:.1f}%)")
+
+        # Every $vectorSearch sends one query vector
+        sample = [0.0] * dims
+        array_query = stored_size(encode_vector(sample, "array"))
+        binary_query = stored_size(encode_vector(sample, "float32"))
+        print(f"   Query vector per search: {array_query:,} bytes as array -> {binary_query:,} bytes as float32 binary")
+
+    if args.dry_run:
+        print("\n💡 Dry run - no documents were changed.")
+    else:
+        print("\n✅ Migration complete!")
+
+
+if __name__ == "__main__":
+    main()
@@ -7,42 +7,7 @@ sys.path.append('.')
 
 import subprocess
 
-# Top 30 most popular tourist destinations
-POPULAR_DESTINATIONS = [
-    # Asia
-    "Bangkok, Thailand",
-    "Singapore, Singapore", 
-    "Dubai, UAE",
-    "Seoul, South Korea",
-    "Mumbai, India",
-    "Hong Kong, China",
-    "Bali, Indonesia",
-    
-    # Europe
-    "London, England",
-    "Rome, Italy",
-    "Barcelona, Spain",
-    "Amsterdam, Netherlands",
-    "Prague, Czech Republic",
-    "Vienna, Austria",
-    "Berlin, Germany",
-    "Istanbul, Turkey",
-    
-    # Americas
-    "Los Angeles, USA",
-    "Las Vegas, USA",
-    "Miami, USA",
-    "Mexico City, Mexico",
-    "Rio de Janeiro, Brazil",
-    "Buenos Aires, Argentina",
-    
-    # Oceania & Africa
-    "Sydney, Australia",
-    "Melbourne, Australia",
-    "Auckland, New Zealand",
-    "Cape Town, South Africa",
-    "Marrakech, Morocco",
-]
+from app.destinations import POPULAR_DESTINATIONS
 
 
 def main():
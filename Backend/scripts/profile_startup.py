@@ -0,0 +1,150 @@
+"""
+Script to profile backend cold start.
+
+Reports import time per module (via `python -X importtime`) and
+time-to-first-request for a fresh process: interpreter start, importing
+`app.main`, running the lifespan startup and serving the first `/health`
+request. Doubles as a cold-start regression check: it exits with status 1
+when time-to-first-request exceeds the budget or when a heavy SDK is
+imported eagerly at startup.
+
+Usage:
+    python scripts/profile_startup.py
+    python scripts/profile_startup.py --budget-ms 1500 --runs 5
+"""
+import sys
+sys.path.append('.')
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import time
+
+
+# SDKs that must only be imported on first use
+LAZY_MODULES = ["groq", "google.genai", "pymongo", "jose", "passlib"]
+
+# Runs in a fresh interpreter; prints timings as JSON
+CHILD_SCRIPT = """
+import json, os, sys, time
+t_start = time.time()
+import asyncio
+
+t0 = time.perf_counter()
+import app.main
+t_import = time.perf_counter() - t0
+eager = [m for m in json.loads(sys.argv[1]) if m in sys.modules]
+
+async def first_request():
+    import httpx
+    t1 = time.perf_counter()
+    async with app.main.app.router.lifespan_context(app.main.app):
+        t_lifespan = time.perf_counter() - t1
+        transport = httpx.ASGITransport(app=app.main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://startup") as client:
+            t2 = time.perf_counter()
+            response = await client.get("/health")
+            t_request = time.perf_counter() - t2
+            return response.status_code, t_lifespan, t_request, time.time()
+
+status, t_lifespan, t_request, t_end = asyncio.run(first_request())
+print(json.dumps({
+    "status": status, "import_s": t_import, "lifespan_s": t_lifespan,
+    "request_s": t_request, "interpreter_to_ready_s": t_end - t_start,
+    "end": t_end, "eager_modules": eager,
+}), flush=True)
+os._exit(0)
+"""
+
+
+def child_env() -> dict:
+    env = dict(os.environ)
+    # Settings are required at import time; startup must not need real services
+    env.setdefault("MONGODB_URI", "mongodb://localhost:27017/?serverSelectionTimeoutMS=2000")
+    env.setdefault("GEMINI_API_KEY", "startup-profile")
+    env.setdefault("GROQ_API_KEY", "startup-profile")
+    env["PYTHONDONTWRITEBYTECODE"] = "1"
+    return env
+
+
+def profile_imports(top: int):
+    """Print the slowest modules imported by `import app.main`"""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import app.main"],
+        capture_output=True, text=True, env=child_env()
+    )
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        rows.append((name.strip(), int(self_us), int(cumulative_us)))
+
+    packages = {}
+    for name, self_us, _ in rows:
+        package = name.split(".")[0]
+        packages[package] = packages.get(package, 0) + self_us
+
+    print(f"📦 Slowest modules (cumulative, of {len(rows)} imported):")
+    for name, _, cumulative_us in sorted(rows, key=lambda r: r[2], reverse=True)[:top]:
+        print(f"   {cumulative_us / 1000:>8.1f} ms  {name}")
+
+    print(f"\n📦 Import time by top-level package (self time):")
+    for package, self_us in sorted(packages.items(), key=lambda p: p[1], reverse=True)[:top]:
+        print(f"   {self_us / 1000:>8.1f} ms  {package}")
+
+
+def measure_first_request() -> dict:
+    """Spawn a fresh interpreter and time it until the first response"""
+    spawned = time.time()
+    result = subprocess.run(
+        [sys.executable, "-c", CHILD_SCRIPT, json.dumps(LAZY_MODULES)],
+        capture_output=True, text=True, env=child_env()
+    )
+    lines = [l for l in result.stdout.splitlines() if l.startswith("{")]
+    if result.returncode != 0 or not lines:
+        raise RuntimeError(f"Startup probe failed:\n{result.stderr[-2000:]}")
+    timings = json.loads(lines[-1])
+    timings["time_to_first_request_s"] = timings.pop("end") - spawned
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Profile backend cold start")
+    parser.add_argument("--runs", type=int, default=3, help="Fresh processes to measure")
+    parser.add_argument("--budget-ms", type=float, default=2000, help="Max median time-to-first-request")
+    parser.add_argument("--top", type=int, default=15, help="Modules to list")
+    args = parser.parse_args()
+
+    print("🚀 WanderGenie cold-start profile\n")
+    profile_imports(args.top)
+
+    runs = [measure_first_request() for _ in range(args.runs)]
+    ttfr = statistics.median(r["time_to_first_request_s"] for r in runs) * 1000
+    imports = statistics.median(r["import_s"] for r in runs) * 1000
+    lifespan = statistics.median(r["lifespan_s"] for r in runs) * 1000
+    first = statistics.median(r["request_s"] for r in runs) * 1000
+    eager = sorted({m for r in runs for m in r["eager_modules"]})
+
+    print(f"\n⏱️  Time to first request (median of {args.runs}): {ttfr:.0f} ms")
+    print(f"   import app.main:   {imports:.0f} ms")
+    print(f"   lifespan startup:  {lifespan:.0f} ms")
+    print(f"   first /health:     {first:.1f} ms")
+
+    failed = False
+    if eager:
+        print(f"\n❌ Imported eagerly at startup: {', '.join(eager)}")
+        failed = True
+    if ttfr > args.budget_ms:
+        print(f"\n❌ Cold start {ttfr:.0f} ms exceeds budget of {args.budget_ms:.0f} ms")
+        failed = True
+
+    if failed:
+        sys.exit(1)
+    print(f"\n✅ Within cold-start budget ({args.budget_ms:.0f} ms)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,185 @@
+"""
+Script to migrate the corpus to another embedding model without downtime.
+
+Retrieval keeps using the current model while the worker re-embeds every
+chunk with the new one; it switches over in one step once the copy is
+complete (see app/reembed.py). The API processes run the migration in the
+background unless REEMBED_WORKER_ENABLED=false; `run` works on it from here
+instead, with a progress bar.
+
+Usage:
+    python scripts/reembed_corpus.py start --model local:BAAI/bge-small-en-v1.5 --index vector_index_384
+    python scripts/reembed_corpus.py status --watch 5
+    python scripts/reembed_corpus.py run --rate 50
+    python scripts/reembed_corpus.py switch      # after `start --no-switch`
+    python scripts/reembed_corpus.py rollback    # back to the previous model
+    python scripts/reembed_corpus.py cancel      # before the switch; deletes the copies
+    python scripts/reembed_corpus.py cleanup     # delete the previous model's chunks
+"""
+import sys
+sys.path.append('.')
+
+import argparse
+import threading
+import time
+
+from app.config import get_settings
+from app.corpus import get_active_embedding
+from app.reembed import (
+    READY, ReembedWorker, cancel_migration, cleanup_source_chunks, find_migration,
+    migration_progress, rollback_migration, start_migration, switch_migration
+)
+
+
+def format_duration(seconds) -> str:
+    if seconds is None:
+        return "unknown"
+    seconds = int(seconds)
+    hours, rest = divmod(seconds, 3600)
+    minutes, seconds = divmod(rest, 60)
+    return f"{hours}h{minutes:02d}m{seconds:02d}s" if hours else f"{minutes}m{seconds:02d}s"
+
+
+def progress_line(progress: dict) -> str:
+    """One-line progress bar for the current walk of a migration"""
+    width = 30
+    filled = int(width * progress["percent"] / 100)
+    rate = f"{progress['chunks_per_second']:.1f}/s" if progress["chunks_per_second"] else "-"
+    return (
+        f"{progress['status']:<10} [{'#' * filled}{'.' * (width - filled)}] "
+        f"{progress['processed']}/{progress['total']} ({progress['percent']:.1f}%) "
+        f"{rate}  ETA {format_duration(progress['eta_seconds'])}  embedded {progress['embedded']}"
+    )
+
+
+def print_status(migration):
+    active = get_active_embedding()
+    print(f"🧭 Active embedding model: {active['model']} (index {active['vector_index_name']})")
+    if migration is None:
+        print("   No embedding migration has been started.")
+        return
+    progress = migration_progress(migration)
+    print(f"\n📦 Migration {progress['id']}: {progress['source_model']} -> {progress['target_model']}")
+    print(f"   Target index: {progress['target_index']}")
+    print(f"   {progress_line(progress)}")
+    print(f"   Removed copies: {progress['removed']}   Errors: {progress['errors']}")
+    if progress["last_error"]:
+        print(f"   Last error: {progress['last_error']}")
+    if progress["note"]:
+        print(f"   Note: {progress['note']}")
+    if progress["worker"]:
+        print(f"   Worker: {progress['worker']}")
+    print(f"   Started: {progress['created_at']}   Updated: {progress['updated_at']}")
+    if progress["switched_at"]:
+        print(f"   Switched: {progress['switched_at']}")
+    if progress["completed_at"]:
+        print(f"   Completed: {progress['completed_at']}")
+
+
+def require_migration(migration_id):
+    migration = find_migration(migration_id)
+    if migration is None:
+        print("❌ No such embedding migration")
+        sys.exit(1)
+    return migration
+
+
+def main():
+    settings = get_settings()
+    parser = argparse.ArgumentParser(description="Re-embed the corpus with another embedding model")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    start = sub.add_parser("start", help="Start a migration to another model")
+    start.add_argument("--model", required=True, help="Target embedding model")
+    start.add_argument("--index", help="Atlas vector index for the target vectors (default: the active one)")
+    start.add_argument("--no-switch", action="store_true", help="Wait for `switch` once the copy is verified")
+
+    status = sub.add_parser("status", help="Show progress and estimated completion")
+    status.add_argument("--watch", type=float, help="Refresh every N seconds until the migration stops")
+
+    run = sub.add_parser("run", help="Work on the migration from this process")
+    run.add_argument("--batch-size", type=int, default=settings.reembed_batch_size, help="Chunks per batch")
+    run.add_argument("--rate", type=float, default=settings.reembed_rate,
+                     help="Max chunks embedded per second (0 = unlimited)")
+
+    for name, help_text in (
+        ("switch", "Switch to the target model of a verified migration"),
+        ("rollback", "Switch back to the previous model"),
+        ("cancel", "Cancel a migration that has not switched and delete its copies"),
+        ("cleanup", "Delete the previous model's chunks after a completed migration"),
+    ):
+        sub.add_parser(name, help=help_text)
+    for command in sub.choices.values():
+        command.add_argument("--id", dest="migration_id", help="Migration id (default: the latest)")
+    args = parser.parse_args()
+
+    if args.command == "start":
+        try:
+            migration = start_migration(args.model, args.index, auto_switch=not args.no_switch)
+        except ValueError as e:
+            print(f"❌ {e}")
+            sys.exit(1)
+        print(f"🚀 Started migration {migration['_id']}: {migration['source_model']} -> {migration['target_model']}")
+        print(f"   {migration['total']} chunks to re-embed")
+        print("💡 Follow it with `status --watch 5`, or work on it here with `run`.")
+
+    elif args.command == "status":
+        migration = find_migration(args.migration_id)
+        print_status(migration)
+        while args.watch and migration is not None and migration["status"] in ("copying", "verifying", "switched"):
+            time.sleep(args.watch)
+            migration = find_migration(str(migration["_id"]))
+            print(f"\r   {progress_line(migration_progress(migration))}", end="", flush=True)
+        if args.watch:
+            print()
+
+    elif args.command == "run":
+        worker = ReembedWorker(batch_size=args.batch_size, rate=args.rate, lease_seconds=settings.reembed_lease)
+        stop = threading.Event()
+
+        def show(migration):
+            print(f"\r{progress_line(migration_progress(migration))}", end="", flush=True)
+
+        try:
+            worker.run(stop, poll_interval=1.0, exit_when_idle=True, on_progress=show)
+        except KeyboardInterrupt:
+            stop.set()
+            print("\n⏸️  Stopped; the migration resumes from its last checkpoint")
+        print()
+        print_status(find_migration(args.migration_id))
+
+    elif args.command == "switch":
+        migration = require_migration(args.migration_id)
+        if migration["status"] != READY:
+            print(f"❌ Migration {migration['_id']} is {migration['status']}; only a verified (ready) migration can switch")
+            sys.exit(1)
+        switch_migration(migration)
+        print("✅ Switched. Chunks written with the old model during the switch are copied after "
+              f"{settings.reembed_switch_grace:.0f}s.")
+
+    elif args.command == "rollback":
+        try:
+            rollback_migration(require_migration(args.migration_id))
+        except ValueError as e:
+            print(f"❌ {e}")
+            sys.exit(1)
+
+    elif args.command == "cancel":
+        try:
+            deleted = cancel_migration(require_migration(args.migration_id))
+        except ValueError as e:
+            print(f"❌ {e}")
+            sys.exit(1)
+        print(f"✅ Cancelled; deleted {deleted} re-embedded chunks")
+
+    elif args.command == "cleanup":
+        try:
+            deleted = cleanup_source_chunks(require_migration(args.migration_id))
+        except ValueError as e:
+            print(f"❌ {e}")
+            sys.exit(1)
+        print(f"✅ Deleted {deleted} chunks of the previous model")
+
+
+if __name__ == "__main__":
+    main()